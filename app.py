@@ -1,7 +1,7 @@
 from flask import Flask, render_template, redirect, url_for, flash, request
 from flask_login import current_user
 from config import config
-from extensions import db, login_manager
+from extensions import db, login_manager, password_hasher, login_throttle, fee_cache, user_cache, archive_cache, stats_cache, report_cache, audit_log, request_metrics, slow_query_log, student_numbers
 import os
 
 def create_app(config_name=None):
@@ -12,19 +12,50 @@ def create_app(config_name=None):
     app = Flask(__name__)
     app.config.from_object(config[config_name])
     
+    # jsonify() writes Cents as major units, like to_dict() does
+    from models.money import MoneyJSONProvider
+    app.json = MoneyJSONProvider(app)
+    
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
     login_manager.login_view = 'auth.login'
     login_manager.login_message = 'Please log in to access this page.'
     login_manager.login_message_category = 'info'
+    password_hasher.init_app(app)
+    login_throttle.init_app(app)
+    fee_cache.init_app(app, maxsize=app.config['FEE_CACHE_SIZE'])
+    user_cache.init_app(app, ttl=app.config['USER_CACHE_TTL'])
+    archive_cache.init_app(app)
+    stats_cache.init_app(app, ttl=app.config['DASHBOARD_STATS_TTL'])
+    report_cache.init_app(app, ttl=app.config['REPORT_CACHE_TTL'])
+    audit_log.init_app(app)
+    request_metrics.init_app(app)
+    slow_query_log.init_app(app)
+    student_numbers.init_app(app, block_size=app.config['STUDENT_NUMBER_BLOCK_SIZE'])
+    
+    # N+1 guard (enabled through QUERY_COUNT_LIMIT, e.g. in testing)
+    from services import query_guard
+    query_guard.init_app(app)
+    
+    # Refuse to serve money read from DECIMAL columns as if it were cents
+    from services.money_migration import require_migrated
     
-    # User loader
-    from models.user import User
+    @app.before_request
+    def refuse_unmigrated_money():
+        try:
+            with query_guard.uncounted():
+                require_migrated()
+        except RuntimeError as e:
+            return str(e), 503
+    
+    # User loader (served from a per-worker cache of detached user snapshots)
+    from models.user import CachedUser
     
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        user_id = int(user_id)
+        return user_cache.get_or_set(user_id, lambda: CachedUser.load(user_id))
     
     # Register blueprints
     from routes.auth import auth_bp
@@ -33,6 +64,8 @@ def create_app(config_name=None):
     from routes.fee import fee_bp
     from routes.report import report_bp
     from routes.dashboard import dashboard_bp
+    from routes.search import search_bp
+    from routes.admin import admin_bp
     
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(student_bp, url_prefix='/students')
@@ -40,6 +73,12 @@ def create_app(config_name=None):
     app.register_blueprint(fee_bp, url_prefix='/fees')
     app.register_blueprint(report_bp, url_prefix='/reports')
     app.register_blueprint(dashboard_bp)
+    app.register_blueprint(search_bp, url_prefix='/search')
+    app.register_blueprint(admin_bp)
+    
+    # CLI commands
+    from commands import register_commands
+    register_commands(app)
     
     # Error handlers
     @app.errorhandler(404)
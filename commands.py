@@ -0,0 +1,435 @@
+import os
+import time
+import click
+from flask.cli import with_appcontext
+from models.fee import FeeStructure
+from models.payment import Payment
+
+@click.command('apply-fees')
+@click.option('--term', required=True, type=click.Choice(FeeStructure.term.type.enums))
+@click.option('--academic-year', required=True, help='Academic year of the fee structure, e.g. 2024')
+@click.option('--grade', default=None, help='Limit to one grade (default: whole school)')
+@click.option('--batch-size', default=500, show_default=True, help='Students per transaction')
+@with_appcontext
+def apply_fees_command(term, academic_year, grade, batch_size):
+    """Apply a term's fee structure to every eligible student."""
+    from services.fee_application import apply_fees_bulk
+    
+    with click.progressbar(length=0, label='Applying fees') as bar:
+        def progress(done, total):
+            bar.length = total
+            bar.update(done - bar.pos)
+        
+        result = apply_fees_bulk(
+            term=term,
+            academic_year=academic_year,
+            grade=grade,
+            batch_size=batch_size,
+            progress=progress
+        )
+    
+    click.echo(
+        f"Billed {result['students_billed']} students "
+        f"({result['amount_applied']:,.2f}) in {result['batches']} batches"
+    )
+
+@click.command('import-payments')
+@click.argument('statement', type=click.Path(exists=True, dir_okay=False))
+@click.option('--method', 'payment_method', default='M-Pesa', show_default=True,
+              type=click.Choice(Payment.payment_method.type.enums))
+@click.option('--fee-type', default='Tuition', show_default=True, help='Fee type for rows without one')
+@click.option('--rejects', default=None, help='Reject file path (default: <statement>.rejects.csv)')
+@click.option('--batch-size', default=1000, show_default=True, help='Rows per transaction')
+@click.option('--dry-run', is_flag=True, help='Validate and time the import, then roll back')
+@with_appcontext
+def import_payments_command(statement, payment_method, fee_type, rejects, batch_size, dry_run):
+    """Import payments from a bank or M-Pesa statement (CSV or XLSX)."""
+    from services.payment_import import read_statement, import_payments, StatementError
+    
+    rejects = rejects or f'{statement}.rejects.csv'
+    
+    def progress(rows, imported):
+        click.echo(f'  {rows} rows read, {imported} payments {"validated" if dry_run else "imported"}')
+    
+    try:
+        with open(statement, 'rb') as stream:
+            result = import_payments(
+                read_statement(stream, statement),
+                payment_method=payment_method,
+                fee_type=fee_type,
+                rejects_path=rejects,
+                batch_size=batch_size,
+                dry_run=dry_run,
+                progress=progress
+            )
+    except StatementError as e:
+        raise click.ClickException(str(e))
+    
+    click.echo(
+        f"{'Dry run: ' if dry_run else ''}{result['imported']} of {result['rows']} rows imported "
+        f"({result['amount']:,.2f}), {result['rejected']} rejected "
+        f"in {result['seconds']}s ({result['rows_per_second']} rows/s)"
+    )
+    if result['rejected']:
+        click.echo(f'Rejected rows written to {rejects}')
+
+@click.command('rebuild-rollup')
+@click.option('--date-from', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+@click.option('--date-to', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+@with_appcontext
+def rebuild_rollup_command(date_from, date_to):
+    """Rebuild the daily payment rollup from the payments table."""
+    from services.rollup import ensure_schema, rebuild
+    
+    ensure_schema()
+    rows = rebuild(
+        date_from=date_from.date() if date_from else None,
+        date_to=date_to.date() if date_to else None
+    )
+    click.echo(f'Rebuilt {rows} daily rollup rows')
+
+@click.command('rebuild-search-index')
+@with_appcontext
+def rebuild_search_index_command():
+    """Create the student/payment search index and repopulate it."""
+    from extensions import db
+    from services.search import create_search_index
+    
+    with db.engine.begin() as connection:
+        created = create_search_index(connection, rebuild=True)
+    
+    if created:
+        click.echo('Search index rebuilt')
+    else:
+        click.echo(f'No search index support for {db.engine.dialect.name}; searches use ILIKE')
+
+@click.command('stress-balances')
+@click.option('--workers', default=4, show_default=True, help='Concurrent cashier processes')
+@click.option('--payments', default=250, show_default=True, help='Payments posted by each worker')
+@click.option('--students', default=5, show_default=True, help='Students shared by all workers (fewer = more contention)')
+@click.option('--keep', is_flag=True, help='Keep the generated students and payments afterwards')
+@with_appcontext
+def stress_balances_command(workers, payments, students, keep):
+    """Post payments concurrently and verify no balance update was lost."""
+    from services.stress import run_balance_stress
+    
+    try:
+        result = run_balance_stress(workers=workers, payments_per_worker=payments, students=students, keep=keep)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    
+    click.echo(
+        f"{result['payments']} payments from {result['workers']} workers in {result['seconds']}s "
+        f"({result['payments_per_second']} payments/s, {result['retries']} lock retries)"
+    )
+    click.echo(f"Per worker: {', '.join(str(rate) for rate in result['worker_payments_per_second'])} payments/s")
+    click.echo(
+        f"Students with lost updates: {result['students_with_lost_updates']}, "
+        f"broken history links: {result['broken_history_links']}"
+    )
+    if not result['passed']:
+        raise click.ClickException('Balance stress test failed')
+    click.echo('OK')
+
+@click.command('print-receipts')
+@click.option('--date-from', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+@click.option('--date-to', type=click.DateTime(formats=['%Y-%m-%d']), default=None)
+@click.option('--ids', default=None, help='Comma-separated payment IDs instead of (or within) a date range')
+@click.option('--output', '-o', required=True, type=click.Path(dir_okay=False), help='File to write')
+@click.option('--format', 'fmt', default='html', show_default=True, type=click.Choice(['html', 'pdf']))
+@click.option('--workers', default=None, type=int, help='Render processes (default: CPU count for large batches, else 1)')
+@click.option('--chunk-size', default=100, show_default=True, help='Receipts per render task')
+@with_appcontext
+def print_receipts_command(date_from, date_to, ids, output, fmt, workers, chunk_size):
+    """Render receipts for a date range or list of payments into one printable file."""
+    from services.receipts import render_receipt_bundle, ReceiptError
+    
+    try:
+        payment_ids = [int(i) for i in ids.split(',') if i.strip()] if ids else None
+    except ValueError:
+        raise click.BadParameter('Payment IDs must be integers', param_hint='--ids')
+    if not (payment_ids or date_from or date_to):
+        raise click.UsageError('Give a date range or --ids')
+    
+    def progress(pages):
+        if pages % 1000 < chunk_size:
+            click.echo(f'  {pages} receipts rendered')
+    
+    try:
+        result = render_receipt_bundle(
+            output,
+            date_from=date_from.date() if date_from else None,
+            date_to=date_to.date() if date_to else None,
+            payment_ids=payment_ids,
+            workers=workers,
+            chunk_size=chunk_size,
+            fmt=fmt,
+            progress=progress
+        )
+    except ReceiptError as e:
+        raise click.ClickException(str(e))
+    
+    click.echo(
+        f"Wrote {result['pages']} receipts to {result['output']} in {result['seconds']}s "
+        f"({result['pages_per_second']} pages/s on {result['workers']} workers)"
+    )
+
+@click.command('bench-login')
+@click.option('--users', default=10, show_default=True, help='Temporary accounts to log in as')
+@click.option('--concurrency', default=16, show_default=True, help='Simultaneous login requests')
+@click.option('--logins', default=200, show_default=True, help='Total login requests')
+@with_appcontext
+def bench_login_command(users, concurrency, logins):
+    """Measure login latency under concurrent load with the configured hash cost."""
+    from services.benchmarks import bench_login
+    
+    try:
+        result = bench_login(users=users, concurrency=concurrency, logins=logins)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    
+    click.echo(
+        f"{result['succeeded']}/{result['logins']} logins at concurrency {result['concurrency']} "
+        f"in {result['seconds']}s ({result['logins_per_second']}/s, {result['busy']} refused as busy)"
+    )
+    click.echo(f"Hash: {result['hash_method']} on {result['hash_workers']} threads per worker")
+    click.echo(f"Latency ms: p50 {result['p50']}  p95 {result['p95']}  p99 {result['p99']}  max {result['max']}")
+
+@click.command('generate-dataset')
+@click.option('--students', default=1000, show_default=True)
+@click.option('--payments', default=20000, show_default=True)
+@click.option('--history', default=None, type=int, help='Total balance_history rows (padded with adjustments)')
+@click.option('--academic-year', default=2024, show_default=True)
+@click.option('--seed', default=42, show_default=True, help='Same seed and sizes give the same data')
+@click.option('--chunk-size', default=1000, show_default=True, help='Students per insert batch')
+@with_appcontext
+def generate_dataset_command(students, payments, history, academic_year, seed, chunk_size):
+    """Bulk-load a reproducible synthetic school for benchmarking."""
+    from services.dataset import generate_dataset
+    
+    if students <= 0:
+        raise click.BadParameter('Must be positive', param_hint='--students')
+    
+    started = time.perf_counter()
+    totals = generate_dataset(
+        students=students,
+        payments=payments,
+        history=history,
+        academic_year=academic_year,
+        seed=seed,
+        chunk_size=chunk_size,
+        progress=lambda t: click.echo(f"  {t['students']} students, {t['payments']} payments")
+    )
+    click.echo(
+        f"Inserted {totals['students']} students, {totals['payments']} payments, "
+        f"{totals['fee_applications']} fee applications and {totals['balance_history']} history rows "
+        f"in {time.perf_counter() - started:.1f}s"
+    )
+
+@click.command('bench-suite')
+@click.option('--repeat', default=20, show_default=True, help='Timed requests per endpoint')
+@click.option('--warmup', default=2, show_default=True, help='Untimed requests per endpoint first')
+@click.option('--baseline', default='benchmarks/baseline.json', show_default=True, type=click.Path(dir_okay=False))
+@click.option('--save', is_flag=True, help='Write the results as the new baseline instead of comparing')
+@click.option('--tolerance', default=0.25, show_default=True, help='Allowed fractional p95 increase')
+@click.option('--read-only', is_flag=True, help='Skip the endpoints that create payments and fee applications')
+@with_appcontext
+def bench_suite_command(repeat, warmup, baseline, save, tolerance, read_only):
+    """Time the main pages and APIs and compare them with a saved baseline."""
+    from services.benchmarks import run_suite, compare, load_baseline, save_baseline
+    
+    try:
+        result = run_suite(repeat=repeat, warmup=warmup, include_writes=not read_only)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    
+    click.echo(f"{result['students']} students, {result['payments']} payments on {result['database']}")
+    click.echo(f"{'endpoint':<22} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>8}")
+    for name, r in result['endpoints'].items():
+        errors = f"  {r['errors']} errors" if r['errors'] else ''
+        click.echo(f"{name:<22} {r['p50']:>8} {r['p95']:>8} {r['p99']:>8} {r['queries']:>8}{errors}")
+    
+    if save:
+        os.makedirs(os.path.dirname(os.path.abspath(baseline)), exist_ok=True)
+        save_baseline(baseline, result)
+        click.echo(f'Saved baseline to {baseline}')
+        return
+    
+    previous = load_baseline(baseline)
+    if previous is None:
+        click.echo(f'No baseline at {baseline}; run with --save to record one')
+        return
+    regressions = compare(result, previous, tolerance)
+    for line in regressions:
+        click.echo(f'REGRESSION {line}', err=True)
+    if regressions:
+        raise SystemExit(1)
+    click.echo(f'No regressions against {baseline}')
+
+@click.command('migrate-money')
+@click.option('--dry-run', is_flag=True, help='List the columns that would be converted')
+@with_appcontext
+def migrate_money_command(dry_run):
+    """Convert DECIMAL money columns to BIGINT minor units (cents)."""
+    from extensions import fee_cache, ledger_stamp
+    from services.money_migration import migrate_money_columns
+    
+    columns = migrate_money_columns(dry_run=dry_run)
+    if not columns:
+        click.echo('All money columns already hold minor units')
+        return
+    for table, column, _ in columns:
+        click.echo(f"  {table}.{column}{' (pending)' if dry_run else ''}")
+    if dry_run:
+        return
+    fee_cache.invalidate()
+    ledger_stamp.bump()
+    click.echo(f'Converted {len(columns)} columns to minor units')
+
+@click.command('bench-serialization')
+@click.option('--rows', default=5000, show_default=True, help='Rows per list payload')
+@click.option('--repeat', default=5, show_default=True, help='Runs per variant (best is reported)')
+@with_appcontext
+def bench_serialization_command(rows, repeat):
+    """Compare list-API serialization with Decimal and integer-cents money."""
+    from services.benchmarks import bench_serialization
+    
+    results = bench_serialization(rows=rows, repeat=repeat)
+    for name, result in results.items():
+        decimal, cents = result['decimal'], result['cents']
+        click.echo(
+            f"{name:<9} {decimal['rows']} rows: decimal {decimal['ms']}ms ({decimal['rows_per_second']}/s), "
+            f"cents {cents['ms']}ms ({cents['rows_per_second']}/s), {result['speedup']}x"
+            f"{'' if result['identical'] else ', OUTPUT DIFFERS'}"
+        )
+
+@click.command('reconcile-balances')
+@click.option('--report', default='reconciliation.csv', show_default=True, help='CSV file for the discrepancies')
+@click.option('--repair', is_flag=True, help="Record an 'adjustment' history row for each drifting balance")
+@click.option('--chunk-size', default=500000, show_default=True, help='Rows read per chunk')
+@with_appcontext
+def reconcile_balances_command(report, repair, chunk_size):
+    """Recompute every balance from its history and payments and report discrepancies."""
+    from services.reconciliation import reconcile, write_report, repair as repair_ledger
+    
+    result = reconcile(chunk_size=chunk_size)
+    click.echo(
+        f"Checked {result['students']} students, {result['history_rows']} history rows and "
+        f"{result['payments']} payments in {result['seconds']}s"
+    )
+    click.echo(
+        f"  {result['students_with_drift']} balances drift from their history (net {result['total_drift']:,.2f}), "
+        f"{result['broken_links']} broken history links, "
+        f"{result['payments_without_history']} payments without history, "
+        f"{result['payment_amount_mismatches']} with a mismatched amount"
+    )
+    if not result['discrepancies']:
+        return
+    write_report(result['discrepancies'], report)
+    click.echo(f"{len(result['discrepancies'])} students written to {report}")
+    
+    if repair:
+        adjusted, net = repair_ledger(result['discrepancies'])
+        click.echo(f'Recorded adjustments for {adjusted} students (net {net:,.2f})')
+
+@click.command('build-checkpoints')
+@click.option('--through', default=None, type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Last month to checkpoint (default: last month)')
+@with_appcontext
+def build_checkpoints_command(through):
+    """Add month-end balance checkpoints for every student (incremental; run from cron)."""
+    from services.checkpoints import build_checkpoints
+    
+    def progress(period_end, rows):
+        if rows:
+            click.echo(f'  {period_end:%Y-%m}: {rows} checkpoints')
+    
+    result = build_checkpoints(through=through.date() if through else None, progress=progress)
+    if result['rebuilt_students']:
+        click.echo(
+            f"Rebuilt {result['rebuilt_checkpoints']} checkpoints for {result['rebuilt_students']} "
+            f"students with back-dated history"
+        )
+    click.echo(f"Added {result['checkpoints']} checkpoints through {result['through']:%Y-%m-%d}")
+
+@click.command('refresh-aging')
+@click.option('--all', 'rebuild_all', is_flag=True, help='Recompute every student instead of only the due ones')
+@with_appcontext
+def refresh_aging_command(rebuild_all):
+    """Re-age debts whose charges crossed into an older bucket (daily from cron), or rebuild the table."""
+    from extensions import ledger_stamp
+    from services import aging
+    
+    if rebuild_all:
+        debtors = aging.rebuild(progress=lambda last_id, debtors: click.echo(f'  up to student {last_id}: {debtors} debtors'))
+        click.echo(f'Rebuilt debt aging for {debtors} debtors')
+    else:
+        aging.ensure_schema()
+        click.echo(f'Re-aged {aging.roll_forward()} debtors')
+    ledger_stamp.bump()
+
+@click.command('close-year')
+@click.argument('academic_year')
+@click.option('--dry-run', is_flag=True, help='Copy and verify the year, then roll back')
+@with_appcontext
+def close_year_command(academic_year, dry_run):
+    """Move a finished academic year's payments and balance history into the archive."""
+    from services.archive import close_year, ArchiveError
+    
+    try:
+        result = close_year(academic_year, dry_run=dry_run)
+    except ArchiveError as e:
+        raise click.ClickException(str(e))
+    click.echo(
+        f"{'Dry run: ' if dry_run else ''}{result['academic_year']} "
+        f"({result['starts_on']:%Y-%m-%d} to {result['ends_on']:%Y-%m-%d}): "
+        f"{result['payments']} payments ({result['payments_total']:,.2f}) and "
+        f"{result['history_rows']} history rows (net {result['history_total']:,.2f}) "
+        f"{'verified and rolled back' if dry_run else 'archived and verified'}"
+    )
+
+@click.command('verify-archive')
+@click.argument('academic_year', required=False)
+@with_appcontext
+def verify_archive_command(academic_year):
+    """Recount closed years' archived rows and totals against what was recorded when they closed."""
+    from services.archive import verify
+    
+    results = verify(academic_year)
+    if not results:
+        click.echo('No closed academic years')
+        return
+    for year in results:
+        (payments, payments_total), (history, history_total) = year['archived']['payments'], year['archived']['history']
+        click.echo(
+            f"{year['academic_year']}: {'OK' if year['ok'] else 'MISMATCH'} - {payments} payments "
+            f"({payments_total:,.2f}), {history} history rows (net {history_total:,.2f})"
+        )
+        if not year['ok']:
+            click.echo(f"  recorded when closed: {year['recorded']}")
+        if year['late_payments'] or year['late_history_rows']:
+            click.echo(
+                f"  {year['late_payments']} payments and {year['late_history_rows']} history rows "
+                f"dated in this year were written after it closed and are still live"
+            )
+    if not all(year['ok'] for year in results):
+        raise click.ClickException('Archive does not match its recorded totals')
+
+def register_commands(app):
+    """Register CLI commands on the app"""
+    app.cli.add_command(apply_fees_command)
+    app.cli.add_command(import_payments_command)
+    app.cli.add_command(rebuild_rollup_command)
+    app.cli.add_command(rebuild_search_index_command)
+    app.cli.add_command(stress_balances_command)
+    app.cli.add_command(print_receipts_command)
+    app.cli.add_command(bench_login_command)
+    app.cli.add_command(generate_dataset_command)
+    app.cli.add_command(bench_suite_command)
+    app.cli.add_command(migrate_money_command)
+    app.cli.add_command(bench_serialization_command)
+    app.cli.add_command(reconcile_balances_command)
+    app.cli.add_command(build_checkpoints_command)
+    app.cli.add_command(refresh_aging_command)
+    app.cli.add_command(close_year_command)
+    app.cli.add_command(verify_archive_command)
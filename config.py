@@ -18,9 +18,66 @@ class Config:
     SESSION_COOKIE_HTTPONLY = True
     SESSION_COOKIE_SAMESITE = 'Lax'
     
+    # Password hashing runs on a bounded pool per worker; PASSWORD_HASH_METHOD is any
+    # werkzeug method string. Hashes made with another method are upgraded at login.
+    # Logins beyond WORKERS + QUEUE at once, or hashes slower than TIMEOUT seconds, are
+    # refused. The request waits for its hash, so serve with gunicorn --worker-class gthread.
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt:32768:8:1')
+    PASSWORD_HASH_WORKERS = 2
+    PASSWORD_HASH_QUEUE = 16
+    PASSWORD_HASH_TIMEOUT = 10
+    
+    # Failed logins allowed per username / per IP within the window (seconds)
+    LOGIN_MAX_FAILURES = 5
+    LOGIN_MAX_FAILURES_PER_IP = 20
+    LOGIN_THROTTLE_WINDOW = 300
+    
     # Pagination
     ITEMS_PER_PAGE = 50
     
+    # Caching (CACHE_DIR defaults to <instance>/cache, shared by all workers)
+    CACHE_DIR = os.environ.get('CACHE_DIR')
+    FEE_CACHE_SIZE = 256
+    USER_CACHE_TTL = 60
+    DASHBOARD_STATS_TTL = 30
+    REPORT_CACHE_TTL = 300
+    
+    # Audit log: 'async' batches SystemLog rows on a background thread with an
+    # on-disk spool (AUDIT_SPOOL_DIR defaults to <instance>/audit); 'sync' writes inline
+    AUDIT_LOG_MODE = os.environ.get('AUDIT_LOG_MODE', 'async')
+    AUDIT_SPOOL_DIR = os.environ.get('AUDIT_SPOOL_DIR')
+    AUDIT_BATCH_SIZE = 200
+    AUDIT_FLUSH_INTERVAL = 2.0
+    AUDIT_SPOOL_FSYNC = False
+    
+    # Student numbers each worker reserves at a time (unused ones are skipped when it exits)
+    STUDENT_NUMBER_BLOCK_SIZE = 20
+    
+    # Per-endpoint latency and SQL metrics, served to admins at /metrics. Each worker
+    # writes its counters to METRICS_DIR (default <instance>/metrics) at most every
+    # METRICS_WRITE_INTERVAL seconds. Scrapers may send "Authorization: Bearer <METRICS_TOKEN>".
+    METRICS_ENABLED = True
+    METRICS_DIR = os.environ.get('METRICS_DIR')
+    METRICS_WRITE_INTERVAL = 5.0
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+    
+    # Statements slower than SLOW_QUERY_MS (None = off) are written with their plan to
+    # SLOW_QUERY_LOG_DIR/slow_queries.log (default <instance>/logs) and shown at /admin/slow-queries.
+    # On PostgreSQL a SLOW_QUERY_ANALYZE_RATE sample of SELECTs is re-run under EXPLAIN ANALYZE.
+    SLOW_QUERY_MS = 250
+    SLOW_QUERY_LOG_DIR = os.environ.get('SLOW_QUERY_LOG_DIR')
+    SLOW_QUERY_LOG_MAX_BYTES = 5 * 1024 * 1024
+    SLOW_QUERY_LOG_BACKUPS = 5
+    SLOW_QUERY_EXPLAIN_INTERVAL = 300
+    SLOW_QUERY_ANALYZE_RATE = 0.1
+    
+    # Fail any request that issues more SQL statements than this (None = off)
+    QUERY_COUNT_LIMIT = None
+    
+    # Academic years start on the first of this month (1: calendar years, as the
+    # fee structures use); `flask close-year` archives whole years
+    ACADEMIC_YEAR_START_MONTH = 1
+    
     # File upload
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     UPLOAD_FOLDER = 'uploads'
@@ -43,6 +100,11 @@ class ProductionConfig(Config):
 class TestingConfig(Config):
     TESTING = True
     SQLALCHEMY_DATABASE_URI = 'sqlite:///:memory:'
+    QUERY_COUNT_LIMIT = 15
+    DASHBOARD_STATS_TTL = 0
+    REPORT_CACHE_TTL = 0
+    AUDIT_LOG_MODE = 'sync'
+    PASSWORD_HASH_METHOD = 'pbkdf2:sha256:1000'
 
 config = {
     'development': DevelopmentConfig,
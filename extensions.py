@@ -1,6 +1,27 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
+from services.cache import VersionStamp, VersionedCache, SharedCache
+from services.audit import AuditLog
+from services.metrics import RequestMetrics
+from services.slow_queries import SlowQueryLog
+from services.numbering import NumberAllocator
+from services.passwords import PasswordHasher, LoginThrottle
 
 # Initialize extensions here (without app)
 db = SQLAlchemy()
-login_manager = LoginManager()
\ No newline at end of file
+login_manager = LoginManager()
+password_hasher = PasswordHasher()
+login_throttle = LoginThrottle()
+fee_cache = VersionedCache('fee_structures')
+user_cache = VersionedCache('users', maxsize=1024)
+# Where the live tables start, once academic years have been archived
+archive_cache = VersionedCache('archived_years', maxsize=8)
+audit_log = AuditLog()
+request_metrics = RequestMetrics()
+slow_query_log = SlowQueryLog()
+student_numbers = NumberAllocator('student_number', prefix='STU', table_name='students', column_name='student_number')
+
+# Figures derived from balances and payments; bump ledger_stamp after any such write
+ledger_stamp = VersionStamp('ledger')
+stats_cache = SharedCache('dashboard_stats', stamp=ledger_stamp)
+report_cache = SharedCache('report_bundle', stamp=ledger_stamp)
@@ -0,0 +1,46 @@
+from datetime import datetime
+from app import db
+from models.money import Money
+
+class DebtAging(db.Model):
+    """A debtor's balance split by the age of the charges it is made of (see services/aging.py)"""
+    __tablename__ = 'debt_aging'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id', ondelete='CASCADE'), primary_key=True)
+    grade = db.Column(db.String(10), nullable=False)
+    balance = db.Column(Money, nullable=False)
+    current = db.Column(Money, nullable=False, default=0)
+    days_30 = db.Column(Money, nullable=False, default=0)
+    days_60 = db.Column(Money, nullable=False, default=0)
+    days_90 = db.Column(Money, nullable=False, default=0)
+    oldest_unpaid = db.Column(db.Date)
+    aged_on = db.Column(db.Date, nullable=False)
+    next_rollover = db.Column(db.Date, index=True)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    student = db.relationship('Student', lazy='joined', backref=db.backref('aging', uselist=False, passive_deletes=True))
+    
+    __table_args__ = (
+        # Largest debts first, overall and within a grade
+        db.Index('ix_debt_aging_balance', 'balance', 'student_id'),
+        db.Index('ix_debt_aging_grade_balance', 'grade', 'balance', 'student_id'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.student_id,
+            'student_number': self.student.student_number,
+            'full_name': self.student.full_name,
+            'grade': self.grade,
+            'balance': float(self.balance),
+            'guardian_contact': self.student.guardian_contact,
+            'current': float(self.current),
+            'days_30': float(self.days_30),
+            'days_60': float(self.days_60),
+            'days_90': float(self.days_90),
+            'oldest_unpaid': self.oldest_unpaid.isoformat() if self.oldest_unpaid else None,
+            'aged_on': self.aged_on.isoformat()
+        }
+    
+    def __repr__(self):
+        return f'<DebtAging student {self.student_id}: {self.balance}>'
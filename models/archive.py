@@ -0,0 +1,90 @@
+from datetime import datetime
+from app import db
+from models.money import Money
+
+# On PostgreSQL the archive tables are partitioned by academic year; each
+# closed year gets its own partition (see services/archive.py). Elsewhere they
+# are plain tables keyed on (id, academic_year).
+PARTITIONED = {'postgresql_partition_by': 'LIST (academic_year)'}
+
+class ArchivedYear(db.Model):
+    """A closed academic year and the row counts and totals moved out of the live tables"""
+    __tablename__ = 'archived_years'
+    
+    academic_year = db.Column(db.String(10), primary_key=True)
+    starts_on = db.Column(db.Date, nullable=False)
+    ends_on = db.Column(db.Date, nullable=False)
+    payments = db.Column(db.Integer, nullable=False, default=0)
+    payments_total = db.Column(Money, nullable=False, default=0)
+    history_rows = db.Column(db.Integer, nullable=False, default=0)
+    history_total = db.Column(Money, nullable=False, default=0)
+    closed_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    closed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'academic_year': self.academic_year,
+            'starts_on': self.starts_on.isoformat(),
+            'ends_on': self.ends_on.isoformat(),
+            'payments': self.payments,
+            'payments_total': float(self.payments_total),
+            'history_rows': self.history_rows,
+            'history_total': float(self.history_total),
+            'closed_at': self.closed_at.isoformat() if self.closed_at else None
+        }
+    
+    def __repr__(self):
+        return f'<ArchivedYear {self.academic_year}>'
+
+class PaymentArchive(db.Model):
+    """Payments of closed academic years, column for column as in payments"""
+    __tablename__ = 'payments_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    academic_year = db.Column(db.String(10), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id', ondelete='CASCADE'), nullable=False)
+    amount = db.Column(Money, nullable=False)
+    fee_type = db.Column(db.String(50), nullable=False)
+    payment_method = db.Column(db.Enum('Cash', 'M-Pesa', 'Bank Transfer', 'Cheque', 'Card'), nullable=False)
+    payment_date = db.Column(db.Date, nullable=False)
+    grade = db.Column(db.String(10))
+    transaction_reference = db.Column(db.String(100))
+    receipt_number = db.Column(db.String(50))
+    notes = db.Column(db.Text)
+    created_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_payments_archive_date', 'payment_date', 'id'),
+        db.Index('ix_payments_archive_student', 'student_id'),
+        db.Index('ix_payments_archive_receipt', 'receipt_number'),
+        PARTITIONED,
+    )
+    
+    def __repr__(self):
+        return f'<PaymentArchive {self.academic_year} {self.receipt_number}>'
+
+class BalanceHistoryArchive(db.Model):
+    """balance_history rows of closed academic years"""
+    __tablename__ = 'balance_history_archive'
+    
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    academic_year = db.Column(db.String(10), primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id', ondelete='CASCADE'), nullable=False)
+    previous_balance = db.Column(Money, nullable=False)
+    new_balance = db.Column(Money, nullable=False)
+    change_amount = db.Column(Money, nullable=False)
+    change_type = db.Column(db.Enum('payment', 'fee_applied', 'adjustment', 'refund'), nullable=False)
+    reference_id = db.Column(db.Integer)
+    description = db.Column(db.Text)
+    created_by = db.Column(db.Integer)
+    created_at = db.Column(db.DateTime)
+    
+    __table_args__ = (
+        db.Index('ix_balance_history_archive_student_created', 'student_id', 'created_at'),
+        PARTITIONED,
+    )
+    
+    def __repr__(self):
+        return f'<BalanceHistoryArchive {self.academic_year} {self.id}>'
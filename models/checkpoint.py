@@ -0,0 +1,25 @@
+from datetime import datetime
+from app import db
+from models.money import Money
+
+class BalanceCheckpoint(db.Model):
+    __tablename__ = 'balance_checkpoints'
+    
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id', ondelete='CASCADE'), primary_key=True)
+    period_end = db.Column(db.Date, primary_key=True)
+    balance = db.Column(Money, nullable=False)
+    history_rows = db.Column(db.Integer, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<BalanceCheckpoint student {self.student_id} {self.period_end}: {self.balance}>'
+
+class CheckpointPeriod(db.Model):
+    """A month whose checkpoints have been built, and the last history id seen when it was"""
+    __tablename__ = 'checkpoint_periods'
+    
+    period_end = db.Column(db.Date, primary_key=True)
+    history_watermark = db.Column(db.Integer, nullable=False, default=0)
+    built_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<CheckpointPeriod {self.period_end}>'
@@ -1,5 +1,7 @@
 from datetime import datetime
 from app import db
+from models.money import Cents, Money
+from extensions import fee_cache
 
 class FeeStructure(db.Model):
     __tablename__ = 'fee_structures'
@@ -8,7 +10,7 @@ class FeeStructure(db.Model):
     grade = db.Column(db.String(10), nullable=False, index=True)
     term = db.Column(db.Enum('Term 1', 'Term 2', 'Term 3', 'Annual'), nullable=False, index=True)
     fee_type = db.Column(db.String(50), nullable=False, index=True)
-    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    amount = db.Column(Money, nullable=False)
     description = db.Column(db.Text)
     academic_year = db.Column(db.String(10))
     is_active = db.Column(db.Boolean, default=True)
@@ -19,18 +21,33 @@ class FeeStructure(db.Model):
         db.UniqueConstraint('grade', 'term', 'fee_type', 'academic_year', name='unique_fee'),
     )
     
+    @staticmethod
+    def _cached_fees(grade, term=None, academic_year=None):
+        """Fee line items and their total for a grade, served from the fee cache"""
+        def load():
+            query = db.session.query(
+                FeeStructure.term, FeeStructure.fee_type, FeeStructure.amount
+            ).filter_by(grade=grade, is_active=True)
+            
+            if term:
+                query = query.filter_by(term=term)
+            if academic_year:
+                query = query.filter_by(academic_year=academic_year)
+            
+            items = tuple((row.term, row.fee_type, row.amount) for row in query.order_by(FeeStructure.id))
+            return items, sum((item[2] for item in items), Cents(0))
+        
+        return fee_cache.get_or_set((grade, term, academic_year), load)
+    
+    @staticmethod
+    def get_fee_items_for_grade(grade, term=None, academic_year=None):
+        """Active fee line items for a grade as (term, fee_type, amount) tuples"""
+        return FeeStructure._cached_fees(grade, term, academic_year)[0]
+    
     @staticmethod
     def get_total_fees_for_grade(grade, term=None, academic_year=None):
         """Calculate total fees for a grade"""
-        query = FeeStructure.query.filter_by(grade=grade, is_active=True)
-        
-        if term:
-            query = query.filter_by(term=term)
-        if academic_year:
-            query = query.filter_by(academic_year=academic_year)
-        
-        fees = query.all()
-        return sum(float(fee.amount) for fee in fees)
+        return FeeStructure._cached_fees(grade, term, academic_year)[1]
     
     def to_dict(self):
         """Convert fee structure to dictionary"""
@@ -48,6 +65,24 @@ class FeeStructure(db.Model):
     def __repr__(self):
         return f'<FeeStructure Grade {self.grade} - {self.fee_type}>'
 
+class FeeApplication(db.Model):
+    __tablename__ = 'fee_applications'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False, index=True)
+    term = db.Column(db.Enum('Term 1', 'Term 2', 'Term 3', 'Annual'), nullable=False)
+    academic_year = db.Column(db.String(10), nullable=False)
+    amount = db.Column(Money, nullable=False)
+    applied_by = db.Column(db.Integer, db.ForeignKey('users.id'))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+    
+    __table_args__ = (
+        db.UniqueConstraint('student_id', 'term', 'academic_year', name='unique_fee_application'),
+    )
+    
+    def __repr__(self):
+        return f'<FeeApplication Student {self.student_id} - {self.term} {self.academic_year}>'
+
 class SystemLog(db.Model):
     __tablename__ = 'system_logs'
     
@@ -0,0 +1,161 @@
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+from numbers import Number
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.sql import operators
+from sqlalchemy.types import TypeDecorator, BigInteger, Integer, Numeric
+
+class Cents(int):
+    """An amount of money as a whole number of minor units (KSh 1,500.50 is Cents(150050)).
+    
+    Arithmetic with other Cents or ints stays in Cents, so sums and balances
+    never round; adding, subtracting, multiplying or comparing with a Decimal
+    or float raises TypeError instead of quietly mixing units. float() and str() give
+    major units, which keeps to_dict() output and templates unchanged; use
+    Cents.parse() to read a major-unit amount from a form, a file or a Decimal.
+    """
+    
+    __slots__ = ()
+    
+    @classmethod
+    def parse(cls, amount):
+        """Cents for a major-unit amount ('1500.5', 1500, 1500.5 or Decimal); rounds half up to the cent"""
+        if isinstance(amount, cls):
+            return amount
+        if isinstance(amount, int) and not isinstance(amount, bool):
+            return cls(amount * 100)
+        try:
+            value = amount if isinstance(amount, Decimal) else Decimal(str(amount).strip().replace(',', ''))
+            return cls(int((value * 100).quantize(Decimal('1'), rounding=ROUND_HALF_UP)))
+        except (InvalidOperation, ValueError):
+            raise ValueError(f'Invalid amount: {amount!r}')
+    
+    def to_decimal(self):
+        return Decimal(int(self)).scaleb(-2)
+    
+    def __float__(self):
+        # One correctly rounded division; repr() gives back the exact decimal amount
+        return int(self) / 100
+    
+    def __str__(self):
+        sign = '-' if self < 0 else ''
+        major, minor = divmod(abs(int(self)), 100)
+        return f'{sign}{major}.{minor:02d}'
+    
+    def __repr__(self):
+        return f'Cents({int(self)})'
+    
+    def __format__(self, spec):
+        # Float presentation types ('{:,.2f}' in the currency filter) format major units
+        if spec and spec[-1] in 'eEfFgGn%':
+            return format(float(self), spec)
+        return int.__format__(self, spec)
+    
+    def __add__(self, other):
+        return Cents(int(self) + _minor_units(other, '+'))
+    
+    __radd__ = __add__
+    
+    def __sub__(self, other):
+        return Cents(int(self) - _minor_units(other, '-'))
+    
+    def __rsub__(self, other):
+        return Cents(_minor_units(other, '-') - int(self))
+    
+    def __mul__(self, other):
+        return Cents(int(self) * _minor_units(other, '*'))
+    
+    __rmul__ = __mul__
+    
+    # Comparisons with a Decimal or float would compare minor units with major
+    # units; anything that is not a number (None, a string) is simply unequal
+    def __eq__(self, other):
+        if not isinstance(other, Number):
+            return NotImplemented
+        return int(self) == _minor_units(other, '==')
+    
+    def __ne__(self, other):
+        if not isinstance(other, Number):
+            return NotImplemented
+        return int(self) != _minor_units(other, '!=')
+    
+    def __lt__(self, other):
+        return int(self) < _minor_units(other, '<')
+    
+    def __le__(self, other):
+        return int(self) <= _minor_units(other, '<=')
+    
+    def __gt__(self, other):
+        return int(self) > _minor_units(other, '>')
+    
+    def __ge__(self, other):
+        return int(self) >= _minor_units(other, '>=')
+    
+    __hash__ = int.__hash__
+    
+    def __neg__(self):
+        return Cents(-int(self))
+    
+    def __abs__(self):
+        return Cents(abs(int(self)))
+
+def _minor_units(other, op):
+    # Returning NotImplemented would let Decimal and float take over and give a non-Cents result
+    if isinstance(other, int) and not isinstance(other, bool):
+        return other
+    raise TypeError(f"unsupported operand type(s) for {op}: 'Cents' and '{type(other).__name__}'; "
+                    f"use Cents.parse() for major-unit amounts")
+
+def major_units(value):
+    """value with every Cents in it (through dicts, lists and tuples) as a major-unit float.
+    
+    json writes an int subclass as a plain integer without calling default=,
+    so Cents have to be converted before encoding; the app's JSON provider
+    does this for jsonify().
+    """
+    if isinstance(value, Cents):
+        return float(value)
+    if isinstance(value, dict):
+        return {key: major_units(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [major_units(item) for item in value]
+    return value
+
+class MoneyJSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider, writing Cents as major units"""
+    
+    def dumps(self, obj, **kwargs):
+        return super().dumps(major_units(obj), **kwargs)
+
+class Money(TypeDecorator):
+    """Money stored as a BIGINT count of minor units and loaded as Cents.
+    
+    Bound Cents are minor units; Decimal, float and str values are major
+    units and are converted with Cents.parse(). A plain int is refused, since
+    it could be either (0, the same in both, is allowed). SUM() over a Money column therefore adds integers in the
+    database and comes back as Cents.
+    """
+    
+    impl = BigInteger
+    cache_ok = True
+    
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, Cents) or value == 0:
+            return int(value)
+        if isinstance(value, int):
+            raise TypeError(f'Ambiguous money value {value!r}: bind Cents({value}) for minor units '
+                            f'or Cents.parse({value}) for major units')
+        return int(Cents.parse(value))
+    
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        # AVG() and PostgreSQL's SUM(bigint) return non-integers
+        return Cents(value if isinstance(value, int) else round(value))
+    
+    def coerce_compared_value(self, op, value):
+        # Literals compared with or added to money are money; factors and divisors are plain numbers
+        if op in (operators.mul, operators.truediv, operators.floordiv, operators.mod):
+            return Integer() if isinstance(value, int) else Numeric()
+        return self
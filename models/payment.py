@@ -1,5 +1,6 @@
 from datetime import datetime
 from app import db
+from models.money import Money
 import secrets
 
 class Payment(db.Model):
@@ -7,10 +8,12 @@ class Payment(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False, index=True)
-    amount = db.Column(db.Numeric(15, 2), nullable=False)
+    amount = db.Column(Money, nullable=False)
     fee_type = db.Column(db.String(50), nullable=False)
     payment_method = db.Column(db.Enum('Cash', 'M-Pesa', 'Bank Transfer', 'Cheque', 'Card'), nullable=False, index=True)
     payment_date = db.Column(db.Date, nullable=False, index=True)
+    # The student's grade when the payment was taken; the daily rollup is keyed on it
+    grade = db.Column(db.String(10))
     transaction_reference = db.Column(db.String(100))
     receipt_number = db.Column(db.String(50), unique=True, index=True)
     notes = db.Column(db.Text)
@@ -18,11 +21,14 @@ class Payment(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
+    # Never hand out an id again once its row is archived (SQLite otherwise reuses max(rowid) + 1)
+    __table_args__ = {'sqlite_autoincrement': True}
+    
     @staticmethod
-    def generate_receipt_number():
-        """Generate unique receipt number"""
+    def generate_receipt_number(nbytes=3):
+        """Generate unique receipt number (use more random bytes for bulk imports)"""
         timestamp = datetime.now().strftime('%Y%m%d')
-        random_suffix = secrets.token_hex(3).upper()
+        random_suffix = secrets.token_hex(nbytes).upper()
         return f'RCP-{timestamp}-{random_suffix}'
     
     def to_dict(self):
@@ -0,0 +1,15 @@
+from app import db
+from models.money import Money
+
+class PaymentDailyRollup(db.Model):
+    __tablename__ = 'payment_daily_rollup'
+    
+    payment_date = db.Column(db.Date, primary_key=True)
+    grade = db.Column(db.String(10), primary_key=True)
+    payment_method = db.Column(db.Enum('Cash', 'M-Pesa', 'Bank Transfer', 'Cheque', 'Card'), primary_key=True)
+    fee_type = db.Column(db.String(50), primary_key=True)
+    payment_count = db.Column(db.Integer, nullable=False, default=0)
+    total_amount = db.Column(Money, nullable=False, default=0)
+    
+    def __repr__(self):
+        return f'<PaymentDailyRollup {self.payment_date} Grade {self.grade} {self.payment_method} {self.fee_type}>'
@@ -0,0 +1,11 @@
+from app import db
+
+class NumberSequence(db.Model):
+    """Named counter for allocating human-readable numbers where the database has no sequences"""
+    __tablename__ = 'number_sequences'
+    
+    name = db.Column(db.String(50), primary_key=True)
+    next_value = db.Column(db.BigInteger, nullable=False)
+    
+    def __repr__(self):
+        return f'<NumberSequence {self.name}: {self.next_value}>'
@@ -1,5 +1,8 @@
 from datetime import datetime
+from sqlalchemy import update, select, func
+from sqlalchemy.orm.attributes import set_committed_value
 from app import db
+from models.money import Cents, Money
 
 class Student(db.Model):
     __tablename__ = 'students'
@@ -12,7 +15,7 @@ class Student(db.Model):
     guardian_contact = db.Column(db.String(20), nullable=False)
     guardian_email = db.Column(db.String(120))
     address = db.Column(db.Text)
-    balance = db.Column(db.Numeric(15, 2), default=0.00, index=True)
+    balance = db.Column(Money, default=0, index=True)
     is_active = db.Column(db.Boolean, default=True)
     enrollment_date = db.Column(db.Date)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -23,17 +26,39 @@ class Student(db.Model):
     balance_history = db.relationship('BalanceHistory', backref='student', lazy='dynamic', cascade='all, delete-orphan')
     
     def update_balance(self, amount, change_type, description=None, created_by=None, reference_id=None):
-        """Update student balance and record history"""
-        previous_balance = float(self.balance)
-        self.balance = float(self.balance) + amount
-        new_balance = float(self.balance)
+        """Add amount to the balance in one atomic UPDATE and record history; returns the new balance.
         
-        # Record history
+        amount is Cents, or a major-unit Decimal or string. The increment
+        happens in the database (balance = balance + delta), so concurrent
+        cashiers posting to the same student never overwrite each other; the
+        row stays locked until the caller commits.
+        """
+        if self.id is None:
+            db.session.flush()
+        
+        delta = Cents.parse(amount)
+        statement = (
+            update(Student)
+            .where(Student.id == self.id)
+            .values(balance=func.coalesce(Student.balance, 0) + delta)
+            .execution_options(synchronize_session=False)
+        )
+        
+        if db.session.get_bind().dialect.update_returning:
+            new_balance = db.session.execute(statement.returning(Student.balance)).scalar_one()
+        else:
+            db.session.execute(statement)
+            new_balance = db.session.execute(select(Student.balance).where(Student.id == self.id)).scalar_one()
+        
+        # Reflect the database value without marking the attribute dirty
+        set_committed_value(self, 'balance', new_balance)
+        
+        # Record history in the same transaction; previous is derived from the same atomic update
         history = BalanceHistory(
             student_id=self.id,
-            previous_balance=previous_balance,
+            previous_balance=new_balance - delta,
             new_balance=new_balance,
-            change_amount=amount,
+            change_amount=delta,
             change_type=change_type,
             reference_id=reference_id,
             description=description,
@@ -66,14 +91,21 @@ class BalanceHistory(db.Model):
     
     id = db.Column(db.Integer, primary_key=True)
     student_id = db.Column(db.Integer, db.ForeignKey('students.id'), nullable=False, index=True)
-    previous_balance = db.Column(db.Numeric(15, 2), nullable=False)
-    new_balance = db.Column(db.Numeric(15, 2), nullable=False)
-    change_amount = db.Column(db.Numeric(15, 2), nullable=False)
+    previous_balance = db.Column(Money, nullable=False)
+    new_balance = db.Column(Money, nullable=False)
+    change_amount = db.Column(Money, nullable=False)
     change_type = db.Column(db.Enum('payment', 'fee_applied', 'adjustment', 'refund'), nullable=False)
     reference_id = db.Column(db.Integer)
     description = db.Column(db.Text)
     created_by = db.Column(db.Integer, db.ForeignKey('users.id'))
     created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
     
+    __table_args__ = (
+        # One student's rows in date order: statements and as-of balances
+        db.Index('ix_balance_history_student_created', 'student_id', 'created_at'),
+        # Ids stay unique across the live and archive tables (see Payment)
+        {'sqlite_autoincrement': True},
+    )
+    
     def __repr__(self):
         return f'<BalanceHistory {self.id}: {self.change_type}>'
\ No newline at end of file
@@ -1,7 +1,18 @@
 from datetime import datetime
 from flask_login import UserMixin
-from werkzeug.security import generate_password_hash, check_password_hash
+from sqlalchemy import select, event, inspect
+from sqlalchemy.orm import Session
 from app import db
+from extensions import user_cache, password_hasher
+
+ROLE_PERMISSIONS = {
+    'admin': ['view', 'create', 'edit', 'delete', 'manage_users'],
+    'accountant': ['view', 'create', 'edit'],
+    'viewer': ['view']
+}
+
+# Changing any of these must evict the user from every worker's cache
+AUTH_FIELDS = ('role', 'is_active', 'password_hash')
 
 class User(UserMixin, db.Model):
     __tablename__ = 'users'
@@ -22,20 +33,72 @@ class User(UserMixin, db.Model):
     
     def set_password(self, password):
         """Hash and set password"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """Check if provided password matches hash"""
-        return check_password_hash(self.password_hash, password)
+        return password_hasher.verify(self.password_hash, password)
+    
+    def upgrade_password_hash(self, password):
+        """Rehash a just-verified password if it was stored with an older method or cost"""
+        if password_hasher.needs_rehash(self.password_hash):
+            self.set_password(password)
+            return True
+        return False
     
     def has_permission(self, permission):
         """Check if user has specific permission"""
-        permissions = {
-            'admin': ['view', 'create', 'edit', 'delete', 'manage_users'],
-            'accountant': ['view', 'create', 'edit'],
-            'viewer': ['view']
-        }
-        return permission in permissions.get(self.role, [])
+        return permission in ROLE_PERMISSIONS.get(self.role, [])
     
     def __repr__(self):
         return f'<User {self.username}>'
+
+class CachedUser(UserMixin):
+    """Detached, read-only snapshot of a User, cached per worker for request authentication.
+    
+    Carries only what views need from current_user; load the User row for
+    anything that reads or writes credentials (e.g. changing a password).
+    """
+    __slots__ = ('id', 'username', 'full_name', 'email', 'role', 'is_active')
+    
+    def __init__(self, id, username, full_name, email, role, is_active):
+        self.id = id
+        self.username = username
+        self.full_name = full_name
+        self.email = email
+        self.role = role
+        self.is_active = is_active
+    
+    @classmethod
+    def load(cls, user_id):
+        row = db.session.execute(
+            select(User.id, User.username, User.full_name, User.email, User.role, User.is_active)
+            .where(User.id == user_id)
+        ).first()
+        return cls(*row) if row else None
+    
+    def has_permission(self, permission):
+        """Check if user has specific permission"""
+        return permission in ROLE_PERMISSIONS.get(self.role, [])
+    
+    def __repr__(self):
+        return f'<CachedUser {self.username}>'
+
+@event.listens_for(Session, 'before_flush')
+def _note_auth_changes(session, flush_context, instances):
+    for user in session.deleted:
+        if isinstance(user, User):
+            session.info['users_changed'] = True
+    for user in session.dirty:
+        if isinstance(user, User) and any(inspect(user).attrs[f].history.has_changes() for f in AUTH_FIELDS):
+            session.info['users_changed'] = True
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_user_cache(session):
+    if session.info.pop('users_changed', False):
+        user_cache.invalidate()
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _discard_auth_changes(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('users_changed', None)
@@ -0,0 +1,46 @@
+import hmac
+from functools import wraps
+from flask import Blueprint, Response, request, jsonify, render_template, current_app
+from flask_login import current_user
+from extensions import request_metrics, slow_query_log
+
+admin_bp = Blueprint('admin', __name__)
+
+def _bearer_token_valid():
+    expected = current_app.config.get('METRICS_TOKEN')
+    supplied = request.headers.get('Authorization', '')
+    return bool(expected) and hmac.compare_digest(supplied, f'Bearer {expected}')
+
+def admin_required(view):
+    """Allow admins only (or a scraper presenting METRICS_TOKEN); unlike login_required, never redirects"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if _bearer_token_valid():
+            return view(*args, **kwargs)
+        if not current_user.is_authenticated:
+            return jsonify({'success': False, 'message': 'Authentication required'}), 401
+        if current_user.role != 'admin':
+            return jsonify({'success': False, 'message': 'Permission denied'}), 403
+        return view(*args, **kwargs)
+    return wrapper
+
+@admin_bp.route('/metrics')
+@admin_required
+def metrics():
+    """Per-endpoint latency and SQL metrics from every worker, in Prometheus text format"""
+    if not request_metrics.enabled:
+        return jsonify({'success': False, 'message': 'Metrics are disabled'}), 404
+    return Response(request_metrics.render(), mimetype='text/plain; version=0.0.4')
+
+@admin_bp.route('/admin/slow-queries')
+@admin_required
+def slow_queries():
+    """Logged slow statements grouped by fingerprint, with their latest plan"""
+    groups = slow_query_log.summary(limit=max(1, min(request.args.get('limit', 100, type=int), 500)))
+    if request.args.get('format') == 'json':
+        return jsonify(groups)
+    return render_template(
+        'admin/slow_queries.html',
+        groups=groups,
+        threshold_ms=current_app.config.get('SLOW_QUERY_MS')
+    )
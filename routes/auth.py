@@ -1,9 +1,9 @@
 from flask import Blueprint, render_template, redirect, url_for, flash, request
 from flask_login import login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash
-from extensions import db
+from extensions import db, audit_log, login_throttle
 from models.user import User
-from models.fee import SystemLog
+from services.passwords import PasswordHasherBusy
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -18,30 +18,47 @@ def login():
         password = request.form.get('password')
         remember = request.form.get('remember', False)
         
+        # Refuse throttled usernames/IPs before spending any time on hashing
+        retry_after = login_throttle.check(username, request.remote_addr)
+        if retry_after:
+            flash(f'Too many failed login attempts. Try again in {retry_after} seconds.', 'error')
+            return render_template('login.html'), 429
+        
         user = User.query.filter_by(username=username).first()
         
-        if user and user.check_password(password):
+        try:
+            valid = user is not None and user.check_password(password)
+        except PasswordHasherBusy:
+            flash('The server is busy. Please try again in a moment.', 'error')
+            return render_template('login.html'), 503
+        
+        if valid:
+            login_throttle.success(username, request.remote_addr)
+            
             if not user.is_active:
                 flash('Your account has been deactivated. Please contact administrator.', 'error')
                 return redirect(url_for('auth.login'))
             
+            # Move hashes made with an older method or cost to the configured one
+            if user.upgrade_password_hash(password):
+                db.session.commit()
+            
             login_user(user, remember=remember)
             
-            # Log the login
-            log = SystemLog(
+            # Log the login (queued; the response does not wait on the write)
+            audit_log.record_now(
                 user_id=user.id,
                 action='login',
                 ip_address=request.remote_addr,
                 details=f'User {username} logged in'
             )
-            db.session.add(log)
-            db.session.commit()
             
             next_page = request.args.get('next')
             if next_page:
                 return redirect(next_page)
             return redirect(url_for('dashboard.index'))
         else:
+            login_throttle.failure(username, request.remote_addr)
             flash('Invalid username or password', 'error')
     
     return render_template('login.html')
@@ -51,14 +68,12 @@ def login():
 def logout():
     """User logout"""
     # Log the logout
-    log = SystemLog(
+    audit_log.record_now(
         user_id=current_user.id,
         action='logout',
         ip_address=request.remote_addr,
         details=f'User {current_user.username} logged out'
     )
-    db.session.add(log)
-    db.session.commit()
     
     logout_user()
     flash('You have been logged out successfully.', 'info')
@@ -73,7 +88,10 @@ def change_password():
         new_password = request.form.get('new_password')
         confirm_password = request.form.get('confirm_password')
         
-        if not current_user.check_password(current_password):
+        # current_user is a cached snapshot without the password hash
+        user = db.session.get(User, current_user.id)
+        
+        if not user.check_password(current_password):
             flash('Current password is incorrect', 'error')
             return redirect(url_for('auth.change_password'))
         
@@ -85,7 +103,7 @@ def change_password():
             flash('Password must be at least 6 characters long', 'error')
             return redirect(url_for('auth.change_password'))
         
-        current_user.set_password(new_password)
+        user.set_password(new_password)
         db.session.commit()
         
         flash('Password changed successfully', 'success')
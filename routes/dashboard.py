@@ -1,11 +1,13 @@
 from flask import Blueprint, render_template, jsonify
 from flask_login import login_required, current_user
 from datetime import datetime, timedelta
-from sqlalchemy import func, extract
-from extensions import db
+from sqlalchemy import func, extract, select
+from extensions import db, stats_cache
 from models.student import Student
 from models.payment import Payment
 from models.fee import FeeStructure
+from models.rollup import PaymentDailyRollup
+from services.rollup import rollup_query
 
 dashboard_bp = Blueprint('dashboard', __name__)
 
@@ -19,50 +21,64 @@ def index():
 @login_required
 def get_stats():
     """Get dashboard statistics"""
-    # Total students
-    total_students = Student.query.filter_by(is_active=True).count()
-    
-    # Fees collected (all time)
-    fees_collected = db.session.query(func.sum(Payment.amount)).scalar() or 0
+    return jsonify(stats_cache.get_or_set('stats', compute_stats))
+
+def compute_stats():
+    """Compute the dashboard figures in a single round trip"""
+    first_day = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
     
-    # Outstanding balance
-    outstanding_balance = db.session.query(func.sum(Student.balance)).scalar() or 0
+    active = Student.is_active == True
+    row = db.session.query(
+        # Total students
+        select(func.count(Student.id)).where(active).scalar_subquery(),
+        # Outstanding balance (active students, as in the report summary)
+        select(func.sum(Student.balance)).where(active).scalar_subquery(),
+        # Fees collected (all time)
+        select(func.sum(PaymentDailyRollup.total_amount)).scalar_subquery(),
+        # This month's payments
+        select(func.sum(PaymentDailyRollup.payment_count)).where(
+            PaymentDailyRollup.payment_date >= first_day.date()
+        ).scalar_subquery()
+    ).one()
     
-    # This month's payments
-    first_day = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    monthly_payments = Payment.query.filter(Payment.payment_date >= first_day).count()
+    total_students, outstanding_balance, fees_collected, monthly_payments = row
     
-    return jsonify({
+    return {
         'total_students': total_students,
-        'fees_collected': float(fees_collected),
-        'outstanding_balance': float(outstanding_balance),
-        'monthly_payments': monthly_payments
-    })
+        'fees_collected': float(fees_collected or 0),
+        'outstanding_balance': float(outstanding_balance or 0),
+        'monthly_payments': monthly_payments or 0,
+        'computed_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z'
+    }
 
 @dashboard_bp.route('/api/dashboard/payment-trends')
 @login_required
 def payment_trends():
     """Get payment trends for the last 6 months"""
-    months_data = []
+    now = datetime.now()
+    month_starts = [
+        (now - timedelta(days=30 * i)).replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+        for i in range(5, -1, -1)
+    ]
+    
+    # One pass over at most ~180 daily rollup rows instead of a SUM per month
+    daily_totals = rollup_query(
+        PaymentDailyRollup.payment_date,
+        func.sum(PaymentDailyRollup.total_amount),
+        date_from=month_starts[0].date(),
+        date_to=now.date()
+    ).group_by(PaymentDailyRollup.payment_date).all()
     
-    for i in range(5, -1, -1):
-        date = datetime.now() - timedelta(days=30 * i)
-        month_start = date.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        
-        if i == 0:
-            month_end = datetime.now()
-        else:
-            next_month = month_start + timedelta(days=32)
-            month_end = next_month.replace(day=1) - timedelta(seconds=1)
-        
-        total = db.session.query(func.sum(Payment.amount)).filter(
-            Payment.payment_date >= month_start.date(),
-            Payment.payment_date <= month_end.date()
-        ).scalar() or 0
-        
+    monthly_totals = {}
+    for payment_date, total in daily_totals:
+        key = (payment_date.year, payment_date.month)
+        monthly_totals[key] = monthly_totals.get(key, 0) + (total or 0)
+    
+    months_data = []
+    for month_start in month_starts:
         months_data.append({
             'month': month_start.strftime('%b %Y'),
-            'amount': float(total)
+            'amount': float(monthly_totals.get((month_start.year, month_start.month), 0))
         })
     
     return jsonify(months_data)
@@ -79,13 +95,13 @@ def payment_calendar(year, month):
         end_date = datetime(year, month + 1, 1).date()
     
     payments = db.session.query(
-        Payment.payment_date,
-        func.count(Payment.id).label('count'),
-        func.sum(Payment.amount).label('total')
+        PaymentDailyRollup.payment_date,
+        func.sum(PaymentDailyRollup.payment_count).label('count'),
+        func.sum(PaymentDailyRollup.total_amount).label('total')
     ).filter(
-        Payment.payment_date >= start_date,
-        Payment.payment_date < end_date
-    ).group_by(Payment.payment_date).all()
+        PaymentDailyRollup.payment_date >= start_date,
+        PaymentDailyRollup.payment_date < end_date
+    ).group_by(PaymentDailyRollup.payment_date).all()
     
     calendar_data = {}
     for payment in payments:
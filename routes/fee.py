@@ -1,10 +1,26 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
-from extensions import db
-from models.fee import FeeStructure, SystemLog
+from extensions import db, fee_cache, audit_log
+from models.fee import FeeStructure
+from models.money import Cents
+from services.streaming import parse_fields, stream_query
+from routes.admin import admin_required
+from sqlalchemy import select
 
 fee_bp = Blueprint('fee', __name__)
 
+# Columns available to the streaming export, keyed like FeeStructure.to_dict()
+STREAM_COLUMNS = {
+    'id': FeeStructure.id,
+    'grade': FeeStructure.grade,
+    'term': FeeStructure.term,
+    'fee_type': FeeStructure.fee_type,
+    'amount': FeeStructure.amount,
+    'description': FeeStructure.description,
+    'academic_year': FeeStructure.academic_year,
+    'is_active': FeeStructure.is_active
+}
+
 @fee_bp.route('/')
 @login_required
 def index():
@@ -31,6 +47,34 @@ def api_list():
     fees = FeeStructure.query.filter_by(is_active=True).all()
     return jsonify([fee.to_dict() for fee in fees])
 
+@fee_bp.route('/api/stream')
+@login_required
+def api_stream():
+    """Streaming API endpoint to export active fee structures (?format=ndjson|json&fields=...)"""
+    try:
+        fields = parse_fields(request.args.get('fields'), STREAM_COLUMNS)
+        
+        statement = select(*[STREAM_COLUMNS[f] for f in fields]).where(FeeStructure.is_active == True)
+        
+        if request.args.get('grade'):
+            statement = statement.where(FeeStructure.grade == request.args.get('grade'))
+        
+        if request.args.get('term'):
+            statement = statement.where(FeeStructure.term == request.args.get('term'))
+        
+        statement = statement.order_by(FeeStructure.grade, FeeStructure.term, FeeStructure.id)
+        
+        return stream_query(statement, fields, request.args.get('format', 'ndjson'))
+    
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+
+@fee_bp.route('/api/cache-stats')
+@admin_required
+def api_cache_stats():
+    """API endpoint to get fee cache hit and miss counters for this worker"""
+    return jsonify(fee_cache.stats())
+
 @fee_bp.route('/create', methods=['GET', 'POST'])
 @login_required
 def create():
@@ -45,16 +89,16 @@ def create():
                 grade=request.form.get('grade'),
                 term=request.form.get('term'),
                 fee_type=request.form.get('fee_type'),
-                amount=float(request.form.get('amount')),
+                amount=Cents.parse(request.form.get('amount')),
                 description=request.form.get('description'),
                 academic_year=request.form.get('academic_year')
             )
             
             db.session.add(fee)
-            db.session.commit()
+            db.session.flush()
             
-            # Log the action
-            log = SystemLog(
+            # Log the action in the same transaction
+            audit_log.record(
                 user_id=current_user.id,
                 action='create_fee',
                 entity_type='fee',
@@ -62,8 +106,8 @@ def create():
                 details=f'Created fee: Grade {fee.grade} - {fee.fee_type}',
                 ip_address=request.remote_addr
             )
-            db.session.add(log)
             db.session.commit()
+            fee_cache.invalidate()
             
             flash('Fee structure created successfully', 'success')
             return redirect(url_for('fee.index'))
@@ -89,14 +133,12 @@ def edit(fee_id):
             fee.grade = request.form.get('grade')
             fee.term = request.form.get('term')
             fee.fee_type = request.form.get('fee_type')
-            fee.amount = float(request.form.get('amount'))
+            fee.amount = Cents.parse(request.form.get('amount'))
             fee.description = request.form.get('description')
             fee.academic_year = request.form.get('academic_year')
             
-            db.session.commit()
-            
-            # Log the action
-            log = SystemLog(
+            # Log the action in the same transaction
+            audit_log.record(
                 user_id=current_user.id,
                 action='edit_fee',
                 entity_type='fee',
@@ -104,8 +146,8 @@ def edit(fee_id):
                 details=f'Updated fee: Grade {fee.grade} - {fee.fee_type}',
                 ip_address=request.remote_addr
             )
-            db.session.add(log)
             db.session.commit()
+            fee_cache.invalidate()
             
             flash('Fee structure updated successfully', 'success')
             return redirect(url_for('fee.index'))
@@ -128,10 +170,8 @@ def delete(fee_id):
         
         # Soft delete
         fee.is_active = False
-        db.session.commit()
-        
-        # Log the action
-        log = SystemLog(
+        # Log the action in the same transaction
+        audit_log.record(
             user_id=current_user.id,
             action='delete_fee',
             entity_type='fee',
@@ -139,8 +179,8 @@ def delete(fee_id):
             details=f'Deleted fee: Grade {fee.grade} - {fee.fee_type}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
         db.session.commit()
+        fee_cache.invalidate()
         
         return jsonify({'success': True, 'message': 'Fee structure deleted successfully'})
     
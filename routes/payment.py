@@ -1,18 +1,39 @@
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, current_app, send_from_directory, abort
 from flask_login import login_required, current_user
-from datetime import datetime
-from extensions import db
+from datetime import date, datetime
+import os
+from extensions import db, ledger_stamp, audit_log
 from models.payment import Payment
 from models.student import Student
-from models.fee import SystemLog
+from models.money import Cents
+from services.payment_import import read_statement, import_payments, StatementError
+from services.streaming import parse_fields, stream_query
+from services.pagination import keyset_paginate, paginate_ranked, cached_count
+from services.search import search_payments, best_then_newest, MAX_RESULTS
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload, contains_eager
+from services.query_guard import query_limit
+from services import rollup, aging, archive
 
 payment_bp = Blueprint('payment', __name__)
 
+# Columns available to the streaming export, keyed like Payment.to_dict()
+STREAM_COLUMNS = {
+    'id': Payment.id,
+    'student_id': Payment.student_id,
+    'student_name': Student.full_name,
+    'amount': Payment.amount,
+    'fee_type': Payment.fee_type,
+    'payment_method': Payment.payment_method,
+    'payment_date': Payment.payment_date,
+    'receipt_number': Payment.receipt_number,
+    'transaction_reference': Payment.transaction_reference
+}
+
 @payment_bp.route('/')
 @login_required
 def index():
     """List all payments"""
-    page = request.args.get('page', 1, type=int)
     per_page = 50
     
     search = request.args.get('search', '')
@@ -20,38 +41,115 @@ def index():
     date_from = request.args.get('date_from', '')
     date_to = request.args.get('date_to', '')
     
-    query = Payment.query.join(Student)
+    start = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None
+    end = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
     
-    if search:
-        query = query.filter(
-            db.or_(
-                Student.full_name.ilike(f'%{search}%'),
-                Payment.receipt_number.ilike(f'%{search}%'),
-                Payment.transaction_reference.ilike(f'%{search}%')
-            )
-        )
+    # Searches stay on the live table; a date range reaching a closed year also reads its archive
+    payments_source = Payment if search else archive.payments(start, end)
+    query = (
+        db.session.query(payments_source)
+        .join(Student, payments_source.student_id == Student.id)
+        .options(contains_eager(payments_source.student))
+    )
     
     if method_filter:
-        query = query.filter(Payment.payment_method == method_filter)
+        query = query.filter(payments_source.payment_method == method_filter)
     
-    if date_from:
-        query = query.filter(Payment.payment_date >= datetime.strptime(date_from, '%Y-%m-%d').date())
+    if start:
+        query = query.filter(payments_source.payment_date >= start)
     
-    if date_to:
-        query = query.filter(Payment.payment_date <= datetime.strptime(date_to, '%Y-%m-%d').date())
+    if end:
+        query = query.filter(payments_source.payment_date <= end)
     
-    payments = query.order_by(Payment.payment_date.desc()).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    if search:
+        # Ranked matches from the search index instead of a paginated full scan, paged by (score, id)
+        results = search_payments(search, limit=MAX_RESULTS, query=query)
+        try:
+            payments = paginate_ranked(
+                results, best_then_newest,
+                after=request.args.get('after'), before=request.args.get('before'), per_page=per_page
+            )
+        except ValueError:
+            return redirect(url_for('payment.index', search=search, method=method_filter,
+                                    date_from=date_from, date_to=date_to))
+        payments.items = [payment for payment, score in payments.items]
+        return render_template('payments/list.html', payments=payments, search=search, method_filter=method_filter,
+                               date_from=date_from, date_to=date_to)
+    
+    try:
+        payments = keyset_paginate(
+            query, [payments_source.payment_date, payments_source.id],
+            after=request.args.get('after'), before=request.args.get('before'),
+            per_page=per_page, descending=True
+        )
+    except ValueError:
+        return redirect(url_for('payment.index', search=search, method=method_filter,
+                                date_from=date_from, date_to=date_to))
     
-    return render_template('payments/list.html', payments=payments, search=search, method_filter=method_filter)
+    payments.total = cached_count(('payments', method_filter, date_from, date_to), query)
+    
+    return render_template('payments/list.html', payments=payments, search=search, method_filter=method_filter,
+                           date_from=date_from, date_to=date_to)
 
 @payment_bp.route('/api/list')
 @login_required
 def api_list():
-    """API endpoint to get all payments"""
-    payments = Payment.query.order_by(Payment.payment_date.desc()).limit(100).all()
-    return jsonify([payment.to_dict() for payment in payments])
+    """API endpoint to get recent payments (pass limit/after/before for cursor pages)"""
+    if not any(arg in request.args for arg in ('limit', 'after', 'before')):
+        payments = Payment.query.options(joinedload(Payment.student)).order_by(Payment.payment_date.desc()).limit(100).all()
+        return jsonify([payment.to_dict() for payment in payments])
+    
+    try:
+        page = keyset_paginate(
+            Payment.query.options(joinedload(Payment.student)), [Payment.payment_date, Payment.id],
+            after=request.args.get('after'), before=request.args.get('before'),
+            per_page=max(1, min(request.args.get('limit', 50, type=int), 500)), descending=True
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if request.args.get('count', type=int):
+        page.total = cached_count(('payments', '', '', ''), Payment.query)
+    
+    return jsonify(page.to_dict())
+
+@payment_bp.route('/api/stream')
+@login_required
+def api_stream():
+    """Streaming API endpoint to export payments (?format=ndjson|json&fields=...)"""
+    try:
+        fields = parse_fields(request.args.get('fields'), STREAM_COLUMNS)
+        date_from = datetime.strptime(request.args['date_from'], '%Y-%m-%d').date() if request.args.get('date_from') else None
+        date_to = datetime.strptime(request.args['date_to'], '%Y-%m-%d').date() if request.args.get('date_to') else None
+        
+        payments = archive.payments(date_from, date_to)
+        columns = {
+            field: getattr(payments, field) if column.class_ is Payment else column
+            for field, column in STREAM_COLUMNS.items()
+        }
+        statement = select(*[columns[f] for f in fields]).select_from(payments)
+        
+        if 'student_name' in fields:
+            statement = statement.outerjoin(Student, payments.student_id == Student.id)
+        
+        if request.args.get('student_id'):
+            statement = statement.where(payments.student_id == request.args.get('student_id', type=int))
+        
+        if request.args.get('method'):
+            statement = statement.where(payments.payment_method == request.args.get('method'))
+        
+        if date_from:
+            statement = statement.where(payments.payment_date >= date_from)
+        
+        if date_to:
+            statement = statement.where(payments.payment_date <= date_to)
+        
+        statement = statement.order_by(payments.payment_date.desc(), payments.id.desc())
+        
+        return stream_query(statement, fields, request.args.get('format', 'ndjson'))
+    
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
 
 @payment_bp.route('/create', methods=['GET', 'POST'])
 @login_required
@@ -64,7 +162,7 @@ def create():
     if request.method == 'POST':
         try:
             student_id = int(request.form.get('student_id'))
-            amount = float(request.form.get('amount'))
+            amount = Cents.parse(request.form.get('amount'))
             
             student = Student.query.get_or_404(student_id)
             
@@ -80,6 +178,7 @@ def create():
                 fee_type=request.form.get('fee_type'),
                 payment_method=request.form.get('payment_method'),
                 payment_date=datetime.strptime(request.form.get('payment_date'), '%Y-%m-%d').date(),
+                grade=student.grade,
                 transaction_reference=request.form.get('transaction_reference'),
                 receipt_number=Payment.generate_receipt_number(),
                 notes=request.form.get('notes'),
@@ -87,8 +186,9 @@ def create():
             )
             
             db.session.add(payment)
+            db.session.flush()
             
-            # Update student balance (subtract payment)
+            # Update student balance (subtract payment) with an atomic in-database decrement
             student.update_balance(
                 amount=-amount,
                 change_type='payment',
@@ -97,10 +197,12 @@ def create():
                 reference_id=payment.id
             )
             
-            db.session.commit()
+            # Keep the daily rollup and debt aging in step within the same transaction
+            rollup.record_payment(payment)
+            aging.refresh([student.id])
             
-            # Log the action
-            log = SystemLog(
+            # Log the action in the same transaction
+            audit_log.record(
                 user_id=current_user.id,
                 action='create_payment',
                 entity_type='payment',
@@ -108,8 +210,8 @@ def create():
                 details=f'Payment of {amount} from {student.full_name}',
                 ip_address=request.remote_addr
             )
-            db.session.add(log)
             db.session.commit()
+            ledger_stamp.bump()
             
             flash(f'Payment recorded successfully. Receipt #: {payment.receipt_number}', 'success')
             return jsonify({
@@ -125,6 +227,59 @@ def create():
     students = Student.query.filter_by(is_active=True).order_by(Student.full_name).all()
     return render_template('payments/form.html', students=students)
 
+@payment_bp.route('/import', methods=['POST'])
+@login_required
+@query_limit(None)
+def import_statement():
+    """Import payments from a bank or M-Pesa statement (CSV or XLSX)"""
+    if not current_user.has_permission('create'):
+        return jsonify({'success': False, 'message': 'Permission denied'}), 403
+    
+    statement = request.files.get('file')
+    payment_method = request.form.get('payment_method', 'M-Pesa')
+    dry_run = request.form.get('dry_run', '').lower() in ('1', 'true', 'yes', 'on')
+    
+    if not statement or not statement.filename:
+        return jsonify({'success': False, 'message': 'No statement file uploaded'}), 400
+    
+    if payment_method not in Payment.payment_method.type.enums:
+        return jsonify({'success': False, 'message': f'Unknown payment method {payment_method}'}), 400
+    
+    upload_dir = os.path.join(current_app.instance_path, current_app.config['UPLOAD_FOLDER'])
+    os.makedirs(upload_dir, exist_ok=True)
+    rejects_name = f'rejects-{datetime.now():%Y%m%d%H%M%S%f}-{current_user.id}.csv'
+    
+    try:
+        result = import_payments(
+            read_statement(statement.stream, statement.filename),
+            payment_method=payment_method,
+            fee_type=request.form.get('fee_type') or 'Tuition',
+            user_id=current_user.id,
+            ip_address=request.remote_addr,
+            rejects_path=os.path.join(upload_dir, rejects_name),
+            dry_run=dry_run
+        )
+    except StatementError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
+    
+    if result['rejected']:
+        result['rejects_url'] = url_for('payment.import_rejects', filename=rejects_name)
+    
+    return jsonify({'success': True, **result})
+
+@payment_bp.route('/import/rejects/<path:filename>')
+@login_required
+def import_rejects(filename):
+    """Download the reject file of a statement import"""
+    if not current_user.has_permission('create'):
+        return jsonify({'success': False, 'message': 'Permission denied'}), 403
+    
+    upload_dir = os.path.join(current_app.instance_path, current_app.config['UPLOAD_FOLDER'])
+    return send_from_directory(upload_dir, filename, as_attachment=True)
+
 @payment_bp.route('/delete/<int:payment_id>', methods=['POST'])
 @login_required
 def delete(payment_id):
@@ -133,9 +288,9 @@ def delete(payment_id):
         return jsonify({'success': False, 'message': 'Permission denied'}), 403
     
     try:
-        payment = Payment.query.get_or_404(payment_id)
+        payment = Payment.query.options(joinedload(Payment.student)).get_or_404(payment_id)
         student = payment.student
-        amount = float(payment.amount)
+        amount = payment.amount
         
         # Restore balance to student
         student.update_balance(
@@ -146,11 +301,11 @@ def delete(payment_id):
         )
         
         # Delete payment
+        rollup.record_payment(payment, sign=-1)
+        aging.refresh([student.id])
         db.session.delete(payment)
-        db.session.commit()
-        
-        # Log the action
-        log = SystemLog(
+        # Log the action in the same transaction
+        audit_log.record(
             user_id=current_user.id,
             action='delete_payment',
             entity_type='payment',
@@ -158,8 +313,8 @@ def delete(payment_id):
             details=f'Deleted payment {payment.receipt_number}, restored balance',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
         db.session.commit()
+        ledger_stamp.bump()
         
         return jsonify({
             'success': True,
@@ -170,18 +325,28 @@ def delete(payment_id):
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _find_payment(payment_id):
+    """A payment by id, looked up in the archive of closed years if it is no longer live"""
+    payment = Payment.query.options(joinedload(Payment.student)).get(payment_id)
+    if payment is None and archive.hot_start():
+        archived = archive.payments(date.min)
+        payment = db.session.query(archived).options(joinedload(archived.student)).filter(archived.id == payment_id).first()
+    if payment is None:
+        abort(404)
+    return payment
+
 @payment_bp.route('/receipt/<int:payment_id>')
 @login_required
 def receipt(payment_id):
     """View payment receipt"""
-    payment = Payment.query.get_or_404(payment_id)
+    payment = _find_payment(payment_id)
     return render_template('payments/receipt.html', payment=payment)
 
 @payment_bp.route('/api/receipt/<int:payment_id>')
 @login_required
 def api_receipt(payment_id):
     """API endpoint to get receipt data"""
-    payment = Payment.query.get_or_404(payment_id)
+    payment = _find_payment(payment_id)
     student = payment.student
     
     return jsonify({
@@ -2,10 +2,15 @@ from flask import Blueprint, render_template, request, jsonify
 from flask_login import login_required
 from datetime import datetime, timedelta
 from sqlalchemy import func
-from extensions import db
+from extensions import db, report_cache, ledger_stamp
 from models.student import Student
 from models.payment import Payment
 from models.fee import FeeStructure
+from models.rollup import PaymentDailyRollup
+from services import aging
+
+# Debtors in the report bundle; the rest are paged through /api/defaulters
+BUNDLE_DEFAULTERS = 50
 
 report_bp = Blueprint('report', __name__)
 
@@ -15,23 +20,113 @@ def index():
     """Reports dashboard"""
     return render_template('reports/index.html')
 
+def _date_range():
+    """Parse ?date_from= and ?date_to= once per request"""
+    date_from = request.args.get('date_from')
+    date_to = request.args.get('date_to')
+    return (
+        datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None,
+        datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
+    )
+
+def _roll_aging_forward():
+    """Move debts whose charges have aged into the next bucket since they were last aged"""
+    if aging.roll_forward():
+        # Cached bundles hold the old buckets
+        ledger_stamp.bump()
+
+@report_bp.route('/api/bundle')
+@login_required
+def bundle():
+    """Get every report panel (summary, by grade, by method, defaulters) in one response"""
+    try:
+        date_from, date_to = _date_range()
+    except ValueError:
+        return jsonify({'success': False, 'message': 'Dates must be YYYY-MM-DD'}), 400
+    
+    threshold = request.args.get('threshold', 0, type=float)
+    key = (date_from and date_from.isoformat(), date_to and date_to.isoformat(), threshold)
+    _roll_aging_forward()
+    
+    return jsonify(report_cache.get_or_set(key, lambda: build_bundle(date_from, date_to, threshold)))
+
+def build_bundle(date_from, date_to, threshold=0):
+    """Compute all report panels from a single pass over the date-filtered rollup"""
+    query = db.session.query(
+        PaymentDailyRollup.grade,
+        PaymentDailyRollup.payment_method,
+        func.sum(PaymentDailyRollup.payment_count).label('count'),
+        func.sum(PaymentDailyRollup.total_amount).label('total')
+    ).group_by(PaymentDailyRollup.grade, PaymentDailyRollup.payment_method)
+    
+    if date_from:
+        query = query.filter(PaymentDailyRollup.payment_date >= date_from)
+    
+    if date_to:
+        query = query.filter(PaymentDailyRollup.payment_date <= date_to)
+    
+    by_grade = {}
+    by_method = {}
+    total_collected = 0
+    payment_count = 0
+    
+    for r in query.all():
+        by_grade[r.grade] = by_grade.get(r.grade, 0) + r.total
+        count, total = by_method.get(r.payment_method, (0, 0))
+        by_method[r.payment_method] = (count + r.count, total + r.total)
+        total_collected += r.total
+        payment_count += r.count
+    
+    # Total outstanding
+    total_outstanding = db.session.query(func.sum(Student.balance)).filter(Student.is_active == True).scalar() or 0
+    
+    # Collection rate
+    total_expected = float(total_collected) + float(total_outstanding)
+    collection_rate = (float(total_collected) / total_expected * 100) if total_expected > 0 else 0
+    
+    defaulters = aging.debtors_page(threshold=threshold, limit=BUNDLE_DEFAULTERS)
+    
+    grades = sorted(by_grade)
+    methods = sorted(by_method)
+    
+    return {
+        'summary': {
+            'total_collected': float(total_collected),
+            'total_outstanding': float(total_outstanding),
+            'collection_rate': round(collection_rate, 1),
+            'payment_count': payment_count
+        },
+        'payment_by_grade': {
+            'labels': [f'Grade {g}' for g in grades],
+            'amounts': [float(by_grade[g]) for g in grades]
+        },
+        'payment_by_method': {
+            'labels': methods,
+            'counts': [by_method[m][0] for m in methods],
+            'amounts': [float(by_method[m][1]) for m in methods]
+        },
+        'defaulters': [row.to_dict() for row in defaulters.items],
+        'defaulters_next_cursor': defaulters.next_cursor,
+        'aging': aging.totals(threshold=threshold),
+        'computed_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z'
+    }
+
 @report_bp.route('/api/payment-by-grade')
 @login_required
 def payment_by_grade():
     """Get payment distribution by grade"""
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
+    date_from, date_to = _date_range()
     
     query = db.session.query(
-        Student.grade,
-        func.sum(Payment.amount).label('total')
-    ).join(Payment).group_by(Student.grade)
+        PaymentDailyRollup.grade,
+        func.sum(PaymentDailyRollup.total_amount).label('total')
+    ).group_by(PaymentDailyRollup.grade).order_by(PaymentDailyRollup.grade)
     
     if date_from:
-        query = query.filter(Payment.payment_date >= datetime.strptime(date_from, '%Y-%m-%d').date())
+        query = query.filter(PaymentDailyRollup.payment_date >= date_from)
     
     if date_to:
-        query = query.filter(Payment.payment_date <= datetime.strptime(date_to, '%Y-%m-%d').date())
+        query = query.filter(PaymentDailyRollup.payment_date <= date_to)
     
     results = query.all()
     
@@ -46,20 +141,19 @@ def payment_by_grade():
 @login_required
 def payment_by_method():
     """Get payment distribution by method"""
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
+    date_from, date_to = _date_range()
     
     query = db.session.query(
-        Payment.payment_method,
-        func.count(Payment.id).label('count'),
-        func.sum(Payment.amount).label('total')
-    ).group_by(Payment.payment_method)
+        PaymentDailyRollup.payment_method,
+        func.sum(PaymentDailyRollup.payment_count).label('count'),
+        func.sum(PaymentDailyRollup.total_amount).label('total')
+    ).group_by(PaymentDailyRollup.payment_method)
     
     if date_from:
-        query = query.filter(Payment.payment_date >= datetime.strptime(date_from, '%Y-%m-%d').date())
+        query = query.filter(PaymentDailyRollup.payment_date >= date_from)
     
     if date_to:
-        query = query.filter(Payment.payment_date <= datetime.strptime(date_to, '%Y-%m-%d').date())
+        query = query.filter(PaymentDailyRollup.payment_date <= date_to)
     
     results = query.all()
     
@@ -75,19 +169,22 @@ def payment_by_method():
 @login_required
 def summary():
     """Get report summary"""
-    date_from = request.args.get('date_from')
-    date_to = request.args.get('date_to')
+    date_from, date_to = _date_range()
     
-    # Total collected
-    query = db.session.query(func.sum(Payment.amount))
+    # Total collected and number of payments, from the daily rollup
+    query = db.session.query(
+        func.sum(PaymentDailyRollup.total_amount),
+        func.sum(PaymentDailyRollup.payment_count)
+    )
     
     if date_from:
-        query = query.filter(Payment.payment_date >= datetime.strptime(date_from, '%Y-%m-%d').date())
+        query = query.filter(PaymentDailyRollup.payment_date >= date_from)
     
     if date_to:
-        query = query.filter(Payment.payment_date <= datetime.strptime(date_to, '%Y-%m-%d').date())
+        query = query.filter(PaymentDailyRollup.payment_date <= date_to)
     
-    total_collected = query.scalar() or 0
+    total_collected, payment_count = query.one()
+    total_collected = total_collected or 0
     
     # Total outstanding
     total_outstanding = db.session.query(func.sum(Student.balance)).filter(Student.is_active == True).scalar() or 0
@@ -96,36 +193,30 @@ def summary():
     total_expected = float(total_collected) + float(total_outstanding)
     collection_rate = (float(total_collected) / total_expected * 100) if total_expected > 0 else 0
     
-    # Number of payments
-    payment_count = db.session.query(func.count(Payment.id))
-    if date_from:
-        payment_count = payment_count.filter(Payment.payment_date >= datetime.strptime(date_from, '%Y-%m-%d').date())
-    if date_to:
-        payment_count = payment_count.filter(Payment.payment_date <= datetime.strptime(date_to, '%Y-%m-%d').date())
-    
     return jsonify({
         'total_collected': float(total_collected),
         'total_outstanding': float(total_outstanding),
         'collection_rate': round(collection_rate, 1),
-        'payment_count': payment_count.scalar()
+        'payment_count': payment_count or 0
     })
 
 @report_bp.route('/api/defaulters')
 @login_required
 def defaulters():
-    """Get list of students with outstanding balances"""
+    """Get students with outstanding balances, largest first, with debt aging (?grade=&limit=&after=&before=)"""
     threshold = request.args.get('threshold', 0, type=float)
-    
-    students = Student.query.filter(
-        Student.is_active == True,
-        Student.balance > threshold
-    ).order_by(Student.balance.desc()).all()
-    
-    return jsonify([{
-        'id': s.id,
-        'student_number': s.student_number,
-        'full_name': s.full_name,
-        'grade': s.grade,
-        'balance': float(s.balance),
-        'guardian_contact': s.guardian_contact
-    } for s in students])
\ No newline at end of file
+    grade = request.args.get('grade') or None
+    _roll_aging_forward()
+    
+    try:
+        page = aging.debtors_page(
+            grade=grade, threshold=threshold,
+            after=request.args.get('after'), before=request.args.get('before'),
+            limit=max(1, min(request.args.get('limit', 50, type=int), 500))
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    result = page.to_dict()
+    result['totals'] = aging.totals(grade=grade, threshold=threshold)
+    return jsonify(result)
\ No newline at end of file
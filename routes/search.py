@@ -0,0 +1,24 @@
+from flask import Blueprint, request, jsonify
+from flask_login import login_required
+from sqlalchemy.orm import joinedload
+from models.payment import Payment
+from services.search import search_students, search_payments
+
+search_bp = Blueprint('search', __name__)
+
+@search_bp.route('/api')
+@login_required
+def api_search():
+    """Ranked, typo-tolerant search over students or payments (?q=&type=students|payments)"""
+    term = request.args.get('q', '').strip()
+    search_type = request.args.get('type', 'students')
+    limit = max(1, min(request.args.get('limit', 20, type=int), 100))
+    
+    if search_type == 'students':
+        results = search_students(term, limit=limit, grade=request.args.get('grade') or None)
+    elif search_type == 'payments':
+        results = search_payments(term, limit=limit, query=Payment.query.options(joinedload(Payment.student)))
+    else:
+        return jsonify({'success': False, 'message': f'Unknown search type {search_type}'}), 400
+    
+    return jsonify([{**item.to_dict(), 'score': score} for item, score in results])
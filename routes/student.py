@@ -1,48 +1,116 @@
 from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
 from flask_login import login_required, current_user
 from datetime import datetime
-from extensions import db
+from extensions import db, ledger_stamp, audit_log, student_numbers
 from models.student import Student
-from models.fee import FeeStructure, SystemLog
+from models.fee import FeeStructure
+from models.money import Cents
+from services import fee_application, aging
+from services.streaming import parse_fields, stream_query
+from services.pagination import keyset_paginate, paginate_ranked, cached_count
+from services.search import search_students, best_first, MAX_RESULTS
+from services.checkpoints import balance_as_of, statement_summary
+from services.statements import statement_page, stream_statement_csv, line_to_dict
+from services.query_guard import query_limit
+from sqlalchemy import select
 
 student_bp = Blueprint('student', __name__)
 
+# Columns available to the streaming export, keyed like Student.to_dict()
+STREAM_COLUMNS = {
+    'id': Student.id,
+    'student_number': Student.student_number,
+    'full_name': Student.full_name,
+    'grade': Student.grade,
+    'guardian_name': Student.guardian_name,
+    'guardian_contact': Student.guardian_contact,
+    'guardian_email': Student.guardian_email,
+    'balance': Student.balance,
+    'is_active': Student.is_active,
+    'enrollment_date': Student.enrollment_date
+}
+
 @student_bp.route('/')
 @login_required
 def index():
     """List all students"""
-    page = request.args.get('page', 1, type=int)
     per_page = 50
     
     search = request.args.get('search', '')
     grade_filter = request.args.get('grade', '')
     
-    query = Student.query.filter_by(is_active=True)
-    
     if search:
-        query = query.filter(
-            db.or_(
-                Student.full_name.ilike(f'%{search}%'),
-                Student.student_number.ilike(f'%{search}%'),
-                Student.guardian_contact.ilike(f'%{search}%')
+        # Ranked matches from the search index instead of a paginated full scan, paged by (score, id)
+        results = search_students(search, limit=MAX_RESULTS, grade=grade_filter or None)
+        try:
+            students = paginate_ranked(
+                results, best_first,
+                after=request.args.get('after'), before=request.args.get('before'), per_page=per_page
             )
-        )
+        except ValueError:
+            return redirect(url_for('student.index', search=search, grade=grade_filter))
+        students.items = [student for student, score in students.items]
+        return render_template('students/list.html', students=students, search=search, grade_filter=grade_filter)
+    
+    query = Student.query.filter_by(is_active=True)
     
     if grade_filter:
         query = query.filter_by(grade=grade_filter)
     
-    students = query.order_by(Student.full_name).paginate(
-        page=page, per_page=per_page, error_out=False
-    )
+    try:
+        students = keyset_paginate(
+            query, [Student.full_name, Student.id],
+            after=request.args.get('after'), before=request.args.get('before'), per_page=per_page
+        )
+    except ValueError:
+        return redirect(url_for('student.index', search=search, grade=grade_filter))
+    
+    students.total = cached_count(('students', grade_filter), query)
     
     return render_template('students/list.html', students=students, search=search, grade_filter=grade_filter)
 
 @student_bp.route('/api/list')
 @login_required
 def api_list():
-    """API endpoint to get all students"""
-    students = Student.query.filter_by(is_active=True).order_by(Student.full_name).all()
-    return jsonify([student.to_dict() for student in students])
+    """API endpoint to get all students (pass limit/after/before for cursor pages)"""
+    query = Student.query.filter_by(is_active=True)
+    
+    if not any(arg in request.args for arg in ('limit', 'after', 'before')):
+        students = query.order_by(Student.full_name).all()
+        return jsonify([student.to_dict() for student in students])
+    
+    try:
+        page = keyset_paginate(
+            query, [Student.full_name, Student.id],
+            after=request.args.get('after'), before=request.args.get('before'),
+            per_page=max(1, min(request.args.get('limit', 50, type=int), 500))
+        )
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if request.args.get('count', type=int):
+        page.total = cached_count(('students', ''), query)
+    
+    return jsonify(page.to_dict())
+
+@student_bp.route('/api/stream')
+@login_required
+def api_stream():
+    """Streaming API endpoint to export active students (?format=ndjson|json&fields=...)"""
+    try:
+        fields = parse_fields(request.args.get('fields'), STREAM_COLUMNS)
+        
+        statement = select(*[STREAM_COLUMNS[f] for f in fields]).where(Student.is_active == True)
+        
+        if request.args.get('grade'):
+            statement = statement.where(Student.grade == request.args.get('grade'))
+        
+        statement = statement.order_by(Student.full_name, Student.id)
+        
+        return stream_query(statement, fields, request.args.get('format', 'ndjson'))
+    
+    except ValueError as e:
+        return jsonify({'success': False, 'message': str(e)}), 400
 
 @student_bp.route('/api/<int:student_id>')
 @login_required
@@ -51,6 +119,84 @@ def api_get(student_id):
     student = Student.query.get_or_404(student_id)
     return jsonify(student.to_dict())
 
+@student_bp.route('/api/<int:student_id>/balance')
+@login_required
+def api_balance(student_id):
+    """API endpoint to get a student's balance at the end of a past date (?as_of=YYYY-MM-DD)"""
+    student = Student.query.get_or_404(student_id)
+    
+    try:
+        as_of = datetime.strptime(request.args['as_of'], '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'message': 'as_of must be a date (YYYY-MM-DD)'}), 400
+    
+    balance, checkpoint, tail_rows = balance_as_of(student.id, as_of)
+    return jsonify({
+        'student_id': student.id,
+        'as_of': as_of.isoformat(),
+        'balance': float(balance),
+        'checkpoint': checkpoint.isoformat() if checkpoint else None,
+        'tail_rows': tail_rows
+    })
+
+@student_bp.route('/api/<int:student_id>/statement')
+@login_required
+def api_statement(student_id):
+    """API endpoint for a student's opening and closing balance over a date range, with totals by type"""
+    student = Student.query.get_or_404(student_id)
+    
+    try:
+        date_from = datetime.strptime(request.args['date_from'], '%Y-%m-%d').date()
+        date_to = datetime.strptime(request.args.get('date_to') or datetime.utcnow().strftime('%Y-%m-%d'), '%Y-%m-%d').date()
+    except (KeyError, ValueError):
+        return jsonify({'success': False, 'message': 'date_from and date_to must be dates (YYYY-MM-DD)'}), 400
+    if date_to < date_from:
+        return jsonify({'success': False, 'message': 'date_to is before date_from'}), 400
+    
+    return jsonify(statement_summary(student.id, date_from, date_to))
+
+@student_bp.route('/<int:student_id>/statement')
+@login_required
+def statement(student_id):
+    """Student ledger statement with running balances (?format=html|json|csv, date_from, date_to, after/before)"""
+    student = Student.query.get_or_404(student_id)
+    fmt = request.args.get('format', 'html')
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    
+    try:
+        start = datetime.strptime(date_from, '%Y-%m-%d').date() if date_from else None
+        end = datetime.strptime(date_to, '%Y-%m-%d').date() if date_to else None
+    except ValueError:
+        return jsonify({'success': False, 'message': 'date_from and date_to must be dates (YYYY-MM-DD)'}), 400
+    
+    if fmt == 'csv':
+        return stream_statement_csv(student.id, f'statement-{student.student_number}.csv', start, end)
+    if fmt not in ('html', 'json'):
+        return jsonify({'success': False, 'message': f'Unsupported format {fmt}'}), 400
+    
+    try:
+        page = statement_page(
+            student.id, start, end,
+            after=request.args.get('after'), before=request.args.get('before'),
+            per_page=max(1, min(request.args.get('limit', 50, type=int), 500))
+        )
+    except ValueError as e:
+        if fmt == 'html':
+            return redirect(url_for('student.statement', student_id=student.id, date_from=date_from, date_to=date_to))
+        return jsonify({'success': False, 'message': str(e)}), 400
+    
+    if fmt == 'json':
+        return jsonify({
+            'student': student.to_dict(),
+            'opening_balance': float(page['opening_balance']),
+            'items': [line_to_dict(line) for line in page['lines']],
+            'next_cursor': page['next_cursor'],
+            'prev_cursor': page['prev_cursor']
+        })
+    return render_template('students/statement.html', student=student, page=page,
+                           date_from=date_from, date_to=date_to)
+
 @student_bp.route('/create', methods=['GET', 'POST'])
 @login_required
 def create():
@@ -61,16 +207,8 @@ def create():
     
     if request.method == 'POST':
         try:
-            # Generate student number
-            last_student = Student.query.order_by(Student.id.desc()).first()
-            if last_student and last_student.student_number.startswith('STU'):
-                last_num = int(last_student.student_number[3:])
-                student_number = f'STU{str(last_num + 1).zfill(3)}'
-            else:
-                student_number = 'STU001'
-            
             student = Student(
-                student_number=student_number,
+                student_number=student_numbers.next(),
                 full_name=request.form.get('full_name'),
                 grade=request.form.get('grade'),
                 guardian_name=request.form.get('guardian_name'),
@@ -81,7 +219,7 @@ def create():
             )
             
             # Calculate initial balance from fee structure
-            initial_balance = float(request.form.get('balance', 0))
+            initial_balance = Cents.parse(request.form.get('balance') or 0)
             if initial_balance == 0:
                 # Auto-calculate from fee structure
                 grade = request.form.get('grade')
@@ -91,10 +229,11 @@ def create():
                 student.balance = initial_balance
             
             db.session.add(student)
-            db.session.commit()
+            db.session.flush()
+            aging.refresh([student.id])
             
-            # Log the action
-            log = SystemLog(
+            # Log the action in the same transaction
+            audit_log.record(
                 user_id=current_user.id,
                 action='create_student',
                 entity_type='student',
@@ -102,8 +241,8 @@ def create():
                 details=f'Created student: {student.full_name}',
                 ip_address=request.remote_addr
             )
-            db.session.add(log)
             db.session.commit()
+            ledger_stamp.bump()
             
             flash(f'Student {student.full_name} created successfully', 'success')
             return redirect(url_for('student.index'))
@@ -136,10 +275,11 @@ def edit(student_id):
             if request.form.get('enrollment_date'):
                 student.enrollment_date = datetime.strptime(request.form.get('enrollment_date'), '%Y-%m-%d').date()
             
-            db.session.commit()
+            # Grade and enrollment date feed the aging report
+            aging.refresh([student.id])
             
-            # Log the action
-            log = SystemLog(
+            # Log the action in the same transaction
+            audit_log.record(
                 user_id=current_user.id,
                 action='edit_student',
                 entity_type='student',
@@ -147,7 +287,6 @@ def edit(student_id):
                 details=f'Updated student: {student.full_name}',
                 ip_address=request.remote_addr
             )
-            db.session.add(log)
             db.session.commit()
             
             flash(f'Student {student.full_name} updated successfully', 'success')
@@ -172,10 +311,9 @@ def delete(student_id):
         
         # Soft delete
         student.is_active = False
-        db.session.commit()
-        
-        # Log the action
-        log = SystemLog(
+        aging.refresh([student.id])
+        # Log the action in the same transaction
+        audit_log.record(
             user_id=current_user.id,
             action='delete_student',
             entity_type='student',
@@ -183,8 +321,8 @@ def delete(student_id):
             details=f'Deleted student: {student_name}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
         db.session.commit()
+        ledger_stamp.bump()
         
         return jsonify({'success': True, 'message': f'Student {student_name} deleted successfully'})
     
@@ -195,43 +333,38 @@ def delete(student_id):
 @student_bp.route('/apply-fees/<int:student_id>', methods=['POST'])
 @login_required
 def apply_fees(student_id):
-    """Apply fee structure to a student"""
+    """Apply a term's fee structure to a student"""
     if not current_user.has_permission('edit'):
         return jsonify({'success': False, 'message': 'Permission denied'}), 403
     
+    data = request.get_json(silent=True) or request.form
+    term = data.get('term')
+    academic_year = data.get('academic_year')
+    
+    if term not in FeeStructure.term.type.enums or not academic_year:
+        return jsonify({'success': False, 'message': 'A valid term and academic year are required'}), 400
+    
     try:
         student = Student.query.get_or_404(student_id)
         
-        # Get fee structure for student's grade
-        total_fees = FeeStructure.get_total_fees_for_grade(student.grade)
-        
-        if total_fees == 0:
-            return jsonify({
-                'success': False,
-                'message': f'No fee structure defined for Grade {student.grade}'
-            }), 400
-        
-        # Update balance
-        new_balance = student.update_balance(
-            amount=total_fees,
-            change_type='fee_applied',
-            description=f'Fee structure applied for Grade {student.grade}',
-            created_by=current_user.id
-        )
-        
-        db.session.commit()
+        try:
+            total_fees, new_balance = fee_application.apply_fees(
+                student, term, academic_year, user_id=current_user.id
+            )
+        except fee_application.FeeApplicationError as e:
+            return jsonify({'success': False, 'message': str(e)}), 400
         
-        # Log the action
-        log = SystemLog(
+        # Log the action in the same transaction
+        audit_log.record(
             user_id=current_user.id,
             action='apply_fees',
             entity_type='student',
             entity_id=student.id,
-            details=f'Applied fees of {total_fees} to {student.full_name}',
+            details=f'Applied {term} {academic_year} fees of {total_fees} to {student.full_name}',
             ip_address=request.remote_addr
         )
-        db.session.add(log)
         db.session.commit()
+        ledger_stamp.bump()
         
         return jsonify({
             'success': True,
@@ -242,4 +375,39 @@ def apply_fees(student_id):
     
     except Exception as e:
         db.session.rollback()
-        return jsonify({'success': False, 'message': str(e)}), 500
\ No newline at end of file
+        return jsonify({'success': False, 'message': str(e)}), 500
+
+@student_bp.route('/apply-fees/bulk', methods=['POST'])
+@login_required
+@query_limit(None)
+def apply_fees_bulk():
+    """Apply a term's fee structure to a grade or the whole school"""
+    if not current_user.has_permission('edit'):
+        return jsonify({'success': False, 'message': 'Permission denied'}), 403
+    
+    data = request.get_json(silent=True) or request.form
+    term = data.get('term')
+    academic_year = data.get('academic_year')
+    grade = data.get('grade') or None
+    
+    if term not in FeeStructure.term.type.enums or not academic_year:
+        return jsonify({'success': False, 'message': 'A valid term and academic year are required'}), 400
+    
+    try:
+        result = fee_application.apply_fees_bulk(
+            term=term,
+            academic_year=academic_year,
+            grade=grade,
+            user_id=current_user.id,
+            ip_address=request.remote_addr
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': f'Fees applied to {result["students_billed"]} students',
+            **result
+        })
+    
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'message': str(e)}), 500
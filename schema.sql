@@ -30,7 +30,7 @@ CREATE TABLE IF NOT EXISTS students (
     guardian_contact VARCHAR(20) NOT NULL,
     guardian_email VARCHAR(120),
     address TEXT,
-    balance DECIMAL(15, 2) DEFAULT 0.00,
+    balance BIGINT DEFAULT 0, -- money columns hold minor units (cents)
     is_active BOOLEAN DEFAULT TRUE,
     enrollment_date DATE,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -47,7 +47,7 @@ CREATE TABLE IF NOT EXISTS fee_structures (
     grade VARCHAR(10) NOT NULL,
     term ENUM('Term 1', 'Term 2', 'Term 3', 'Annual') NOT NULL,
     fee_type VARCHAR(50) NOT NULL,
-    amount DECIMAL(15, 2) NOT NULL,
+    amount BIGINT NOT NULL,
     description TEXT,
     academic_year VARCHAR(10),
     is_active BOOLEAN DEFAULT TRUE,
@@ -63,10 +63,11 @@ CREATE TABLE IF NOT EXISTS fee_structures (
 CREATE TABLE IF NOT EXISTS payments (
     id INT AUTO_INCREMENT PRIMARY KEY,
     student_id INT NOT NULL,
-    amount DECIMAL(15, 2) NOT NULL,
+    amount BIGINT NOT NULL,
     fee_type VARCHAR(50) NOT NULL,
     payment_method ENUM('Cash', 'M-Pesa', 'Bank Transfer', 'Cheque', 'Card') NOT NULL,
     payment_date DATE NOT NULL,
+    grade VARCHAR(10),
     transaction_reference VARCHAR(100),
     receipt_number VARCHAR(50) UNIQUE,
     notes TEXT,
@@ -85,9 +86,9 @@ CREATE TABLE IF NOT EXISTS payments (
 CREATE TABLE IF NOT EXISTS balance_history (
     id INT AUTO_INCREMENT PRIMARY KEY,
     student_id INT NOT NULL,
-    previous_balance DECIMAL(15, 2) NOT NULL,
-    new_balance DECIMAL(15, 2) NOT NULL,
-    change_amount DECIMAL(15, 2) NOT NULL,
+    previous_balance BIGINT NOT NULL,
+    new_balance BIGINT NOT NULL,
+    change_amount BIGINT NOT NULL,
     change_type ENUM('payment', 'fee_applied', 'adjustment', 'refund') NOT NULL,
     reference_id INT,
     description TEXT,
@@ -96,7 +97,132 @@ CREATE TABLE IF NOT EXISTS balance_history (
     FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
     FOREIGN KEY (created_by) REFERENCES users(id) ON DELETE SET NULL,
     INDEX idx_student_id (student_id),
-    INDEX idx_created_at (created_at)
+    INDEX idx_created_at (created_at),
+    INDEX ix_balance_history_student_created (student_id, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Month-end balance per student, for months with history (see `flask build-checkpoints`)
+CREATE TABLE IF NOT EXISTS balance_checkpoints (
+    student_id INT NOT NULL,
+    period_end DATE NOT NULL,
+    balance BIGINT NOT NULL,
+    history_rows INT NOT NULL DEFAULT 0,
+    PRIMARY KEY (student_id, period_end),
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Months whose checkpoints have been built, with the last balance_history id seen
+CREATE TABLE IF NOT EXISTS checkpoint_periods (
+    period_end DATE PRIMARY KEY,
+    history_watermark INT NOT NULL DEFAULT 0,
+    built_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Each debtor's balance split by the age of its unpaid charges (see `flask refresh-aging`)
+CREATE TABLE IF NOT EXISTS debt_aging (
+    student_id INT PRIMARY KEY,
+    grade VARCHAR(10) NOT NULL,
+    balance BIGINT NOT NULL,
+    current BIGINT NOT NULL DEFAULT 0,
+    days_30 BIGINT NOT NULL DEFAULT 0,
+    days_60 BIGINT NOT NULL DEFAULT 0,
+    days_90 BIGINT NOT NULL DEFAULT 0,
+    oldest_unpaid DATE,
+    aged_on DATE NOT NULL,
+    next_rollover DATE,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    INDEX idx_next_rollover (next_rollover),
+    INDEX ix_debt_aging_balance (balance, student_id),
+    INDEX ix_debt_aging_grade_balance (grade, balance, student_id)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Academic years closed with `flask close-year`, with the row counts and totals moved
+CREATE TABLE IF NOT EXISTS archived_years (
+    academic_year VARCHAR(10) PRIMARY KEY,
+    starts_on DATE NOT NULL,
+    ends_on DATE NOT NULL,
+    payments INT NOT NULL DEFAULT 0,
+    payments_total BIGINT NOT NULL DEFAULT 0,
+    history_rows INT NOT NULL DEFAULT 0,
+    history_total BIGINT NOT NULL DEFAULT 0,
+    closed_by INT,
+    closed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (closed_by) REFERENCES users(id) ON DELETE SET NULL
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Payments of closed academic years (partitioned by academic_year on PostgreSQL)
+CREATE TABLE IF NOT EXISTS payments_archive (
+    id INT NOT NULL,
+    academic_year VARCHAR(10) NOT NULL,
+    student_id INT NOT NULL,
+    amount BIGINT NOT NULL,
+    fee_type VARCHAR(50) NOT NULL,
+    payment_method ENUM('Cash', 'M-Pesa', 'Bank Transfer', 'Cheque', 'Card') NOT NULL,
+    payment_date DATE NOT NULL,
+    grade VARCHAR(10),
+    transaction_reference VARCHAR(100),
+    receipt_number VARCHAR(50),
+    notes TEXT,
+    created_by INT,
+    created_at TIMESTAMP NULL,
+    updated_at TIMESTAMP NULL,
+    PRIMARY KEY (id, academic_year),
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    INDEX ix_payments_archive_date (payment_date, id),
+    INDEX ix_payments_archive_student (student_id),
+    INDEX ix_payments_archive_receipt (receipt_number)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- balance_history rows of closed academic years (partitioned by academic_year on PostgreSQL)
+CREATE TABLE IF NOT EXISTS balance_history_archive (
+    id INT NOT NULL,
+    academic_year VARCHAR(10) NOT NULL,
+    student_id INT NOT NULL,
+    previous_balance BIGINT NOT NULL,
+    new_balance BIGINT NOT NULL,
+    change_amount BIGINT NOT NULL,
+    change_type ENUM('payment', 'fee_applied', 'adjustment', 'refund') NOT NULL,
+    reference_id INT,
+    description TEXT,
+    created_by INT,
+    created_at TIMESTAMP NULL,
+    PRIMARY KEY (id, academic_year),
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    INDEX ix_balance_history_archive_student_created (student_id, created_at)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Fee applications table (one row per student, term and academic year billed)
+CREATE TABLE IF NOT EXISTS fee_applications (
+    id INT AUTO_INCREMENT PRIMARY KEY,
+    student_id INT NOT NULL,
+    term ENUM('Term 1', 'Term 2', 'Term 3', 'Annual') NOT NULL,
+    academic_year VARCHAR(10) NOT NULL,
+    amount BIGINT NOT NULL,
+    applied_by INT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE,
+    FOREIGN KEY (applied_by) REFERENCES users(id) ON DELETE SET NULL,
+    INDEX idx_student_id (student_id),
+    INDEX idx_created_at (created_at),
+    UNIQUE KEY unique_fee_application (student_id, term, academic_year)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Daily payment rollup (maintained with every payment write; see `flask rebuild-rollup`)
+CREATE TABLE IF NOT EXISTS payment_daily_rollup (
+    payment_date DATE NOT NULL,
+    grade VARCHAR(10) NOT NULL,
+    payment_method ENUM('Cash', 'M-Pesa', 'Bank Transfer', 'Cheque', 'Card') NOT NULL,
+    fee_type VARCHAR(50) NOT NULL,
+    payment_count INT NOT NULL DEFAULT 0,
+    total_amount BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (payment_date, grade, payment_method, fee_type)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
+-- Counters for allocating student numbers in blocks (PostgreSQL uses a sequence instead)
+CREATE TABLE IF NOT EXISTS number_sequences (
+    name VARCHAR(50) PRIMARY KEY,
+    next_value BIGINT NOT NULL
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- System logs table
@@ -127,17 +253,17 @@ VALUES (
 
 -- Insert sample data
 INSERT INTO students (student_number, full_name, grade, guardian_contact, balance, enrollment_date) VALUES
-('STU001', 'John Mwangi', '10', '+254712345678', 15000.00, '2024-01-15'),
-('STU002', 'Sarah Wanjiku', '9', '+254723456789', 8500.00, '2024-01-15'),
-('STU003', 'Michael Kiprotich', '11', '+254734567890', 22000.00, '2024-01-15'),
-('STU004', 'Emily Achieng', '10', '+254745678901', 6200.00, '2024-01-15'),
-('STU005', 'James Otieno', '12', '+254756789012', 18500.00, '2024-01-15')
+('STU001', 'John Mwangi', '10', '+254712345678', 1500000, '2024-01-15'),
+('STU002', 'Sarah Wanjiku', '9', '+254723456789', 850000, '2024-01-15'),
+('STU003', 'Michael Kiprotich', '11', '+254734567890', 2200000, '2024-01-15'),
+('STU004', 'Emily Achieng', '10', '+254745678901', 620000, '2024-01-15'),
+('STU005', 'James Otieno', '12', '+254756789012', 1850000, '2024-01-15')
 ON DUPLICATE KEY UPDATE student_number=student_number;
 
 INSERT INTO fee_structures (grade, term, fee_type, amount, academic_year) VALUES
-('9', 'Term 1', 'Tuition', 25000.00, '2024'),
-('10', 'Term 1', 'Tuition', 28000.00, '2024'),
-('11', 'Term 1', 'Tuition', 32000.00, '2024'),
-('12', 'Term 1', 'Tuition', 35000.00, '2024'),
-('9', 'Term 1', 'Books', 4500.00, '2024')
+('9', 'Term 1', 'Tuition', 2500000, '2024'),
+('10', 'Term 1', 'Tuition', 2800000, '2024'),
+('11', 'Term 1', 'Tuition', 3200000, '2024'),
+('12', 'Term 1', 'Tuition', 3500000, '2024'),
+('9', 'Term 1', 'Books', 450000, '2024')
 ON DUPLICATE KEY UPDATE grade=grade;
\ No newline at end of file
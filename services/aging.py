@@ -0,0 +1,179 @@
+from datetime import datetime, timedelta
+from sqlalchemy import select, insert, delete, func
+from sqlalchemy.exc import IntegrityError
+from extensions import db
+from models.aging import DebtAging
+from models.money import Cents
+from models.student import Student, BalanceHistory
+from services.pagination import keyset_paginate
+
+# Bucket column and the age in days at which a charge enters it
+BUCKETS = (('current', 0), ('days_30', 30), ('days_60', 60), ('days_90', 90))
+
+def ensure_schema():
+    """Create the aging table on databases that predate it"""
+    DebtAging.__table__.create(db.engine, checkfirst=True)
+
+def _today():
+    # balance_history.created_at is UTC
+    return datetime.utcnow().date()
+
+def age_balance(balance, charges, carried_since, today):
+    """Split a positive balance into age buckets, oldest charges paid first.
+    
+    charges are (date, amount) newest first. The balance is made of the
+    newest charges that add up to it; anything left over is older debt
+    dated carried_since. Returns (buckets, oldest unpaid date, next date
+    a bucket changes).
+    """
+    buckets = dict.fromkeys((name for name, _ in BUCKETS), Cents(0))
+    remaining = balance
+    oldest = None
+    rollover = None
+    
+    def take(charged_on, amount):
+        nonlocal oldest, rollover
+        age = (today - charged_on).days
+        name = [name for name, days in BUCKETS if age >= days][-1] if age >= 0 else 'current'
+        buckets[name] += amount
+        oldest = charged_on
+        later = [days for _, days in BUCKETS if days > age]
+        if later:
+            crossing = charged_on + timedelta(days=later[0])
+            rollover = crossing if rollover is None else min(rollover, crossing)
+    
+    for charged_on, amount in charges:
+        if remaining <= 0:
+            break
+        portion = min(amount, remaining)
+        take(charged_on, portion)
+        remaining -= portion
+    if remaining > 0:
+        take(carried_since, remaining)
+    return buckets, oldest, rollover
+
+def refresh(student_ids, today=None):
+    """Recompute the aging rows of some students inside the caller's transaction.
+    
+    Call it wherever their balance or grade changes; only active students
+    who owe money keep a row.
+    """
+    student_ids = list(set(student_ids))
+    if not student_ids:
+        return 0
+    today = today or _today()
+    
+    students = db.session.execute(
+        select(Student.id, Student.grade, Student.balance, Student.enrollment_date, Student.created_at)
+        .where(Student.id.in_(student_ids), Student.is_active == True, Student.balance > 0)
+    ).all()
+    
+    charges = {}
+    if students:
+        for student_id, created_at, amount in db.session.execute(
+            select(BalanceHistory.student_id, BalanceHistory.created_at, BalanceHistory.change_amount)
+            .where(BalanceHistory.student_id.in_([s.id for s in students]), BalanceHistory.change_amount > 0)
+            .order_by(BalanceHistory.student_id, BalanceHistory.created_at.desc(), BalanceHistory.id.desc())
+        ):
+            charges.setdefault(student_id, []).append((created_at.date(), amount))
+    
+    rows = []
+    for s in students:
+        carried_since = s.enrollment_date or (s.created_at.date() if s.created_at else today)
+        buckets, oldest, rollover = age_balance(s.balance, charges.get(s.id, []), carried_since, today)
+        rows.append(dict(
+            buckets,
+            student_id=s.id,
+            grade=s.grade,
+            balance=s.balance,
+            oldest_unpaid=oldest,
+            aged_on=today,
+            next_rollover=rollover,
+            updated_at=datetime.utcnow()
+        ))
+    
+    db.session.execute(delete(DebtAging).where(DebtAging.student_id.in_(student_ids)))
+    if rows:
+        db.session.execute(insert(DebtAging), rows)
+    return len(rows)
+
+def rebuild(batch_size=1000, progress=None):
+    """Recompute the whole aging table from balances and history, a batch of students per transaction"""
+    ensure_schema()
+    today = _today()
+    last_id = 0
+    debtors = 0
+    
+    while True:
+        ids = db.session.execute(
+            select(Student.id).where(Student.id > last_id).order_by(Student.id).limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        last_id = ids[-1]
+        debtors += refresh(ids, today)
+        db.session.commit()
+        if progress:
+            progress(last_id, debtors)
+    
+    # Rows of students that no longer exist
+    db.session.execute(delete(DebtAging).where(~DebtAging.student_id.in_(select(Student.id))))
+    db.session.commit()
+    return debtors
+
+def roll_forward(batch_size=500):
+    """Re-age the debtors with a charge that has crossed into an older bucket since they were aged.
+    
+    Only their rows are touched, so a daily run (or the report endpoints,
+    which call it first) keeps the buckets current without a full rebuild.
+    """
+    today = _today()
+    rolled = 0
+    while True:
+        ids = db.session.execute(
+            select(DebtAging.student_id)
+            .where(DebtAging.next_rollover <= today)
+            .order_by(DebtAging.student_id)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            break
+        refresh(ids, today)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Another worker re-aged the same students concurrently
+            db.session.rollback()
+            break
+        rolled += len(ids)
+    return rolled
+
+def debtors_page(grade=None, threshold=0, after=None, before=None, limit=50):
+    """Debtors by balance, largest first, one keyset page of DebtAging rows (with their student)"""
+    query = DebtAging.query
+    if grade:
+        query = query.filter(DebtAging.grade == grade)
+    if threshold:
+        query = query.filter(DebtAging.balance > threshold)
+    return keyset_paginate(
+        query, [DebtAging.balance, DebtAging.student_id],
+        after=after, before=before, per_page=limit, descending=True
+    )
+
+def totals(grade=None, threshold=0):
+    """Debtor count and amount in each bucket"""
+    query = db.session.query(
+        func.count(DebtAging.student_id),
+        func.sum(DebtAging.balance),
+        *[func.sum(getattr(DebtAging, name)) for name, _ in BUCKETS]
+    )
+    if grade:
+        query = query.filter(DebtAging.grade == grade)
+    if threshold:
+        query = query.filter(DebtAging.balance > threshold)
+    count, balance, *buckets = query.one()
+    return {
+        'debtors': count,
+        'balance': float(balance or 0),
+        **{name: float(amount or 0) for (name, _), amount in zip(BUCKETS, buckets)}
+    }
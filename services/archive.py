@@ -0,0 +1,248 @@
+from datetime import date, datetime, time, timedelta
+from flask import current_app
+from sqlalchemy import select, insert, delete, func, union_all, literal, inspect, text
+from sqlalchemy.orm import aliased
+from extensions import db, ledger_stamp, audit_log, archive_cache
+from models.archive import ArchivedYear, PaymentArchive, BalanceHistoryArchive
+from models.money import Cents
+from models.payment import Payment
+from models.student import BalanceHistory
+
+class ArchiveError(Exception):
+    """A year that cannot be closed, or an archive that does not match its totals"""
+
+def ensure_schema():
+    """Create the archive tables on databases that predate them"""
+    for model in (ArchivedYear, PaymentArchive, BalanceHistoryArchive):
+        model.__table__.create(db.engine, checkfirst=True)
+
+def year_range(academic_year):
+    """First and last day of an academic year ('2024')"""
+    year = int(str(academic_year)[:4])
+    month = current_app.config.get('ACADEMIC_YEAR_START_MONTH', 1)
+    starts_on = date(year, month, 1)
+    return starts_on, date(year + 1, month, 1) - timedelta(days=1)
+
+def hot_start():
+    """First day held only by the live tables (the day after the last closed year), or None"""
+    def load():
+        if not inspect(db.engine).has_table(ArchivedYear.__tablename__):
+            return None
+        ends_on = db.session.execute(select(func.max(ArchivedYear.ends_on))).scalar()
+        return ends_on + timedelta(days=1) if ends_on else None
+    return archive_cache.get_or_set('hot_start', load)
+
+def reaches_archive(date_from=None, date_to=None):
+    """Whether a date range starts before the live tables do"""
+    start = hot_start()
+    if start is None:
+        return False
+    bounds = [d.date() if isinstance(d, datetime) else d for d in (date_from, date_to) if d is not None]
+    return bool(bounds) and min(bounds) < start
+
+def _routed(model, archive, date_from, date_to):
+    if not reaches_archive(date_from, date_to):
+        return model
+    # Late rows dated inside a closed year stay live, so the live table is always included
+    names = [column.name for column in model.__table__.columns]
+    both = union_all(
+        select(*[model.__table__.c[name] for name in names]),
+        select(*[archive.__table__.c[name] for name in names])
+    ).subquery(model.__tablename__)
+    return aliased(model, both)
+
+def payments(date_from=None, date_to=None):
+    """Payment, or an entity over payments UNION ALL payments_archive when the range reaches a closed year.
+    
+    The range is on payment_date. Without one, queries stay on the live table,
+    which is what dashboards, lists and searches show by default.
+    """
+    return _routed(Payment, PaymentArchive, date_from, date_to)
+
+def history(date_from=None, date_to=None):
+    """BalanceHistory, or an entity that also reads balance_history_archive, for a created_at range"""
+    return _routed(BalanceHistory, BalanceHistoryArchive, date_from, date_to)
+
+def _bounds(academic_year):
+    starts_on, ends_on = year_range(academic_year)
+    return starts_on, ends_on, datetime.combine(starts_on, time()), datetime.combine(ends_on + timedelta(days=1), time())
+
+def _totals(amount, *where):
+    count, total = db.session.execute(select(func.count(), func.sum(amount)).where(*where)).one()
+    return count, Cents(total or 0)
+
+def _live_in_year(academic_year):
+    starts_on, ends_on, start, end = _bounds(academic_year)
+    return {
+        'payments': _totals(Payment.amount, Payment.payment_date >= starts_on, Payment.payment_date <= ends_on),
+        'history': _totals(BalanceHistory.change_amount, BalanceHistory.created_at >= start, BalanceHistory.created_at < end),
+    }
+
+def _archived(academic_year):
+    return {
+        'payments': _totals(PaymentArchive.amount, PaymentArchive.academic_year == academic_year),
+        'history': _totals(BalanceHistoryArchive.change_amount, BalanceHistoryArchive.academic_year == academic_year),
+    }
+
+def _create_partitions(academic_year):
+    # One partition per closed year; DDL is transactional on PostgreSQL
+    for model in (PaymentArchive, BalanceHistoryArchive):
+        table = model.__tablename__
+        db.session.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {table}_{academic_year} PARTITION OF {table} "
+            f"FOR VALUES IN ('{academic_year}')"
+        ))
+
+def _reuses_ids(model):
+    # SQLite hands out max(rowid) + 1 unless the table was declared AUTOINCREMENT
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    sql = db.session.execute(
+        text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': model.__tablename__}
+    ).scalar()
+    return 'AUTOINCREMENT' not in (sql or '').upper()
+
+def close_year(academic_year, closed_by=None, dry_run=False):
+    """Move a finished academic year's payments and balance history into the archive.
+    
+    Payments go by payment_date and history by created_at. Month-end
+    checkpoints are built through the end of the year first, so balances and
+    statements inside it stay cheap. Rows are copied, the copies are counted
+    and summed against the live rows, and only the copied ids are deleted,
+    all in one transaction; any difference rolls it back. Years close in
+    order. Returns the counts and totals moved.
+    """
+    from services.checkpoints import build_checkpoints
+    
+    academic_year = str(academic_year)
+    if not academic_year.isdigit() or len(academic_year) != 4:
+        raise ArchiveError(f'Academic year must look like 2024, not {academic_year!r}')
+    ensure_schema()
+    starts_on, ends_on, start, end = _bounds(academic_year)
+    if ends_on >= date.today():
+        raise ArchiveError(f'{academic_year} runs until {ends_on:%Y-%m-%d} and cannot be closed yet')
+    for model in (Payment, BalanceHistory):
+        if _reuses_ids(model):
+            raise ArchiveError(
+                f'{model.__tablename__} was created without AUTOINCREMENT, so SQLite would give archived ids '
+                f'to new rows; recreate the database before closing a year'
+            )
+    if db.session.get(ArchivedYear, academic_year):
+        raise ArchiveError(f'{academic_year} is already closed')
+    
+    last_closed = db.session.execute(select(func.max(ArchivedYear.ends_on))).scalar()
+    if last_closed and last_closed >= starts_on:
+        raise ArchiveError(f'A later year is already closed (archive ends {last_closed:%Y-%m-%d})')
+    if last_closed and last_closed + timedelta(days=1) < starts_on:
+        raise ArchiveError(f'Close the years after {last_closed:%Y-%m-%d} first')
+    if not last_closed:
+        earliest = db.session.execute(select(func.min(Payment.payment_date))).scalar()
+        first_history = db.session.execute(select(func.min(BalanceHistory.created_at))).scalar()
+        if first_history and (earliest is None or first_history.date() < earliest):
+            earliest = first_history.date()
+        if earliest and earliest < starts_on:
+            raise ArchiveError(f'There are rows from {earliest:%Y-%m-%d}; close the earlier years first')
+    
+    if not dry_run:
+        build_checkpoints(through=ends_on)
+    
+    expected = _live_in_year(academic_year)
+    if db.engine.dialect.name == 'postgresql':
+        _create_partitions(academic_year)
+    
+    payment_columns = [column.name for column in Payment.__table__.columns]
+    db.session.execute(insert(PaymentArchive).from_select(
+        ['academic_year', *payment_columns],
+        select(literal(academic_year), *Payment.__table__.c)
+        .where(Payment.payment_date >= starts_on, Payment.payment_date <= ends_on)
+    ))
+    history_columns = [column.name for column in BalanceHistory.__table__.columns]
+    db.session.execute(insert(BalanceHistoryArchive).from_select(
+        ['academic_year', *history_columns],
+        select(literal(academic_year), *BalanceHistory.__table__.c)
+        .where(BalanceHistory.created_at >= start, BalanceHistory.created_at < end)
+    ))
+    
+    archived = _archived(academic_year)
+    if archived != expected:
+        db.session.rollback()
+        raise ArchiveError(f'Archive copy of {academic_year} does not match the live rows: {archived} != {expected}')
+    
+    # Delete only what was copied; a row written meanwhile would show up below
+    db.session.execute(delete(Payment).where(
+        Payment.payment_date >= starts_on, Payment.payment_date <= ends_on,
+        Payment.id.in_(select(PaymentArchive.id).where(PaymentArchive.academic_year == academic_year))
+    ))
+    db.session.execute(delete(BalanceHistory).where(
+        BalanceHistory.created_at >= start, BalanceHistory.created_at < end,
+        BalanceHistory.id.in_(select(BalanceHistoryArchive.id).where(BalanceHistoryArchive.academic_year == academic_year))
+    ))
+    remaining = _live_in_year(academic_year)
+    if remaining != {'payments': (0, 0), 'history': (0, 0)}:
+        db.session.rollback()
+        raise ArchiveError(f'{academic_year} changed while it was being closed; run close-year again')
+    
+    (payment_count, payment_total), (history_count, history_total) = expected['payments'], expected['history']
+    db.session.add(ArchivedYear(
+        academic_year=academic_year,
+        starts_on=starts_on,
+        ends_on=ends_on,
+        payments=payment_count,
+        payments_total=payment_total,
+        history_rows=history_count,
+        history_total=history_total,
+        closed_by=closed_by
+    ))
+    result = {
+        'academic_year': academic_year,
+        'starts_on': starts_on,
+        'ends_on': ends_on,
+        'payments': payment_count,
+        'payments_total': payment_total,
+        'history_rows': history_count,
+        'history_total': history_total,
+    }
+    if dry_run:
+        db.session.rollback()
+        return result
+    
+    db.session.commit()
+    archive_cache.invalidate()
+    ledger_stamp.bump()
+    audit_log.record_now(
+        user_id=closed_by,
+        action='close_year',
+        entity_type='archive',
+        details=f'Closed {academic_year}: archived {payment_count} payments and {history_count} history rows'
+    )
+    return result
+
+def verify(academic_year=None):
+    """Recount closed years' archive rows against the totals recorded when they were closed.
+    
+    Returns one dict per year with any mismatch and the number of late rows
+    (dated inside the year but written after it closed) still in the live tables.
+    """
+    ensure_schema()
+    query = select(ArchivedYear).order_by(ArchivedYear.academic_year)
+    if academic_year:
+        query = query.where(ArchivedYear.academic_year == str(academic_year))
+    
+    results = []
+    for year in db.session.execute(query).scalars():
+        archived = _archived(year.academic_year)
+        recorded = {
+            'payments': (year.payments, year.payments_total),
+            'history': (year.history_rows, year.history_total),
+        }
+        late = _live_in_year(year.academic_year)
+        results.append({
+            'academic_year': year.academic_year,
+            'ok': archived == recorded,
+            'recorded': recorded,
+            'archived': archived,
+            'late_payments': late['payments'][0],
+            'late_history_rows': late['history'][0],
+        })
+    return results
@@ -0,0 +1,251 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+FIELDS = ('user_id', 'action', 'entity_type', 'entity_id', 'details', 'ip_address')
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class AuditLog:
+    """Buffered writer for SystemLog rows.
+    
+    In 'async' mode entries are appended to a per-worker spool file, queued in
+    memory and inserted in batches by a background thread once AUDIT_BATCH_SIZE
+    entries are waiting or AUDIT_FLUSH_INTERVAL seconds have passed. A spool left
+    behind by a crashed worker is replayed on the next start, so delivery is
+    at-least-once. In 'sync' mode (tests) rows go through db.session directly.
+    """
+    
+    def __init__(self):
+        self.app = None
+        self.mode = 'sync'
+        self.batch_size = 200
+        self.flush_interval = 2.0
+        self.spool_dir = None
+        self.fsync = False
+        self._pid = None
+    
+    def init_app(self, app):
+        self.app = app
+        self.mode = app.config.get('AUDIT_LOG_MODE', 'sync')
+        self.batch_size = app.config.get('AUDIT_BATCH_SIZE', 200)
+        self.flush_interval = app.config.get('AUDIT_FLUSH_INTERVAL', 2.0)
+        self.fsync = app.config.get('AUDIT_SPOOL_FSYNC', False)
+        self.spool_dir = app.config.get('AUDIT_SPOOL_DIR') or os.path.join(app.instance_path, 'audit')
+        
+        if not event.contains(Session, 'after_commit', _after_commit):
+            event.listen(Session, 'after_commit', _after_commit)
+            event.listen(Session, 'after_soft_rollback', _after_rollback)
+        
+        if self.mode == 'async':
+            os.makedirs(self.spool_dir, exist_ok=True)
+            atexit.register(self.close)
+            self.replay_spools()
+    
+    # -- public API ---------------------------------------------------------
+    
+    def record(self, action, user_id=None, entity_type=None, entity_id=None, details=None, ip_address=None):
+        """Log an action as part of the current transaction; it is kept only if that commits"""
+        entry = self._entry(action, user_id, entity_type, entity_id, details, ip_address)
+        session = self._session()
+        if self.mode == 'sync':
+            session.add(self._model()(**entry))
+        else:
+            session.info.setdefault('audit_pending', []).append(entry)
+    
+    def record_now(self, action, user_id=None, entity_type=None, entity_id=None, details=None, ip_address=None):
+        """Log an action that has no transaction of its own (login, logout)"""
+        entry = self._entry(action, user_id, entity_type, entity_id, details, ip_address)
+        if self.mode == 'sync':
+            session = self._session()
+            session.add(self._model()(**entry))
+            session.commit()
+        else:
+            self.enqueue([entry])
+    
+    def enqueue(self, entries):
+        """Spool entries to disk and queue them for the background flusher"""
+        if not entries:
+            return
+        self._ensure_worker()
+        lines = ''.join(json.dumps(self._dump(e)) + '\n' for e in entries)
+        with self._cond:
+            self._spool.write(lines)
+            self._spool.flush()
+            if self.fsync:
+                os.fsync(self._spool.fileno())
+            self._pending.extend(entries)
+            if len(self._pending) >= self.batch_size:
+                self._cond.notify()
+    
+    def flush(self):
+        """Write everything queued so far; returns the number of rows inserted"""
+        if self._pid != os.getpid():
+            return 0
+        with self._flush_lock:
+            with self._cond:
+                if not self._pending:
+                    return 0
+                batch, self._pending = self._pending, []
+                # Rotate the spool so the file being flushed holds exactly this batch
+                self._spool.close()
+                flushing_path = f'{self._spool_path}.{time.time_ns()}.flushing'
+                os.replace(self._spool_path, flushing_path)
+                self._spool = open(self._spool_path, 'a', encoding='utf-8')
+            
+            try:
+                self._insert(batch)
+            except Exception:
+                # Leave the rotated file for replay and keep the rows for the next attempt
+                logger.exception('Audit log flush of %d entries failed', len(batch))
+                with self._cond:
+                    self._pending[:0] = batch
+                return 0
+            
+            for path in glob.glob(f'{self._spool_path}.*.flushing'):
+                if path <= flushing_path:
+                    os.remove(path)
+            return len(batch)
+    
+    def close(self):
+        """Stop the flusher and write out anything still queued"""
+        if self._pid != os.getpid():
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+        self._spool.close()
+        if not self._pending:
+            os.remove(self._spool_path)
+        self._pid = None
+    
+    def replay_spools(self):
+        """Insert entries spooled by workers that exited before flushing them"""
+        replayed = 0
+        for path in glob.glob(os.path.join(self.spool_dir, 'audit-*.spool*')):
+            parts = os.path.basename(path).split('.')
+            try:
+                # A '.replaying' file belongs to the worker that claimed it
+                pid = int(parts[-2]) if path.endswith('.replaying') else int(parts[0].split('-')[1])
+            except (IndexError, ValueError):
+                continue
+            if pid != os.getpid() and _pid_alive(pid):
+                continue
+            
+            # Claim the file; if another worker renamed it first it is theirs
+            claimed = os.path.join(self.spool_dir, f'{parts[0]}.spool.{time.time_ns()}.{os.getpid()}.replaying')
+            try:
+                os.replace(path, claimed)
+            except FileNotFoundError:
+                continue
+            
+            with open(claimed, encoding='utf-8') as f:
+                entries = [self._load(line) for line in f if line.strip()]
+            if entries:
+                try:
+                    self._insert(entries)
+                except Exception:
+                    # e.g. tables not created yet; the claimed file is retried on a later start
+                    logger.exception('Could not replay audit spool %s', claimed)
+                    break
+                replayed += len(entries)
+            os.remove(claimed)
+        
+        if replayed:
+            logger.info('Replayed %d spooled audit log entries', replayed)
+        return replayed
+    
+    def stats(self):
+        if self._pid != os.getpid():
+            return {'mode': self.mode, 'pending': 0}
+        with self._cond:
+            return {'mode': self.mode, 'pending': len(self._pending)}
+    
+    # -- internals ----------------------------------------------------------
+    
+    def _ensure_worker(self):
+        # Started lazily and per process, so forked workers never share a thread or spool
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._pending = []
+        self._stopping = False
+        self._failing = False
+        self._spool_path = os.path.join(self.spool_dir, f'audit-{self._pid}.spool')
+        self._spool = open(self._spool_path, 'a', encoding='utf-8')
+        self._thread = threading.Thread(target=self._run, name='audit-log-flusher', daemon=True)
+        self._thread.start()
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and (self._failing or len(self._pending) < self.batch_size):
+                    self._cond.wait(self.flush_interval)
+                stopping = self._stopping
+            self._failing = not self.flush() and bool(self._pending)
+            if stopping:
+                return
+    
+    def _insert(self, entries):
+        from extensions import db
+        with self.app.app_context():
+            with db.engine.begin() as conn:
+                conn.execute(self._model().__table__.insert(), entries)
+    
+    def _entry(self, action, user_id, entity_type, entity_id, details, ip_address):
+        return {
+            'user_id': user_id,
+            'action': action,
+            'entity_type': entity_type,
+            'entity_id': entity_id,
+            'details': details,
+            'ip_address': ip_address,
+            'created_at': datetime.utcnow(),
+        }
+    
+    def _dump(self, entry):
+        return dict(entry, created_at=entry['created_at'].isoformat())
+    
+    def _load(self, line):
+        data = json.loads(line)
+        entry = {field: data.get(field) for field in FIELDS}
+        entry['created_at'] = datetime.fromisoformat(data['created_at'])
+        return entry
+    
+    def _session(self):
+        from extensions import db
+        return db.session
+    
+    def _model(self):
+        from models.fee import SystemLog
+        return SystemLog
+
+def _after_commit(session):
+    entries = session.info.pop('audit_pending', None)
+    if entries:
+        from extensions import audit_log
+        audit_log.enqueue(entries)
+
+def _after_rollback(session, previous_transaction):
+    if previous_transaction.parent is None:
+        session.info.pop('audit_pending', None)
@@ -0,0 +1,303 @@
+import json
+import platform
+import secrets
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+from flask import current_app
+from sqlalchemy import delete, event, select, func, Numeric, type_coerce
+from extensions import db, audit_log, password_hasher
+from models.user import User
+from models.student import Student
+from models.payment import Payment
+from models.fee import SystemLog
+
+# A p95 must grow by this fraction and by at least MIN_REGRESSION_MS to be flagged
+DEFAULT_TOLERANCE = 0.25
+MIN_REGRESSION_MS = 5.0
+
+def percentiles(samples, points=(50, 95, 99)):
+    """Nearest-rank percentiles of a list of latencies, in milliseconds"""
+    if not samples:
+        return {f'p{p}': None for p in points}
+    ordered = sorted(samples)
+    result = {}
+    for p in points:
+        rank = max(1, -(-p * len(ordered) // 100))  # ceil(p/100 * n)
+        result[f'p{p}'] = round(ordered[rank - 1] * 1000, 1)
+    return result
+
+def bench_login(users=10, concurrency=16, logins=200):
+    """Log in concurrently through the real /auth/login view and report latency percentiles"""
+    if db.engine.url.database in (None, '', ':memory:'):
+        raise ValueError('The login benchmark needs a file or server database shared by all threads')
+    
+    app = current_app._get_current_object()
+    password = secrets.token_urlsafe(12)
+    password_hash = password_hasher.hash(password)
+    accounts = [
+        User(username=f'bench-login-{i}', password_hash=password_hash, role='viewer', is_active=True)
+        for i in range(users)
+    ]
+    db.session.add_all(accounts)
+    db.session.commit()
+    user_ids = [account.id for account in accounts]
+    usernames = [account.username for account in accounts]
+    
+    def login(n):
+        # A fresh client per attempt so each request is an anonymous login
+        client = app.test_client()
+        started = time.perf_counter()
+        response = client.post('/auth/login', data={'username': usernames[n % users], 'password': password})
+        return time.perf_counter() - started, response.status_code
+    
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(login, range(logins)))
+        elapsed = time.perf_counter() - started
+    finally:
+        audit_log.flush()
+        db.session.execute(delete(SystemLog).where(SystemLog.user_id.in_(user_ids)))
+        db.session.execute(delete(User).where(User.id.in_(user_ids)))
+        db.session.commit()
+    
+    ok = [latency for latency, status in results if status == 302]
+    return {
+        'logins': logins,
+        'concurrency': concurrency,
+        'hash_method': password_hasher.method,
+        'hash_workers': password_hasher.workers,
+        'succeeded': len(ok),
+        'busy': sum(1 for _, status in results if status == 503),
+        'seconds': round(elapsed, 2),
+        'logins_per_second': round(logins / elapsed, 1) if elapsed else None,
+        **percentiles(ok),
+        'max': round(max(ok) * 1000, 1) if ok else None,
+    }
+
+def _sample():
+    """Real ids and terms from the database so every endpoint does representative work"""
+    student = db.session.execute(
+        select(Student.id, Student.full_name, Student.grade)
+        .where(Student.is_active == True)
+        .order_by(Student.id)
+        .limit(1)
+        .offset(select(func.count(Student.id)).scalar_subquery() // 2)
+    ).first()
+    payment = db.session.execute(
+        select(Payment.id, Payment.receipt_number, Payment.payment_date).order_by(Payment.id.desc()).limit(1)
+    ).first()
+    if student is None or payment is None:
+        raise ValueError('The benchmark needs students and payments; run flask generate-dataset first')
+    return student, payment
+
+def suite_requests(include_writes=True):
+    """(name, method, url, form data) for each endpoint the suite drives"""
+    today = date.today()
+    student, payment = _sample()
+    surname = student.full_name.split()[-1]
+    day = payment.payment_date
+    year_start = f'{day.year}-01-01'
+    
+    requests = [
+        ('dashboard.page', 'GET', '/dashboard', None),
+        ('dashboard.stats', 'GET', '/api/dashboard/stats', None),
+        ('dashboard.trends', 'GET', '/api/dashboard/payment-trends', None),
+        ('dashboard.calendar', 'GET', f'/api/dashboard/payment-calendar/{day.year}/{day.month}', None),
+        ('reports.page', 'GET', '/reports/', None),
+        ('reports.bundle', 'GET', f'/reports/api/bundle?date_from={year_start}&date_to={day}', None),
+        ('reports.by_grade', 'GET', f'/reports/api/payment-by-grade?date_from={year_start}', None),
+        ('reports.by_method', 'GET', f'/reports/api/payment-by-method?date_from={year_start}', None),
+        ('reports.summary', 'GET', f'/reports/api/summary?date_from={year_start}', None),
+        ('reports.defaulters', 'GET', '/reports/api/defaulters?threshold=10000', None),
+        ('students.page', 'GET', '/students/', None),
+        ('students.page_grade', 'GET', f'/students/?grade={student.grade}', None),
+        ('students.search', 'GET', f'/students/?search={surname}', None),
+        ('students.api_list', 'GET', '/students/api/list?limit=100', None),
+        ('students.api_get', 'GET', f'/students/api/{student.id}', None),
+        ('search.students', 'GET', f'/search/api?q={surname}', None),
+        ('search.payments', 'GET', f'/search/api?type=payments&q={payment.receipt_number[-6:]}', None),
+        ('payments.page', 'GET', '/payments/', None),
+        ('payments.search', 'GET', f'/payments/?search={surname}', None),
+        ('payments.api_list', 'GET', '/payments/api/list?limit=100', None),
+        ('payments.receipt', 'GET', f'/payments/receipt/{payment.id}', None),
+        ('fees.page', 'GET', '/fees/', None),
+    ]
+    if include_writes:
+        requests += [
+            ('payments.create', 'POST', '/payments/create', {
+                'student_id': student.id, 'amount': '1500', 'fee_type': 'Tuition',
+                'payment_method': 'M-Pesa', 'payment_date': today.isoformat(),
+                'transaction_reference': 'BENCH'
+            }),
+            ('students.apply_fees', 'POST', f'/students/apply-fees/{student.id}', None),
+        ]
+    return requests
+
+def run_suite(repeat=20, warmup=2, include_writes=True):
+    """Time every suite endpoint through the test client, logged in as a temporary admin.
+    
+    Write endpoints change data (a payment and a fee application per
+    iteration), so run the suite against a scratch database.
+    """
+    if db.engine.url.database in (None, '', ':memory:'):
+        raise ValueError('The benchmark suite needs a file or server database loaded with a dataset')
+    
+    app = current_app._get_current_object()
+    requests = suite_requests(include_writes)
+    
+    password = secrets.token_urlsafe(12)
+    admin = User(username=f'bench-suite-{secrets.token_hex(3)}', role='admin', is_active=True)
+    admin.set_password(password)
+    db.session.add(admin)
+    db.session.commit()
+    admin_id = admin.id
+    
+    statements = [0]
+    def count_statement(*args):
+        statements[0] += 1
+    engine = db.engine
+    event.listen(engine, 'before_cursor_execute', count_statement)
+    
+    results = {}
+    try:
+        client = app.test_client()
+        client.post('/auth/login', data={'username': admin.username, 'password': password})
+        
+        for name, method, url, data in requests:
+            latencies = []
+            queries = []
+            failures = 0
+            for i in range(warmup + repeat):
+                statements[0] = 0
+                started = time.perf_counter()
+                response = client.open(url, method=method, data=data)
+                elapsed = time.perf_counter() - started
+                response.close()
+                if response.status_code >= 400:
+                    failures += 1
+                if i >= warmup:
+                    latencies.append(elapsed)
+                    queries.append(statements[0])
+            results[name] = {
+                'method': method,
+                'url': url,
+                **percentiles(latencies),
+                'mean': round(sum(latencies) / len(latencies) * 1000, 1),
+                'queries': max(queries),
+                'errors': failures,
+            }
+    finally:
+        event.remove(engine, 'before_cursor_execute', count_statement)
+        audit_log.flush()
+        db.session.execute(delete(SystemLog).where(SystemLog.user_id == admin_id))
+        db.session.execute(delete(User).where(User.id == admin_id))
+        db.session.commit()
+    
+    return {
+        'recorded_at': datetime.utcnow().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'database': engine.dialect.name,
+        'students': db.session.execute(select(func.count(Student.id))).scalar(),
+        'payments': db.session.execute(select(func.count(Payment.id))).scalar(),
+        'repeat': repeat,
+        'endpoints': results,
+    }
+
+def compare(current, baseline, tolerance=DEFAULT_TOLERANCE):
+    """Regressions of current against a baseline: slower p95s, more queries, new errors"""
+    regressions = []
+    for name, result in current['endpoints'].items():
+        before = baseline.get('endpoints', {}).get(name)
+        if before is None:
+            continue
+        if (before['p95'] and result['p95'] > before['p95'] * (1 + tolerance)
+                and result['p95'] - before['p95'] >= MIN_REGRESSION_MS):
+            regressions.append(f"{name}: p95 {before['p95']}ms -> {result['p95']}ms")
+        if result['queries'] > before['queries']:
+            regressions.append(f"{name}: queries {before['queries']} -> {result['queries']}")
+        if result['errors'] > before.get('errors', 0):
+            regressions.append(f"{name}: {result['errors']} error responses")
+    return regressions
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_baseline(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+def _legacy_money(column):
+    """column read the way DECIMAL(15,2) money was: as Decimal major units"""
+    return type_coerce(column / 100.0, Numeric(15, 2)).label(column.key)
+
+def _serialization_statements(rows, legacy):
+    money = _legacy_money if legacy else (lambda column: column)
+    students = (
+        select(Student.id, Student.student_number, Student.full_name, Student.grade, Student.guardian_name,
+               Student.guardian_contact, Student.guardian_email, money(Student.balance), Student.is_active,
+               Student.enrollment_date)
+        .order_by(Student.id)
+        .limit(rows)
+    )
+    payments = (
+        select(Payment.id, Payment.student_id, Student.full_name, money(Payment.amount), Payment.fee_type,
+               Payment.payment_method, Payment.payment_date, Payment.receipt_number, Payment.transaction_reference)
+        .join(Student, Payment.student_id == Student.id)
+        .order_by(Payment.id)
+        .limit(rows)
+    )
+    return {'students': students, 'payments': payments}
+
+def _serialize_students(result):
+    return json.dumps([{
+        'id': r[0], 'student_number': r[1], 'full_name': r[2], 'grade': r[3], 'guardian_name': r[4],
+        'guardian_contact': r[5], 'guardian_email': r[6], 'balance': float(r[7]), 'is_active': r[8],
+        'enrollment_date': r[9].isoformat() if r[9] else None,
+    } for r in result])
+
+def _serialize_payments(result):
+    return json.dumps([{
+        'id': r[0], 'student_id': r[1], 'student_name': r[2], 'amount': float(r[3]), 'fee_type': r[4],
+        'payment_method': r[5], 'payment_date': r[6].isoformat(), 'receipt_number': r[7],
+        'transaction_reference': r[8],
+    } for r in result])
+
+def bench_serialization(rows=5000, repeat=5):
+    """Rows per second for the student and payment list payloads, reading money as Decimal vs Cents.
+    
+    Both variants fetch the same rows and build the same to_dict() shape; the
+    decimal variant reads money as DECIMAL(15,2) columns did (major units
+    through SQLAlchemy's Numeric processing), so the difference is the cost
+    the integer representation removes.
+    """
+    serializers = {'students': _serialize_students, 'payments': _serialize_payments}
+    results = {}
+    outputs = {}
+    for variant in ('decimal', 'cents'):
+        statements = _serialization_statements(rows, legacy=variant == 'decimal')
+        for name, statement in statements.items():
+            timings = []
+            for _ in range(repeat):
+                started = time.perf_counter()
+                payload = serializers[name](db.session.execute(statement).all())
+                timings.append(time.perf_counter() - started)
+            count = db.session.execute(select(func.count()).select_from(statement.subquery())).scalar()
+            best = min(timings)
+            results.setdefault(name, {})[variant] = {
+                'rows': count,
+                'ms': round(best * 1000, 1),
+                'rows_per_second': round(count / best) if best else None,
+            }
+            outputs[(name, variant)] = payload
+    
+    for name in serializers:
+        results[name]['speedup'] = round(results[name]['decimal']['ms'] / results[name]['cents']['ms'], 2)
+        # The two variants must produce byte-identical JSON
+        results[name]['identical'] = outputs[(name, 'decimal')] == outputs[(name, 'cents')]
+    return results
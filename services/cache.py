@@ -0,0 +1,209 @@
+import hashlib
+import json
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+class VersionStamp:
+    """Version token kept in a file so every worker on the host sees writes.
+    
+    Writers call bump() after committing a change; readers compare the token
+    with the one their cached data was built under.
+    """
+    
+    def __init__(self, name):
+        self.name = name
+        self.path = None
+    
+    def init_app(self, app):
+        directory = app.config.get('CACHE_DIR') or os.path.join(app.instance_path, 'cache')
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{self.name}.version')
+    
+    def current(self):
+        try:
+            with open(self.path) as f:
+                return f.read()
+        except (OSError, TypeError):
+            return None
+    
+    def bump(self):
+        if self.path is None:
+            return
+        # A unique token (not a counter) so two concurrent bumps never collide
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(uuid.uuid4().hex)
+        os.replace(tmp_path, self.path)
+
+class LRUCache:
+    """Thread-safe bounded mapping with hit and miss counters and an optional TTL"""
+    
+    def __init__(self, maxsize=256, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (entry[0] is None or entry[0] > time.monotonic()):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return default
+    
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+    
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+class VersionedCache:
+    """Per-worker LRU cache (optionally with a TTL) that empties itself when the shared version stamp moves"""
+    
+    _missing = object()
+    
+    def __init__(self, name, maxsize=256, ttl=None):
+        self.name = name
+        self.stamp = VersionStamp(name)
+        self.entries = LRUCache(maxsize, ttl=ttl)
+        self._version = None
+        self._lock = threading.Lock()
+    
+    def init_app(self, app, maxsize=None, ttl=None):
+        self.stamp.init_app(app)
+        if maxsize:
+            self.entries.maxsize = maxsize
+        if ttl:
+            self.entries.ttl = ttl
+        self._version = self.stamp.current()
+    
+    def _sync(self):
+        version = self.stamp.current()
+        if version != self._version:
+            with self._lock:
+                self.entries.clear()
+                self._version = version
+        return version
+    
+    def get_or_set(self, key, loader):
+        """Return the cached value for key, calling loader() on a miss"""
+        version = self._sync()
+        value = self.entries.get(key, self._missing)
+        if value is self._missing:
+            value = loader()
+            # An invalidate() during the load may have come after the rows were read
+            if self.stamp.current() == version:
+                self.entries.set(key, value)
+        return value
+    
+    def invalidate(self):
+        """Drop this worker's entries and tell the other workers to do the same"""
+        self.entries.clear()
+        self.stamp.bump()
+        self._version = self.stamp.current()
+    
+    def stats(self):
+        return {'name': self.name, **self.entries.stats()}
+
+class SharedCache:
+    """Short-lived JSON values shared by every worker on the host through files.
+    
+    Entries expire after ttl seconds, and invalidate() bumps a version stamp so
+    all workers stop serving entries computed before the last write.
+    """
+    
+    def __init__(self, name, ttl=30, stamp=None):
+        self.name = name
+        self.ttl = ttl
+        self.stamp = stamp or VersionStamp(name)
+        self.directory = None
+        self.hits = 0
+        self.misses = 0
+    
+    def init_app(self, app, ttl=None):
+        self.stamp.init_app(app)
+        self.directory = os.path.dirname(self.stamp.path)
+        if ttl is not None:
+            self.ttl = ttl
+    
+    def _path(self, key):
+        digest = hashlib.sha1(repr(key).encode()).hexdigest()[:16]
+        return os.path.join(self.directory, f'{self.name}-{digest}.json')
+    
+    def get(self, key):
+        if self.directory is None:
+            return None
+        try:
+            with open(self._path(key)) as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            entry = None
+        
+        if entry and entry['version'] == self.stamp.current() and entry['expires'] > time.time():
+            self.hits += 1
+            return entry['value']
+        self.misses += 1
+        return None
+    
+    def set(self, key, value, version=None):
+        if self.directory is None:
+            return
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'version': self.stamp.current() if version is None else version,
+                'expires': time.time() + self.ttl,
+                'value': value
+            }, f)
+        os.replace(tmp_path, path)
+    
+    def get_or_set(self, key, loader):
+        """Return the shared value for key, computing and publishing it on a miss"""
+        value = self.get(key)
+        if value is None:
+            # Read the stamp before loading so a write during the load is not masked
+            version = self.stamp.current()
+            value = loader()
+            self.set(key, value, version=version)
+        return value
+    
+    def invalidate(self):
+        self.stamp.bump()
+    
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'name': self.name,
+            'ttl': self.ttl,
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0
+        }
@@ -0,0 +1,222 @@
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import select, insert, update, delete, func
+from extensions import db
+from models.money import Cents
+from models.checkpoint import BalanceCheckpoint, CheckpointPeriod
+from models.student import Student, BalanceHistory
+from services import archive
+
+def period_end(day):
+    """Last day of the month containing day"""
+    following = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return following - timedelta(days=1)
+
+def _boundary(day):
+    # A checkpoint for period_end covers history created before midnight after it
+    return datetime.combine(day + timedelta(days=1), time())
+
+def _periods(first, last):
+    current = period_end(first)
+    while current <= last:
+        yield current
+        current = period_end(current + timedelta(days=1))
+
+def ensure_schema():
+    """Create the checkpoint table, and the (student_id, created_at) index on an older balance_history"""
+    BalanceCheckpoint.__table__.create(db.engine, checkfirst=True)
+    CheckpointPeriod.__table__.create(db.engine, checkfirst=True)
+    for index in BalanceHistory.__table__.indexes:
+        if index.name == 'ix_balance_history_student_created':
+            index.create(db.engine, checkfirst=True)
+
+def _openings(student_ids=None, history=BalanceHistory):
+    """previous_balance of each student's first history row: their balance before any history"""
+    first = select(history.student_id, func.min(history.id).label('first_id'))
+    if student_ids is not None:
+        first = first.where(history.student_id.in_(student_ids))
+    first = first.group_by(history.student_id).subquery()
+    return dict(db.session.execute(
+        select(history.student_id, history.previous_balance)
+        .join(first, history.id == first.c.first_id)
+    ).all())
+
+def _latest(before, student_ids=None):
+    """Each student's most recent checkpoint balance with period_end before a date"""
+    latest = select(BalanceCheckpoint.student_id, func.max(BalanceCheckpoint.period_end).label('period_end'))
+    latest = latest.where(BalanceCheckpoint.period_end < before)
+    if student_ids is not None:
+        latest = latest.where(BalanceCheckpoint.student_id.in_(student_ids))
+    latest = latest.group_by(BalanceCheckpoint.student_id).subquery()
+    return dict(db.session.execute(
+        select(BalanceCheckpoint.student_id, BalanceCheckpoint.balance).join(
+            latest,
+            (BalanceCheckpoint.student_id == latest.c.student_id)
+            & (BalanceCheckpoint.period_end == latest.c.period_end)
+        )
+    ).all())
+
+def _build(periods, watermark, student_ids=None, progress=None):
+    """Write checkpoints for each period in order, for every student with history in it.
+    
+    A full build (no student_ids) also records each period as built.
+    """
+    periods = list(periods)
+    if not periods:
+        return 0
+    
+    running = _latest(periods[0], student_ids)
+    openings = None
+    written = 0
+    
+    for end in periods:
+        activity = (
+            select(BalanceHistory.student_id, func.sum(BalanceHistory.change_amount), func.count())
+            .where(BalanceHistory.created_at >= datetime.combine(end.replace(day=1), time()))
+            .where(BalanceHistory.created_at < _boundary(end))
+        )
+        if student_ids is not None:
+            activity = activity.where(BalanceHistory.student_id.in_(student_ids))
+        activity = db.session.execute(activity.group_by(BalanceHistory.student_id)).all()
+        
+        rows = []
+        for student_id, change, count in activity:
+            if student_id not in running:
+                if openings is None:
+                    openings = _openings(student_ids)
+                running[student_id] = openings.get(student_id, Cents(0))
+            running[student_id] += change
+            rows.append({
+                'student_id': student_id,
+                'period_end': end,
+                'balance': running[student_id],
+                'history_rows': count,
+            })
+        if rows:
+            db.session.execute(insert(BalanceCheckpoint), rows)
+        if student_ids is None:
+            db.session.add(CheckpointPeriod(period_end=end, history_watermark=watermark))
+        db.session.commit()
+        written += len(rows)
+        if progress:
+            progress(end, len(rows))
+    return written
+
+def build_checkpoints(through=None, progress=None):
+    """Add month-end balance checkpoints up to the last closed month; safe to run repeatedly.
+    
+    Each run only adds the months after the last one built; a student gets a
+    checkpoint only for months with history. History rows written since the
+    previous run but dated inside months already built (backfills, imports)
+    are found by id; those students' checkpoints from that month on are
+    rebuilt. Returns a summary dict.
+    """
+    ensure_schema()
+    through = through or period_end(date.today().replace(day=1) - timedelta(days=1))
+    watermark = db.session.execute(select(func.max(BalanceHistory.id))).scalar() or 0
+    built, previous_watermark = db.session.execute(
+        select(func.max(CheckpointPeriod.period_end), func.max(CheckpointPeriod.history_watermark))
+    ).one()
+    
+    rebuilt_students = 0
+    rebuilt = 0
+    if built:
+        late = db.session.execute(
+            select(BalanceHistory.student_id, func.min(BalanceHistory.created_at))
+            .where(BalanceHistory.id > (previous_watermark or 0))
+            .where(BalanceHistory.created_at < _boundary(built))
+            .group_by(BalanceHistory.student_id)
+        ).all()
+        by_period = {}
+        for student_id, earliest in late:
+            by_period.setdefault(period_end(earliest.date()), []).append(student_id)
+        for start, student_ids in sorted(by_period.items()):
+            for offset in range(0, len(student_ids), 500):
+                batch = student_ids[offset:offset + 500]
+                db.session.execute(delete(BalanceCheckpoint).where(
+                    BalanceCheckpoint.student_id.in_(batch),
+                    BalanceCheckpoint.period_end >= start
+                ))
+                rebuilt += _build(_periods(start, built), watermark, batch)
+            rebuilt_students += len(student_ids)
+        if late:
+            # Those rows are now covered; later runs need not look at them again
+            db.session.execute(
+                update(CheckpointPeriod).where(CheckpointPeriod.period_end == built).values(history_watermark=watermark)
+            )
+            db.session.commit()
+        start = built + timedelta(days=1)
+    else:
+        first = db.session.execute(select(func.min(BalanceHistory.created_at))).scalar()
+        start = first.date() if first else None
+    
+    written = _build(_periods(start, through), watermark, progress=progress) if start else 0
+    return {
+        'checkpoints': written,
+        'rebuilt_students': rebuilt_students,
+        'rebuilt_checkpoints': rebuilt,
+        'through': through,
+    }
+
+def balance_as_of(student_id, moment):
+    """(balance, checkpoint period_end or None, tail rows) at a datetime, or at the end of a date.
+    
+    Starts from the newest checkpoint before the moment and adds the history
+    rows after it, at most about a month of one student's rows once
+    checkpoints are built. Rows of closed academic years are read from the
+    archive only when the moment or its checkpoint falls in one.
+    """
+    if not isinstance(moment, datetime):
+        moment = _boundary(moment)
+    
+    checkpoint = db.session.execute(
+        select(BalanceCheckpoint.period_end, BalanceCheckpoint.balance)
+        .where(BalanceCheckpoint.student_id == student_id)
+        .where(BalanceCheckpoint.period_end < moment.date())
+        .order_by(BalanceCheckpoint.period_end.desc())
+        .limit(1)
+    ).first()
+    
+    history = archive.history(checkpoint.period_end + timedelta(days=1) if checkpoint else date.min, moment)
+    tail = select(func.sum(history.change_amount), func.count()).where(
+        history.student_id == student_id,
+        history.created_at < moment
+    )
+    if checkpoint:
+        tail = tail.where(history.created_at >= _boundary(checkpoint.period_end))
+    change, rows = db.session.execute(tail).one()
+    
+    if checkpoint:
+        base = checkpoint.balance
+    else:
+        base = _openings([student_id], history).get(student_id)
+        if base is None:
+            # No history at all: the balance has never changed
+            base = db.session.execute(select(Student.balance).where(Student.id == student_id)).scalar() or Cents(0)
+    return base + (change or 0), checkpoint.period_end if checkpoint else None, rows
+
+def statement_summary(student_id, date_from, date_to):
+    """Opening and closing balance for a date range with the movements in it, by change type"""
+    opening, checkpoint, tail_rows = balance_as_of(student_id, _boundary(date_from - timedelta(days=1)))
+    history = archive.history(date_from, date_to)
+    movements = db.session.execute(
+        select(history.change_type, func.sum(history.change_amount), func.count())
+        .where(history.student_id == student_id)
+        .where(history.created_at >= _boundary(date_from - timedelta(days=1)))
+        .where(history.created_at < _boundary(date_to))
+        .group_by(history.change_type)
+    ).all()
+    
+    closing = opening + sum((amount for _, amount, _ in movements), Cents(0))
+    return {
+        'student_id': student_id,
+        'date_from': date_from.isoformat(),
+        'date_to': date_to.isoformat(),
+        'opening_balance': float(opening),
+        'closing_balance': float(closing),
+        'movements': {
+            change_type: {'amount': float(amount), 'count': count}
+            for change_type, amount, count in movements
+        },
+        'checkpoint': checkpoint.isoformat() if checkpoint else None,
+        'tail_rows': tail_rows,
+    }
@@ -0,0 +1,200 @@
+import random
+from datetime import date, datetime, time, timedelta
+from sqlalchemy import select, insert, func, text, inspect
+from extensions import db, ledger_stamp, fee_cache, student_numbers
+from models.student import Student, BalanceHistory
+from models.payment import Payment
+from models.fee import FeeStructure, FeeApplication
+from models.archive import PaymentArchive, BalanceHistoryArchive
+from models.money import Cents
+from services import rollup, aging
+
+FIRST_NAMES = (
+    'John', 'Sarah', 'Michael', 'Emily', 'James', 'Grace', 'Peter', 'Mary', 'David', 'Faith',
+    'Brian', 'Mercy', 'Kevin', 'Joy', 'Dennis', 'Esther', 'Collins', 'Ann', 'Victor', 'Lucy',
+    'Samuel', 'Naomi', 'Daniel', 'Caroline', 'Joseph', 'Purity', 'Stephen', 'Winnie', 'Eric', 'Sharon',
+    'Ian', 'Diana', 'Felix', 'Janet', 'Moses', 'Beatrice', 'Paul', 'Lilian', 'Allan', 'Cynthia',
+)
+SURNAMES = (
+    'Mwangi', 'Wanjiku', 'Kiprotich', 'Achieng', 'Otieno', 'Kamau', 'Njoroge', 'Wambui', 'Odhiambo', 'Chebet',
+    'Mutua', 'Nyambura', 'Kariuki', 'Atieno', 'Kiptoo', 'Muthoni', 'Omondi', 'Jepkosgei', 'Ochieng', 'Wairimu',
+    'Kibet', 'Nduta', 'Owino', 'Cherono', 'Maina', 'Akinyi', 'Rotich', 'Gathoni', 'Onyango', 'Jeruto',
+)
+GRADES = ('9', '10', '11', '12')
+TERMS = (('Term 1', (1, 6)), ('Term 2', (5, 2)), ('Term 3', (8, 29)))
+# (fee type, amount for grade 9 per term, increase per grade)
+FEE_TYPES = (('Tuition', 25000, 3000), ('Boarding', 18000, 1000), ('Activity', 2500, 0))
+# M-Pesa dominates school fee collections
+PAYMENT_METHODS = ('M-Pesa', 'Bank Transfer', 'Cash', 'Cheque', 'Card')
+METHOD_WEIGHTS = (60, 22, 10, 5, 3)
+
+def _ensure_fee_structures(academic_year):
+    """Create the year's fee structure if it has none; returns {(grade, term): total}"""
+    existing = db.session.execute(
+        select(FeeStructure.id).where(FeeStructure.academic_year == academic_year).limit(1)
+    ).first()
+    if existing is None:
+        db.session.execute(insert(FeeStructure), [
+            {
+                'grade': grade,
+                'term': term,
+                'fee_type': fee_type,
+                'amount': Cents.parse(base + step * index),
+                'academic_year': academic_year,
+                'is_active': True,
+            }
+            for index, grade in enumerate(GRADES)
+            for term, _ in TERMS
+            for fee_type, base, step in FEE_TYPES
+        ])
+        db.session.commit()
+        fee_cache.invalidate()
+    
+    return {
+        (grade, term): total
+        for grade, term, total in db.session.execute(
+            select(FeeStructure.grade, FeeStructure.term, func.sum(FeeStructure.amount))
+            .where(FeeStructure.academic_year == academic_year, FeeStructure.is_active == True)
+            .group_by(FeeStructure.grade, FeeStructure.term)
+        )
+    }
+
+def _next_id(model, archive=None):
+    # Closed years keep their ids in the archive table; new rows must not reuse them
+    models = [model]
+    if archive is not None and inspect(db.session.connection()).has_table(archive.__tablename__):
+        models.append(archive)
+    return max(db.session.execute(select(func.max(m.id))).scalar() or 0 for m in models) + 1
+
+def _moment(rng, day):
+    return datetime.combine(day, time(rng.randint(7, 17), rng.randint(0, 59), rng.randint(0, 59)))
+
+def generate_dataset(students=1000, payments=20000, history=None, academic_year=2024, seed=42,
+                     chunk_size=1000, progress=None):
+    """Append a reproducible synthetic school to the database with bulk inserts.
+    
+    Every student is billed each term (a fee_applications row and a
+    'fee_applied' history row), pays in a number of instalments, and may get
+    small adjustments until the balance_history total reaches history. The
+    history chain, balances, daily rollup and debt aging are consistent with
+    each other. The same seed and sizes always produce the same names, grades, amounts
+    and dates.
+    """
+    aging.ensure_schema()
+    rng = random.Random(seed)
+    year = str(academic_year)
+    term_totals = _ensure_fee_structures(year)
+    term_dates = [(term, date(academic_year, month, day)) for term, (month, day) in TERMS]
+    last_day = date(academic_year, 11, 20)
+    
+    minimum_history = payments + students * len(TERMS)
+    adjustments = max(0, (history or 0) - minimum_history)
+    
+    # Spread payments and adjustments over students so the totals come out exact
+    base_payments, extra_payments = divmod(payments, students)
+    extra_payment_students = set(rng.sample(range(students), extra_payments))
+    base_adjustments, extra_adjustments = divmod(adjustments, students)
+    extra_adjustment_students = set(rng.sample(range(students), extra_adjustments))
+    
+    # Explicit ids let history rows reference payments without RETURNING round trips
+    student_id = _next_id(Student)
+    payment_id = _next_id(Payment, PaymentArchive)
+    history_id = _next_id(BalanceHistory, BalanceHistoryArchive)
+    application_id = _next_id(FeeApplication)
+    
+    totals = {'students': 0, 'payments': 0, 'balance_history': 0, 'fee_applications': 0}
+    
+    for chunk_start in range(0, students, chunk_size):
+        chunk = range(chunk_start, min(chunk_start + chunk_size, students))
+        numbers = student_numbers.reserve(len(chunk))
+        student_rows, payment_rows, history_rows, application_rows = [], [], [], []
+        
+        for number, index in zip(numbers, chunk):
+            grade = rng.choice(GRADES)
+            events = []
+            billed = Cents(0)
+            
+            for term, start in term_dates:
+                amount = term_totals.get((grade, term), Cents(0))
+                if not amount:
+                    continue
+                billed += amount
+                at = _moment(rng, start)
+                application_rows.append({
+                    'id': application_id, 'student_id': student_id, 'term': term,
+                    'academic_year': year, 'amount': amount, 'created_at': at,
+                })
+                application_id += 1
+                events.append((at, amount, 'fee_applied', None, f'{term} {year} fees applied'))
+            
+            count = base_payments + (index in extra_payment_students)
+            # Most families pay 70-105% of the year's fees across their instalments
+            share = rng.randint(70, 105)
+            for _ in range(count):
+                day = term_dates[0][1] + timedelta(days=rng.randint(0, (last_day - term_dates[0][1]).days))
+                # Instalments are rounded to 50 shillings (5000 cents)
+                amount = Cents(max(10000, round(billed * share / (100 * count) / 5000) * 5000))
+                method = rng.choices(PAYMENT_METHODS, METHOD_WEIGHTS)[0]
+                at = _moment(rng, day)
+                payment_rows.append({
+                    'id': payment_id, 'student_id': student_id, 'amount': amount, 'fee_type': 'Tuition',
+                    'payment_method': method, 'payment_date': day, 'grade': grade,
+                    'transaction_reference': f'SYN{seed:04d}{payment_id:010d}' if method != 'Cash' else None,
+                    'receipt_number': f'RCP-{day:%Y%m%d}-{payment_id:08X}', 'created_at': at, 'updated_at': at,
+                })
+                events.append((at, -amount, 'payment', payment_id, 'Payment received: Tuition'))
+                payment_id += 1
+            
+            for _ in range(base_adjustments + (index in extra_adjustment_students)):
+                day = term_dates[0][1] + timedelta(days=rng.randint(0, (last_day - term_dates[0][1]).days))
+                amount = Cents(rng.choice((-1, 1)) * rng.randint(1, 10) * 5000)
+                events.append((_moment(rng, day), amount, 'adjustment', None, 'Balance correction'))
+            
+            events.sort(key=lambda event: event[0])
+            balance = Cents(0)
+            for at, amount, change_type, reference_id, description in events:
+                history_rows.append({
+                    'id': history_id, 'student_id': student_id, 'previous_balance': balance,
+                    'new_balance': balance + amount, 'change_amount': amount, 'change_type': change_type,
+                    'reference_id': reference_id, 'description': description, 'created_at': at,
+                })
+                balance += amount
+                history_id += 1
+            
+            student_rows.append({
+                'id': student_id, 'student_number': number,
+                'full_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}',
+                'grade': grade, 'guardian_name': f'{rng.choice(FIRST_NAMES)} {rng.choice(SURNAMES)}',
+                'guardian_contact': f'+2547{rng.randint(0, 99999999):08d}',
+                'balance': balance, 'is_active': True, 'enrollment_date': term_dates[0][1],
+                'created_at': datetime.combine(term_dates[0][1], time(8)),
+                'updated_at': datetime.combine(term_dates[0][1], time(8)),
+            })
+            student_id += 1
+        
+        for model, rows in ((Student, student_rows), (FeeApplication, application_rows),
+                            (Payment, payment_rows), (BalanceHistory, history_rows)):
+            if rows:
+                db.session.execute(insert(model), rows)
+        aging.refresh([row['id'] for row in student_rows])
+        db.session.commit()
+        
+        totals['students'] += len(student_rows)
+        totals['payments'] += len(payment_rows)
+        totals['balance_history'] += len(history_rows)
+        totals['fee_applications'] += len(application_rows)
+        if progress:
+            progress(totals)
+    
+    if db.engine.dialect.name == 'postgresql':
+        # Explicit ids do not advance SERIAL sequences; move them past the new rows
+        for model in (Student, Payment, BalanceHistory, FeeApplication):
+            table = model.__tablename__
+            db.session.execute(text(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), (SELECT MAX(id) FROM {table}))"
+            ))
+        db.session.commit()
+    
+    totals['rollup_rows'] = rollup.rebuild(date_from=term_dates[0][1], date_to=last_day)
+    ledger_stamp.bump()
+    return totals
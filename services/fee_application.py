@@ -0,0 +1,213 @@
+from datetime import datetime
+from sqlalchemy import select, insert, update, func, literal, exists
+from sqlalchemy.exc import IntegrityError
+from extensions import db, ledger_stamp, audit_log
+from models.student import Student, BalanceHistory
+from models.fee import FeeStructure, FeeApplication
+from models.money import Cents
+from services import aging
+
+DEFAULT_BATCH_SIZE = 500
+
+class FeeApplicationError(Exception):
+    """Fees that cannot be applied, or have already been applied for the term"""
+
+def _fee_totals(term, academic_year, grade=None):
+    """Per-grade fee totals for a term as a subquery"""
+    query = select(
+        FeeStructure.grade.label('grade'),
+        func.sum(FeeStructure.amount).label('total')
+    ).where(
+        FeeStructure.is_active == True,
+        FeeStructure.term == term,
+        FeeStructure.academic_year == academic_year
+    ).group_by(FeeStructure.grade)
+    
+    if grade:
+        query = query.where(FeeStructure.grade == grade)
+    
+    return query.subquery('fee_totals')
+
+def _eligible_students(totals, term, academic_year):
+    """Active students with a fee total whose fees have not been applied for the term"""
+    already_applied = exists().where(
+        FeeApplication.student_id == Student.id,
+        FeeApplication.term == term,
+        FeeApplication.academic_year == academic_year
+    )
+    return select(Student.id).join(totals, totals.c.grade == Student.grade).where(
+        Student.is_active == True,
+        totals.c.total > 0,
+        ~already_applied
+    )
+
+def apply_fees(student, term, academic_year, user_id=None):
+    """Apply a term's fee structure to one student; returns (amount applied, new balance).
+    
+    Uses the same claim as apply_fees_bulk: the FeeApplication row is inserted
+    first under the (student, term, academic_year) unique constraint, so a
+    student billed by either path is never billed again for the term. The
+    caller commits.
+    """
+    total = FeeStructure.get_total_fees_for_grade(student.grade, term, academic_year)
+    
+    if total == 0:
+        raise FeeApplicationError(f'No {term} {academic_year} fee structure defined for Grade {student.grade}')
+    
+    already_applied = f'{term} {academic_year} fees have already been applied to {student.full_name}'
+    
+    if db.session.execute(select(FeeApplication.id).filter_by(
+        student_id=student.id, term=term, academic_year=academic_year
+    )).first():
+        raise FeeApplicationError(already_applied)
+    
+    application = FeeApplication(
+        student_id=student.id,
+        term=term,
+        academic_year=academic_year,
+        amount=total,
+        applied_by=user_id
+    )
+    db.session.add(application)
+    
+    try:
+        db.session.flush()
+    except IntegrityError:
+        # A concurrent request claimed the student first
+        db.session.rollback()
+        raise FeeApplicationError(already_applied)
+    
+    new_balance = student.update_balance(
+        amount=total,
+        change_type='fee_applied',
+        description=f'{term} {academic_year} fees applied',
+        created_by=user_id,
+        reference_id=application.id
+    )
+    aging.refresh([student.id])
+    
+    return total, new_balance
+
+def apply_fees_bulk(term, academic_year, grade=None, user_id=None, ip_address=None,
+                    batch_size=DEFAULT_BATCH_SIZE, progress=None):
+    """Apply a term's fee structure to a grade (or the whole school) in set-based batches.
+    
+    Each batch records the fee applications, writes the balance history rows and
+    updates the balances with three statements in a single transaction. Students
+    already billed for (term, academic_year) are skipped, so re-running is safe.
+    """
+    totals = _fee_totals(term, academic_year, grade)
+    eligible = _eligible_students(totals, term, academic_year)
+    
+    pending = db.session.execute(
+        select(func.count()).select_from(eligible.subquery())
+    ).scalar()
+    
+    applied_at = datetime.utcnow()
+    description = f'{term} {academic_year} fees applied'
+    students_billed = 0
+    total_amount = Cents(0)
+    batches = 0
+    last_id = 0
+    
+    if progress:
+        progress(0, pending)
+    
+    while True:
+        ids = db.session.execute(
+            eligible.where(Student.id > last_id).order_by(Student.id).limit(batch_size)
+        ).scalars().all()
+        
+        if not ids:
+            break
+        
+        last_id = ids[-1]
+        
+        # Claim the students first; the unique constraint stops a concurrent run
+        # from billing the same (student, term, academic_year) twice.
+        db.session.execute(
+            insert(FeeApplication).from_select(
+                ['student_id', 'term', 'academic_year', 'amount', 'applied_by', 'created_at'],
+                select(
+                    Student.id,
+                    literal(term),
+                    literal(academic_year),
+                    totals.c.total,
+                    literal(user_id, db.Integer),
+                    literal(applied_at, db.DateTime)
+                ).join(totals, totals.c.grade == Student.grade).where(Student.id.in_(ids))
+            )
+        )
+        
+        applied = select(FeeApplication).where(
+            FeeApplication.term == term,
+            FeeApplication.academic_year == academic_year
+        ).subquery('applied')
+        
+        db.session.execute(
+            insert(BalanceHistory).from_select(
+                ['student_id', 'previous_balance', 'new_balance', 'change_amount',
+                 'change_type', 'reference_id', 'description', 'created_by', 'created_at'],
+                select(
+                    Student.id,
+                    Student.balance,
+                    Student.balance + applied.c.amount,
+                    applied.c.amount,
+                    literal('fee_applied'),
+                    applied.c.id,
+                    literal(description),
+                    literal(user_id, db.Integer),
+                    literal(applied_at, db.DateTime)
+                ).join(applied, applied.c.student_id == Student.id).where(Student.id.in_(ids))
+            )
+        )
+        
+        db.session.execute(
+            update(Student).where(Student.id.in_(ids)).values(
+                balance=Student.balance + select(FeeApplication.amount).where(
+                    FeeApplication.student_id == Student.id,
+                    FeeApplication.term == term,
+                    FeeApplication.academic_year == academic_year
+                ).scalar_subquery(),
+                updated_at=applied_at
+            ).execution_options(synchronize_session=False)
+        )
+        
+        batch_amount = db.session.execute(
+            select(func.sum(FeeApplication.amount)).where(
+                FeeApplication.term == term,
+                FeeApplication.academic_year == academic_year,
+                FeeApplication.student_id.in_(ids)
+            )
+        ).scalar() or 0
+        
+        aging.refresh(ids)
+        db.session.commit()
+        
+        students_billed += len(ids)
+        total_amount += batch_amount
+        batches += 1
+        
+        if progress:
+            progress(students_billed, pending)
+    
+    scope = f'Grade {grade}' if grade else 'all grades'
+    audit_log.record_now(
+        user_id=user_id,
+        action='bulk_apply_fees',
+        entity_type='fee',
+        details=f'Applied {term} {academic_year} fees to {students_billed} students ({scope}), total {total_amount:,.2f}',
+        ip_address=ip_address
+    )
+    
+    if students_billed:
+        ledger_stamp.bump()
+    
+    return {
+        'term': term,
+        'academic_year': academic_year,
+        'grade': grade,
+        'students_billed': students_billed,
+        'amount_applied': float(total_amount),
+        'batches': batches
+    }
@@ -0,0 +1,238 @@
+import atexit
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+from flask import g, request, has_request_context, request_started, request_finished
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Per key: request count, latency sum, SQL statements, DB seconds, rows, then one slot per bucket (+Inf last)
+COUNT, LATENCY, STATEMENTS, DB_SECONDS, ROWS, FIRST_BUCKET = range(6)
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if not has_request_context():
+        return
+    current = g.get('_metrics')
+    if current is None or context is None:
+        return
+    current[0] += 1
+    current[1] += time.perf_counter() - getattr(context, '_metrics_started', time.perf_counter())
+    # psycopg2 reports the size of a SELECT's result; sqlite3 only reports rows changed by DML
+    if cursor.rowcount > 0:
+        current[2] += cursor.rowcount
+
+def _merge(target, data):
+    for key, values in data.items():
+        entry = target.get(key)
+        if entry is None:
+            target[key] = list(values)
+        else:
+            for i, value in enumerate(values):
+                entry[i] += value
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class RequestMetrics:
+    """Per-endpoint request latency and SQL totals, aggregated per worker and merged across workers.
+    
+    Each worker keeps counters in memory and writes them to its own file under
+    METRICS_DIR at most every METRICS_WRITE_INTERVAL seconds. collect() adds up
+    every worker's file; files of workers that have exited are folded into a
+    single retired file so their counts are kept without the directory growing.
+    """
+    
+    def __init__(self):
+        self.enabled = False
+        self.directory = None
+        self.buckets = DEFAULT_BUCKETS
+        self.write_interval = 5.0
+        self._data = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._pid = None
+        self._path = None
+        self._written = 0.0
+        self._registered = False
+    
+    def init_app(self, app):
+        self.enabled = app.config.get('METRICS_ENABLED', True)
+        if not self.enabled:
+            return
+        self.buckets = tuple(app.config.get('METRICS_BUCKETS', DEFAULT_BUCKETS))
+        self.write_interval = app.config.get('METRICS_WRITE_INTERVAL', 5.0)
+        self.directory = app.config.get('METRICS_DIR') or os.path.join(app.instance_path, 'metrics')
+        os.makedirs(self.directory, exist_ok=True)
+        
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        request_started.connect(self._request_started, app)
+        request_finished.connect(self._request_finished, app)
+        if not self._registered:
+            atexit.register(self.write)
+            self._registered = True
+    
+    def _request_started(self, sender, **extra):
+        g._metrics_started = time.perf_counter()
+        g._metrics = [0, 0.0, 0]
+    
+    def _request_finished(self, sender, response, **extra):
+        started = g.pop('_metrics_started', None)
+        current = g.pop('_metrics', None)
+        if started is None:
+            return
+        # Streamed bodies are still being sent at this point; their time is not included
+        self.observe(
+            request.endpoint or 'none',
+            request.method,
+            response.status_code,
+            time.perf_counter() - started,
+            *current
+        )
+    
+    def observe(self, endpoint, method, status, seconds, statements=0, db_seconds=0.0, rows=0):
+        """Record one finished request"""
+        if not self.enabled:
+            return
+        key = f'{endpoint}|{method}|{status}'
+        bucket = FIRST_BUCKET + next(
+            (i for i, bound in enumerate(self.buckets) if seconds <= bound), len(self.buckets)
+        )
+        with self._lock:
+            self._check_pid()
+            entry = self._data.get(key)
+            if entry is None:
+                entry = self._data[key] = [0, 0.0, 0, 0.0, 0] + [0] * (len(self.buckets) + 1)
+            entry[COUNT] += 1
+            entry[LATENCY] += seconds
+            entry[STATEMENTS] += statements
+            entry[DB_SECONDS] += db_seconds
+            entry[ROWS] += rows
+            entry[bucket] += 1
+            due = time.monotonic() - self._written >= self.write_interval
+        if due:
+            self.write()
+    
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            # A forked worker starts from zero rather than double-counting its parent
+            self._pid = os.getpid()
+            self._data = {}
+            self._path = os.path.join(self.directory, f'worker-{self._pid}-{time.time_ns()}.json')
+    
+    def write(self):
+        """Write this worker's counters to its file"""
+        if not self.enabled or self._pid != os.getpid():
+            return
+        with self._write_lock:
+            with self._lock:
+                snapshot = json.dumps({'pid': self._pid, 'buckets': self.buckets, 'data': self._data})
+                self._written = time.monotonic()
+            try:
+                tmp_path = f'{self._path}.tmp'
+                with open(tmp_path, 'w') as f:
+                    f.write(snapshot)
+                os.replace(tmp_path, self._path)
+            except OSError:
+                logger.exception('Could not write request metrics to %s', self._path)
+    
+    def collect(self):
+        """Counters summed over every worker, past and present, keyed by endpoint|method|status"""
+        self.write()
+        totals = {}
+        workers = 0
+        with open(os.path.join(self.directory, 'retire.lock'), 'a') as lock:
+            # One collector at a time, so an exited worker is never folded in twice
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            retired_path = os.path.join(self.directory, 'retired.json')
+            retired = (self._load(retired_path) or {}).get('data', {})
+            changed = False
+            for path in glob.glob(os.path.join(self.directory, 'worker-*.json')):
+                snapshot = self._load(path)
+                if snapshot is None:
+                    continue
+                if snapshot['pid'] != os.getpid() and not _pid_alive(snapshot['pid']):
+                    _merge(retired, snapshot['data'])
+                    os.remove(path)
+                    changed = True
+                    continue
+                workers += 1
+                _merge(totals, snapshot['data'])
+            if changed:
+                tmp_path = f'{retired_path}.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump({'buckets': self.buckets, 'data': retired}, f)
+                os.replace(tmp_path, retired_path)
+        _merge(totals, retired)
+        return totals, workers
+    
+    def _load(self, path):
+        try:
+            with open(path) as f:
+                snapshot = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if tuple(snapshot.get('buckets', ())) != self.buckets:
+            # Written under different METRICS_BUCKETS; the histograms cannot be added
+            return None
+        return snapshot
+    
+    def render(self):
+        """All workers' metrics in the Prometheus text exposition format"""
+        totals, workers = self.collect()
+        lines = [
+            '# HELP http_request_duration_seconds Time to handle a request, by endpoint.',
+            '# TYPE http_request_duration_seconds histogram',
+        ]
+        counters = []
+        for key in sorted(totals):
+            values = totals[key]
+            endpoint, method, status = key.split('|')
+            labels = f'endpoint="{_escape(endpoint)}",method="{method}",status="{status}"'
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values[FIRST_BUCKET:]):
+                cumulative += count
+                lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f'http_request_duration_seconds_sum{{{labels}}} {_number(values[LATENCY])}')
+            lines.append(f'http_request_duration_seconds_count{{{labels}}} {values[COUNT]}')
+            counters.append((labels, values))
+        
+        for name, index, help_text in (
+            ('http_request_sql_statements_total', STATEMENTS, 'SQL statements executed while handling requests.'),
+            ('http_request_db_seconds_total', DB_SECONDS, 'Time spent in SQL statements while handling requests.'),
+            ('http_request_db_rows_total', ROWS, 'Rows returned or changed by SQL statements (as reported by the driver).'),
+        ):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for labels, values in counters:
+                lines.append(f'{name}{{{labels}}} {_number(values[index])}')
+        
+        lines.append('# HELP http_metrics_workers Worker processes currently reporting metrics.')
+        lines.append('# TYPE http_metrics_workers gauge')
+        lines.append(f'http_metrics_workers {workers}')
+        return '\n'.join(lines) + '\n'
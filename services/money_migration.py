@@ -0,0 +1,106 @@
+from sqlalchemy import inspect, text, Integer
+from extensions import db
+from models.money import Money
+
+def money_columns():
+    """(table, column, nullable) for every Money column in the models"""
+    return [
+        (table.name, column.name, column.nullable)
+        for table in db.metadata.sorted_tables
+        for column in table.columns
+        if isinstance(column.type, Money)
+    ]
+
+def pending_columns(conn):
+    """Money columns that still hold major units in a DECIMAL column"""
+    inspector = inspect(conn)
+    pending = []
+    for table, column, nullable in money_columns():
+        if not inspector.has_table(table):
+            continue
+        existing = {c['name']: c for c in inspector.get_columns(table)}
+        if column in existing and isinstance(existing[column]['type'], Integer):
+            continue
+        pending.append((table, column, nullable))
+    return pending
+
+# Databases already found converted, by URL (checked once per worker)
+_migrated = set()
+
+def require_migrated():
+    """Raise RuntimeError if the database's money columns still hold DECIMAL major units.
+    
+    Money reads BIGINT cents, so an unconverted 1500.50 would be served as 15.00.
+    """
+    url = str(db.engine.url)
+    if url in _migrated:
+        return
+    with db.engine.connect() as conn:
+        pending = pending_columns(conn)
+    if not pending:
+        _migrated.add(url)
+        return
+    columns = ', '.join(f'{table}.{column}' for table, column, _ in pending)
+    raise RuntimeError(f'Money columns still hold DECIMAL major units ({columns}); run flask migrate-money first')
+
+def migrate_money_columns(dry_run=False):
+    """Convert DECIMAL(15,2) money columns to BIGINT minor units; returns the columns converted.
+    
+    PostgreSQL converts each table with one ALTER ... USING round(x * 100).
+    Other databases add a BIGINT column, copy the rounded values across, drop
+    the old column and rename the new one, re-creating any index on it.
+    Columns already converted are skipped, so the command can be re-run.
+    """
+    with db.engine.begin() as conn:
+        pending = pending_columns(conn)
+        if dry_run or not pending:
+            return pending
+        
+        quote = conn.dialect.identifier_preparer.quote
+        if conn.dialect.name == 'postgresql':
+            by_table = {}
+            for table, column, _ in pending:
+                by_table.setdefault(table, []).append(column)
+            for table, columns in by_table.items():
+                conn.execute(text(f'ALTER TABLE {quote(table)} ' + ', '.join(
+                    f'ALTER COLUMN {quote(c)} TYPE BIGINT USING round({quote(c)} * 100)::bigint'
+                    for c in columns
+                )))
+        else:
+            for table, column, nullable in pending:
+                _rebuild_column(conn, quote, table, column, nullable)
+    return pending
+
+def _rebuild_column(conn, quote, table, column, nullable):
+    inspector = inspect(conn)
+    existing = {c['name'] for c in inspector.get_columns(table)}
+    staging = f'{column}_cents'
+    
+    if column not in existing:
+        # An earlier run stopped after dropping the old column (MySQL DDL is not transactional)
+        conn.execute(text(f'ALTER TABLE {quote(table)} RENAME COLUMN {quote(staging)} TO {quote(column)}'))
+        return
+    if staging in existing:
+        conn.execute(text(f'ALTER TABLE {quote(table)} DROP COLUMN {quote(staging)}'))
+    
+    # Indexes on the column must be dropped before it can be
+    indexes = [i for i in inspector.get_indexes(table) if column in i['column_names']]
+    for index in indexes:
+        drop = f'DROP INDEX {quote(index["name"])}'
+        conn.execute(text(drop + (f' ON {quote(table)}' if conn.dialect.name == 'mysql' else '')))
+    
+    rounded = f'ROUND({quote(column)} * 100)'
+    if conn.dialect.name == 'sqlite':
+        rounded = f'CAST({rounded} AS INTEGER)'
+    conn.execute(text(
+        f'ALTER TABLE {quote(table)} ADD COLUMN {quote(staging)} BIGINT'
+        + ('' if nullable else ' NOT NULL DEFAULT 0')
+    ))
+    conn.execute(text(f'UPDATE {quote(table)} SET {quote(staging)} = {rounded}'))
+    conn.execute(text(f'ALTER TABLE {quote(table)} DROP COLUMN {quote(column)}'))
+    conn.execute(text(f'ALTER TABLE {quote(table)} RENAME COLUMN {quote(staging)} TO {quote(column)}'))
+    
+    for index in indexes:
+        columns = ', '.join(quote(c) for c in index['column_names'])
+        unique = 'UNIQUE ' if index.get('unique') else ''
+        conn.execute(text(f'CREATE {unique}INDEX {quote(index["name"])} ON {quote(table)} ({columns})'))
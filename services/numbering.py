@@ -0,0 +1,131 @@
+import os
+import threading
+import weakref
+from collections import deque
+from sqlalchemy import select, update, insert, text, table, column
+from sqlalchemy.exc import IntegrityError
+
+class NumberAllocator:
+    """Allocates formatted numbers (STU001, STU002, ...) without a query per number.
+    
+    Each worker reserves a block of values at a time from a PostgreSQL
+    sequence, or from a row in number_sequences on other databases, in its
+    own short transaction. Numbers are unique across workers but not gap-free:
+    a block that is only partly used when a worker exits is skipped.
+    """
+    
+    def __init__(self, name, prefix, table_name, column_name, width=3, block_size=20):
+        self.name = name
+        self.prefix = prefix
+        self.table_name = table_name
+        self.column_name = column_name
+        self.width = width
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        self._pid = None
+        # Keyed by engine so apps bound to different databases never share state
+        self._blocks = weakref.WeakKeyDictionary()
+        self._ready = weakref.WeakSet()
+    
+    def init_app(self, app, block_size=None):
+        if block_size:
+            self.block_size = block_size
+    
+    def next(self):
+        """Return the next number from this worker's block, reserving a new block when it runs out"""
+        from extensions import db
+        
+        with self._lock:
+            if self._pid != os.getpid():
+                # Never share a block with a forked parent or sibling
+                self._pid = os.getpid()
+                self._blocks = weakref.WeakKeyDictionary()
+                self._ready = weakref.WeakSet()
+            block = self._blocks.setdefault(db.engine, deque())
+            if not block:
+                block.extend(self._reserve(self.block_size))
+            return self.format(block.popleft())
+    
+    def reserve(self, count):
+        """Reserve count numbers at once (e.g. for a batch enrolment) and return them in order"""
+        if count <= 0:
+            return []
+        return [self.format(value) for value in self._reserve(count)]
+    
+    def format(self, value):
+        return f'{self.prefix}{value:0{self.width}d}'
+    
+    def _reserve(self, count):
+        from extensions import db
+        
+        try:
+            return self._reserve_once(db.engine, count)
+        except IntegrityError:
+            # Another worker seeded the counter row at the same moment; it exists now
+            return self._reserve_once(db.engine, count)
+    
+    def _reserve_once(self, engine, count):
+        # A separate transaction so the reservation commits at once and never
+        # waits on, or rolls back with, the caller's work
+        with engine.begin() as conn:
+            if conn.dialect.name == 'postgresql':
+                self._ensure_sequence(conn)
+                return list(conn.execute(
+                    text('SELECT nextval(CAST(:sequence AS regclass)) FROM generate_series(1, :count)'),
+                    {'sequence': self.sequence_name, 'count': count}
+                ).scalars())
+            
+            self._ensure_counter(conn)
+            counter = self._counter_table()
+            statement = (
+                update(counter)
+                .where(counter.c.name == self.name)
+                .values(next_value=counter.c.next_value + count)
+            )
+            if conn.dialect.update_returning:
+                end = conn.execute(statement.returning(counter.c.next_value)).scalar_one()
+            else:
+                conn.execute(statement)
+                end = conn.execute(select(counter.c.next_value).where(counter.c.name == self.name)).scalar_one()
+            return list(range(end - count, end))
+    
+    @property
+    def sequence_name(self):
+        return f'{self.name}_seq'
+    
+    def _counter_table(self):
+        from models.sequence import NumberSequence
+        return NumberSequence.__table__
+    
+    def _first_value(self, conn):
+        """One past the highest number already issued, so existing databases carry on from there"""
+        source = table(self.table_name, column(self.column_name))
+        numbers = conn.execute(
+            select(source.c[self.column_name]).where(source.c[self.column_name].like(f'{self.prefix}%'))
+        ).scalars()
+        suffixes = [int(n[len(self.prefix):]) for n in numbers if n[len(self.prefix):].isdigit()]
+        return max(suffixes, default=0) + 1
+    
+    def _ensure_counter(self, conn):
+        if conn.engine in self._ready:
+            return
+        counter = self._counter_table()
+        counter.create(conn, checkfirst=True)
+        exists = conn.execute(select(counter.c.name).where(counter.c.name == self.name)).first()
+        if exists is None:
+            conn.execute(insert(counter).values(name=self.name, next_value=self._first_value(conn)))
+        self._ready.add(conn.engine)
+    
+    def _ensure_sequence(self, conn):
+        if conn.engine in self._ready:
+            return
+        # Serialise creation and seeding so two workers cannot both seed the sequence
+        conn.execute(text('SELECT pg_advisory_xact_lock(hashtext(:name))'), {'name': self.sequence_name})
+        created = conn.execute(text('SELECT to_regclass(:name)'), {'name': self.sequence_name}).scalar() is None
+        if created:
+            conn.execute(text(f'CREATE SEQUENCE {self.sequence_name}'))
+            conn.execute(
+                text('SELECT setval(CAST(:name AS regclass), :value, false)'),
+                {'name': self.sequence_name, 'value': self._first_value(conn)}
+            )
+        self._ready.add(conn.engine)
@@ -0,0 +1,135 @@
+import base64
+import json
+from datetime import date, datetime
+from sqlalchemy import tuple_
+from services.cache import LRUCache
+
+# Approximate totals: recounted at most once per TTL for each filter combination
+_count_cache = LRUCache(maxsize=512, ttl=60)
+
+def encode_cursor(values):
+    """Opaque, URL-safe cursor for a row's sort key"""
+    payload = json.dumps([v.isoformat() if isinstance(v, (date, datetime)) else v for v in values],
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+def _load_cursor(cursor, length):
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError):
+        raise ValueError('Invalid cursor')
+    if not isinstance(values, list) or len(values) != length:
+        raise ValueError('Invalid cursor')
+    return values
+
+def decode_cursor(cursor, columns):
+    """Sort key values from a cursor, converted to the columns' Python types"""
+    values = _load_cursor(cursor, len(columns))
+    
+    decoded = []
+    for column, value in zip(columns, values):
+        python_type = column.type.python_type
+        try:
+            if value is not None and python_type is date:
+                value = date.fromisoformat(value)
+            elif value is not None and python_type is datetime:
+                value = datetime.fromisoformat(value)
+        except (ValueError, TypeError):
+            raise ValueError('Invalid cursor')
+        decoded.append(value)
+    return tuple(decoded)
+
+class KeysetPage:
+    """One page of a keyset-paginated query"""
+    
+    def __init__(self, items, next_cursor, prev_cursor, total=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.prev_cursor = prev_cursor
+        self.has_next = next_cursor is not None
+        self.has_prev = prev_cursor is not None
+        self.total = total
+    
+    def to_dict(self, serialize=lambda item: item.to_dict()):
+        return {
+            'items': [serialize(item) for item in self.items],
+            'next_cursor': self.next_cursor,
+            'prev_cursor': self.prev_cursor,
+            'total': self.total
+        }
+
+def keyset_paginate(query, columns, after=None, before=None, per_page=50, descending=False):
+    """Paginate query on a unique sort key (e.g. (full_name, id)) without OFFSET.
+    
+    Pass the next_cursor of a page as after= to move forward and its
+    prev_cursor as before= to move back. Each page costs one indexed range
+    scan of per_page + 1 rows, however deep it is.
+    """
+    key = tuple_(*columns)
+    cursor = before or after
+    
+    if cursor:
+        values = tuple_(*decode_cursor(cursor, columns))
+        # Moving backwards walks the index in reverse from the cursor
+        forward = before is None
+        if forward != descending:
+            query = query.filter(key > values)
+        else:
+            query = query.filter(key < values)
+    
+    reverse = before is not None
+    ordering = [c.desc() if descending != reverse else c.asc() for c in columns]
+    
+    rows = query.order_by(*ordering).limit(per_page + 1).all()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if reverse:
+        rows.reverse()
+    
+    def cursor_for(item):
+        return encode_cursor([getattr(item, c.key) for c in columns])
+    
+    if reverse:
+        next_cursor = cursor_for(rows[-1]) if rows else before
+        prev_cursor = cursor_for(rows[0]) if rows and has_more else None
+    else:
+        next_cursor = cursor_for(rows[-1]) if rows and has_more else None
+        prev_cursor = cursor_for(rows[0]) if rows and after else None
+    
+    return KeysetPage(rows, next_cursor, prev_cursor)
+
+def paginate_ranked(results, key, after=None, before=None, per_page=50):
+    """Keyset pages over results already in memory, such as ranked search matches.
+    
+    key(result) is a result's unique sort key, a tuple of numbers, and is
+    also its cursor; cursors work as in keyset_paginate.
+    """
+    ordered = sorted(results, key=key)
+    cursor = before or after
+    if cursor:
+        position = _load_cursor(cursor, len(key(ordered[0])) if ordered else 0)
+        if not all(isinstance(v, (int, float)) for v in position):
+            raise ValueError('Invalid cursor')
+        position = tuple(position)
+    
+    if before:
+        earlier = [result for result in ordered if key(result) < position]
+        start = max(len(earlier) - per_page, 0)
+    elif after:
+        start = len([result for result in ordered if key(result) <= position])
+    else:
+        start = 0
+    
+    rows = ordered[start:start + per_page]
+    next_cursor = encode_cursor(list(key(rows[-1]))) if rows and start + per_page < len(ordered) else None
+    prev_cursor = encode_cursor(list(key(rows[0]))) if rows and start > 0 else None
+    return KeysetPage(rows, next_cursor, prev_cursor, total=len(ordered))
+
+def cached_count(key, query):
+    """Row count for a filtered query, cached for a short TTL"""
+    total = _count_cache.get(key)
+    if total is None:
+        total = query.order_by(None).count()
+        _count_cache.set(key, total)
+    return total
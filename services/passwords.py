@@ -0,0 +1,148 @@
+import fcntl
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from werkzeug.security import generate_password_hash, check_password_hash
+
+class PasswordHasherBusy(Exception):
+    """Raised when every hashing slot is taken, or a hash takes longer than PASSWORD_HASH_TIMEOUT"""
+
+class PasswordHasher:
+    """Runs password hashing on a small per-worker thread pool.
+    
+    The calling request still waits for its hash, so on a sync gunicorn worker
+    nothing else is served meanwhile. Run gunicorn with --worker-class gthread
+    (and --threads) for other requests to keep running: hashlib's scrypt and
+    pbkdf2 release the GIL, so hashes then run beside request handling. At most
+    workers + queue hashes are admitted at once; a caller finding no free slot
+    gets PasswordHasherBusy straight away rather than waiting, and so does one
+    whose hash takes more than timeout seconds, so a login storm cannot pile
+    up unbounded CPU work or tie up workers.
+    """
+    
+    def __init__(self):
+        self.method = 'scrypt'
+        self.workers = 2
+        self.queue = 16
+        self.timeout = 10
+        self._pid = None
+        self._prefix = None
+        self._init_lock = threading.Lock()
+    
+    def init_app(self, app):
+        self.method = app.config.get('PASSWORD_HASH_METHOD', 'scrypt')
+        self.workers = app.config.get('PASSWORD_HASH_WORKERS', 2)
+        self.queue = app.config.get('PASSWORD_HASH_QUEUE', 16)
+        self.timeout = app.config.get('PASSWORD_HASH_TIMEOUT', 10)
+        self._pid = None
+        self._prefix = None
+    
+    def _run(self, function, *args):
+        if self._pid != os.getpid():
+            with self._init_lock:
+                if self._pid != os.getpid():
+                    # One pool per process; a forked worker must not reuse its parent's threads
+                    self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='password-hash')
+                    self._slots = threading.BoundedSemaphore(self.workers + self.queue)
+                    self._pid = os.getpid()
+        
+        if not self._slots.acquire(blocking=False):
+            raise PasswordHasherBusy('Too many logins in progress')
+        try:
+            future = self._executor.submit(function, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout)
+        except TimeoutError:
+            raise PasswordHasherBusy('Password hashing is backed up')
+    
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+    
+    def verify(self, password_hash, password):
+        return self._run(check_password_hash, password_hash, password)
+    
+    def needs_rehash(self, password_hash):
+        """True when a stored hash was made with a different method or cost than configured"""
+        if self._prefix is None:
+            # werkzeug fills in default parameters, so compare against a real hash's prefix
+            self._prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._prefix
+
+class LoginThrottle:
+    """Counts failed logins per username and per client IP in files shared by all workers.
+    
+    check() is called before any password hashing; once a key reaches its
+    limit within the window, further attempts are refused until the oldest
+    failure ages out.
+    """
+    
+    def __init__(self):
+        self.directory = None
+        self.max_per_user = 5
+        self.max_per_ip = 20
+        self.window = 300
+        self._lock = threading.Lock()
+    
+    def init_app(self, app):
+        cache_dir = app.config.get('CACHE_DIR') or os.path.join(app.instance_path, 'cache')
+        self.directory = os.path.join(cache_dir, 'login_throttle')
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_per_user = app.config.get('LOGIN_MAX_FAILURES', 5)
+        self.max_per_ip = app.config.get('LOGIN_MAX_FAILURES_PER_IP', 20)
+        self.window = app.config.get('LOGIN_THROTTLE_WINDOW', 300)
+    
+    def _path(self, kind, value):
+        digest = hashlib.sha1(f'{kind}:{value}'.lower().encode()).hexdigest()[:20]
+        return os.path.join(self.directory, f'{kind}-{digest}.json')
+    
+    def _failures(self, path, now):
+        try:
+            with open(path) as f:
+                stamps = json.load(f)
+        except (OSError, ValueError):
+            return []
+        return [t for t in stamps if t > now - self.window]
+    
+    def check(self, username, ip_address):
+        """Seconds until another attempt is allowed (0 = allowed now)"""
+        if self.directory is None:
+            return 0
+        now = time.time()
+        wait = 0
+        for kind, value, limit in (('user', username, self.max_per_user), ('ip', ip_address, self.max_per_ip)):
+            failures = self._failures(self._path(kind, value), now)
+            if len(failures) >= limit:
+                wait = max(wait, failures[-limit] + self.window - now)
+        return int(wait) + 1 if wait else 0
+    
+    def failure(self, username, ip_address):
+        if self.directory is None:
+            return
+        now = time.time()
+        with self._lock:
+            for kind, value in (('user', username), ('ip', ip_address)):
+                path = self._path(kind, value)
+                # Other workers update the same file; hold its lock from the read to the replace
+                with open(f'{path}.lock', 'a') as lock:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                    failures = self._failures(path, now) + [now]
+                    tmp_path = f'{path}.{os.getpid()}.tmp'
+                    with open(tmp_path, 'w') as f:
+                        json.dump(failures, f)
+                    os.replace(tmp_path, path)
+    
+    def success(self, username, ip_address):
+        """A correct password clears the username's failures (the IP's remain)"""
+        if self.directory is None:
+            return
+        try:
+            os.remove(self._path('user', username))
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,353 @@
+import csv
+import io
+import re
+import time
+from datetime import datetime, date
+from decimal import Decimal
+from sqlalchemy import select, insert, update, bindparam
+from extensions import db, ledger_stamp, audit_log
+from models.student import Student, BalanceHistory
+from models.payment import Payment
+from models.money import Cents
+from services import rollup, aging
+
+DEFAULT_BATCH_SIZE = 1000
+
+# Header aliases used by bank and M-Pesa statement exports, matched case-insensitively
+COLUMN_ALIASES = {
+    'student_number': ('student_number', 'student number', 'student no', 'admission number',
+                       'admission no', 'account', 'account no', 'account no.', 'account number',
+                       'bill ref number', 'bill reference'),
+    'amount': ('amount', 'paid in', 'credit', 'credit amount', 'deposit', 'deposits'),
+    'payment_date': ('payment_date', 'date', 'completion time', 'transaction date',
+                     'trans date', 'value date', 'posting date'),
+    'reference': ('reference', 'transaction_reference', 'transaction reference', 'receipt no',
+                  'receipt no.', 'transaction id', 'ref', 'ref no', 'cheque no'),
+    'details': ('details', 'narration', 'narrative', 'description', 'other party info',
+                'particulars', 'remarks'),
+    'fee_type': ('fee_type', 'fee type'),
+}
+
+DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y', '%Y/%m/%d',
+                '%Y-%m-%d %H:%M:%S', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M', '%d-%m-%Y %H:%M:%S')
+
+STUDENT_NUMBER_PATTERN = re.compile(r'\bSTU\d+\b', re.IGNORECASE)
+
+class StatementError(Exception):
+    """Raised when a statement file cannot be read at all"""
+
+def _normalize_headers(headers):
+    """Map statement headers onto the importer's field names"""
+    lookup = {alias: field for field, aliases in COLUMN_ALIASES.items() for alias in aliases}
+    return [lookup.get(str(h or '').strip().lower()) for h in headers]
+
+def _iter_csv(stream):
+    text = io.TextIOWrapper(stream, encoding='utf-8-sig', newline='')
+    reader = csv.reader(text)
+    headers = next(reader, None)
+    if headers is None:
+        return
+    yield headers
+    yield from reader
+
+def _iter_xlsx(stream):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise StatementError('Reading .xlsx statements requires the openpyxl package')
+    
+    # read_only mode streams rows instead of loading the whole sheet
+    workbook = load_workbook(stream, read_only=True, data_only=True)
+    try:
+        yield from workbook.active.iter_rows(values_only=True)
+    finally:
+        workbook.close()
+
+def read_statement(stream, filename):
+    """Yield (line_number, raw_row, fields) for every data row of a CSV or XLSX statement"""
+    if filename.lower().endswith(('.xlsx', '.xlsm')):
+        rows = _iter_xlsx(stream)
+    elif filename.lower().endswith(('.csv', '.txt')):
+        rows = _iter_csv(stream)
+    else:
+        raise StatementError('Statement must be a .csv or .xlsx file')
+    
+    headers = next(rows, None)
+    if headers is None:
+        return
+    
+    fields = _normalize_headers(headers)
+    if 'amount' not in fields:
+        raise StatementError('Statement has no amount column')
+    
+    for line_number, row in enumerate(rows, start=2):
+        if not row or all(value in (None, '') for value in row):
+            continue
+        yield line_number, row, {
+            field: value for field, value in zip(fields, row) if field and value not in (None, '')
+        }
+
+def _parse_amount(value):
+    if not isinstance(value, (int, float, Decimal)):
+        value = re.sub(r'[^\d.\-]', '', str(value))
+    return Cents.parse(value)
+
+def _parse_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(text)
+
+def _student_number(fields):
+    """Student number from its own column, or found in the reference or narration text"""
+    number = fields.get('student_number')
+    if number:
+        return str(number).strip().upper()
+    for key in ('reference', 'details'):
+        match = STUDENT_NUMBER_PATTERN.search(str(fields.get(key, '')))
+        if match:
+            return match.group(0).upper()
+    return None
+
+class RejectWriter:
+    """Streams rejected rows, with the reason, to a CSV file"""
+    
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self._file = None
+        self._writer = None
+    
+    def write(self, line_number, row, reason):
+        if self.path is None:
+            self.count += 1
+            return
+        if self._writer is None:
+            self._file = open(self.path, 'w', newline='', encoding='utf-8')
+            self._writer = csv.writer(self._file)
+            self._writer.writerow(['line', 'reason', 'row'])
+        self._writer.writerow([line_number, reason, *['' if v is None else v for v in row]])
+        self.count += 1
+    
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+def _validate(line_number, row, fields, default_fee_type):
+    """Turn a statement row into a pending payment dict, or return the reject reason"""
+    if 'amount' not in fields:
+        return None, 'missing amount'
+    try:
+        amount = _parse_amount(fields['amount'])
+    except ValueError:
+        return None, 'invalid amount'
+    if amount <= 0:
+        return None, 'amount must be greater than 0'
+    
+    try:
+        payment_date = _parse_date(fields['payment_date']) if 'payment_date' in fields else None
+    except ValueError:
+        return None, 'invalid date'
+    if payment_date is None:
+        return None, 'missing date'
+    
+    student_number = _student_number(fields)
+    if not student_number:
+        return None, 'no student number or reference'
+    
+    reference = str(fields['reference']).strip() if 'reference' in fields else None
+    
+    return {
+        'line_number': line_number,
+        'row': row,
+        'student_number': student_number,
+        'amount': amount,
+        'payment_date': payment_date,
+        'reference': reference,
+        'fee_type': str(fields.get('fee_type') or default_fee_type)[:50],
+        'details': fields.get('details'),
+    }, None
+
+def _flush_batch(pending, rejects, payment_method, user_id, dry_run):
+    """Match, insert and post one batch of pending payments in a single transaction"""
+    numbers = {p['student_number'] for p in pending}
+    students = {
+        row.student_number: row for row in db.session.execute(
+            select(Student.id, Student.student_number, Student.grade, Student.balance).where(
+                Student.student_number.in_(numbers),
+                Student.is_active == True
+            ).with_for_update()
+        )
+    }
+    
+    references = {p['reference'] for p in pending if p['reference']}
+    seen_references = set(db.session.execute(
+        select(Payment.transaction_reference).where(Payment.transaction_reference.in_(references))
+    ).scalars()) if references else set()
+    
+    accepted = []
+    for p in pending:
+        student = students.get(p['student_number'])
+        if student is None:
+            rejects.write(p['line_number'], p['row'], f"unmatched student {p['student_number']}")
+            continue
+        if p['reference'] and p['reference'] in seen_references:
+            rejects.write(p['line_number'], p['row'], f"duplicate reference {p['reference']}")
+            continue
+        if p['reference']:
+            seen_references.add(p['reference'])
+        p['student_id'] = student.id
+        p['grade'] = student.grade
+        accepted.append(p)
+    
+    if not accepted:
+        return 0, Cents(0)
+    
+    now = datetime.utcnow()
+    receipt_numbers = set()
+    payment_rows = []
+    for p in accepted:
+        receipt_number = Payment.generate_receipt_number(nbytes=5)
+        while receipt_number in receipt_numbers:
+            receipt_number = Payment.generate_receipt_number(nbytes=5)
+        receipt_numbers.add(receipt_number)
+        payment_rows.append({
+            'student_id': p['student_id'],
+            'amount': p['amount'],
+            'fee_type': p['fee_type'],
+            'payment_method': payment_method,
+            'payment_date': p['payment_date'],
+            'grade': p['grade'],
+            'transaction_reference': p['reference'],
+            'receipt_number': receipt_number,
+            'notes': str(p['details'])[:500] if p['details'] else None,
+            'created_by': user_id,
+            'created_at': now,
+            'updated_at': now,
+        })
+    
+    payment_ids = db.session.execute(
+        insert(Payment).returning(Payment.id, sort_by_parameter_order=True),
+        payment_rows
+    ).scalars().all()
+    
+    # Chain the history rows per student from the locked balance, then move each
+    # balance once by the batch total instead of once per payment
+    balances = {s.id: s.balance or Cents(0) for s in students.values()}
+    totals = {}
+    history_rows = []
+    for p, payment_id in zip(accepted, payment_ids):
+        previous_balance = balances[p['student_id']]
+        new_balance = previous_balance - p['amount']
+        balances[p['student_id']] = new_balance
+        totals[p['student_id']] = totals.get(p['student_id'], Cents(0)) + p['amount']
+        history_rows.append({
+            'student_id': p['student_id'],
+            'previous_balance': previous_balance,
+            'new_balance': new_balance,
+            'change_amount': -p['amount'],
+            'change_type': 'payment',
+            'reference_id': payment_id,
+            'description': f"Payment received: {p['fee_type']}",
+            'created_by': user_id,
+            'created_at': now,
+        })
+    
+    db.session.execute(insert(BalanceHistory), history_rows)
+    
+    rollup.record_payments([
+        (p['payment_date'], p['grade'], payment_method, p['fee_type'], 1, p['amount'])
+        for p in accepted
+    ])
+    db.session.execute(
+        update(Student.__table__).where(Student.__table__.c.id == bindparam('student_id')).values(
+            balance=Student.__table__.c.balance - bindparam('paid'),
+            updated_at=now
+        ),
+        [{'student_id': student_id, 'paid': paid} for student_id, paid in totals.items()]
+    )
+    aging.refresh(totals)
+    
+    if dry_run:
+        db.session.rollback()
+    else:
+        db.session.commit()
+    
+    return len(accepted), sum(totals.values(), Cents(0))
+
+def import_payments(rows, payment_method, fee_type='Tuition', user_id=None, ip_address=None,
+                    rejects_path=None, batch_size=DEFAULT_BATCH_SIZE, dry_run=False, progress=None):
+    """Import statement rows (from read_statement) as payments in batched transactions.
+    
+    Invalid and unmatched rows go to the reject file. A dry run performs every
+    step and then rolls each batch back, so it reports realistic throughput.
+    """
+    started = time.perf_counter()
+    rejects = RejectWriter(rejects_path)
+    total_rows = 0
+    imported = 0
+    imported_amount = Cents(0)
+    batches = 0
+    pending = []
+    
+    try:
+        for line_number, row, fields in rows:
+            total_rows += 1
+            payment, reason = _validate(line_number, row, fields, fee_type)
+            if reason:
+                rejects.write(line_number, row, reason)
+            else:
+                pending.append(payment)
+            
+            if len(pending) >= batch_size:
+                count, amount = _flush_batch(pending, rejects, payment_method, user_id, dry_run)
+                imported += count
+                imported_amount += amount
+                batches += 1
+                pending = []
+                if progress:
+                    progress(total_rows, imported)
+        
+        if pending:
+            count, amount = _flush_batch(pending, rejects, payment_method, user_id, dry_run)
+            imported += count
+            imported_amount += amount
+            batches += 1
+            if progress:
+                progress(total_rows, imported)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        rejects.close()
+    
+    elapsed = time.perf_counter() - started
+    
+    if not dry_run and imported:
+        audit_log.record_now(
+            user_id=user_id,
+            action='import_payments',
+            entity_type='payment',
+            details=f'Imported {imported} {payment_method} payments ({imported_amount:,.2f}), '
+                    f'{rejects.count} rejected',
+            ip_address=ip_address
+        )
+        ledger_stamp.bump()
+    
+    return {
+        'dry_run': dry_run,
+        'rows': total_rows,
+        'imported': imported,
+        'rejected': rejects.count,
+        'amount': float(imported_amount),
+        'batches': batches,
+        'seconds': round(elapsed, 3),
+        'rows_per_second': round(total_rows / elapsed, 1) if elapsed > 0 else None,
+    }
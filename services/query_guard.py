@@ -0,0 +1,53 @@
+from contextlib import contextmanager
+from functools import wraps
+from flask import g, request, current_app, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+class QueryLimitExceeded(AssertionError):
+    """Raised when a request issues more SQL statements than allowed"""
+
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.query_count = g.get('query_count', 0) + 1
+
+@contextmanager
+def uncounted():
+    """Leave the statements run inside out of the request's count (once-per-worker checks)"""
+    count = g.get('query_count', 0) if has_request_context() else None
+    try:
+        yield
+    finally:
+        if count is not None:
+            g.query_count = count
+
+def query_limit(limit):
+    """Override QUERY_COUNT_LIMIT for one view; None disables the check (e.g. batch jobs)"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            return view(*args, **kwargs)
+        wrapper.query_limit = limit
+        return wrapper
+    return decorator
+
+def init_app(app):
+    """Fail requests that exceed QUERY_COUNT_LIMIT statements, to catch N+1 loading in CI"""
+    if not app.config.get('QUERY_COUNT_LIMIT'):
+        return
+    
+    if not event.contains(Engine, 'before_cursor_execute', _count_query):
+        event.listen(Engine, 'before_cursor_execute', _count_query)
+    
+    @app.after_request
+    def check_query_count(response):
+        count = g.get('query_count', 0)
+        view = current_app.view_functions.get(request.endpoint)
+        limit = getattr(view, 'query_limit', current_app.config['QUERY_COUNT_LIMIT'])
+        
+        response.headers['X-Query-Count'] = str(count)
+        if limit is not None and count > limit:
+            raise QueryLimitExceeded(
+                f'{request.method} {request.path} issued {count} SQL statements (limit {limit})'
+            )
+        return response
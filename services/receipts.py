@@ -0,0 +1,167 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from flask import current_app
+from sqlalchemy import select, func
+from extensions import db
+from models.student import Student
+from services import archive
+
+PAGE_TEMPLATE = 'payments/_receipt_page.html'
+BUNDLE_TEMPLATE = 'payments/receipt_bundle.html'
+
+# Below this many receipts the default is to render in-process
+POOL_THRESHOLD = 20000
+
+class ReceiptError(Exception):
+    """Raised when a receipt bundle cannot be produced"""
+
+# Set in each pool worker by _init_worker
+_worker_app = None
+
+def _template_context(app):
+    return {key: app.config[key] for key in ('SCHOOL_NAME', 'SCHOOL_ADDRESS', 'SCHOOL_PHONE', 'CURRENCY')}
+
+def _render_pages(app, payments):
+    template = app.jinja_env.get_template(PAGE_TEMPLATE)
+    context = _template_context(app)
+    return ''.join(template.render(payment=payment, **context) for payment in payments)
+
+def _init_worker():
+    global _worker_app
+    from app import create_app
+    _worker_app = create_app()
+
+def _render_chunk(payments):
+    """Pool worker: render one chunk of receipts to an HTML fragment"""
+    return _render_pages(_worker_app, payments), len(payments)
+
+def _receipt_query(date_from=None, date_to=None, payment_ids=None):
+    # Reprints for a closed academic year read its archive as well
+    payments = archive.payments(date_from, date_to)
+    statement = (
+        select(
+            payments.id, payments.receipt_number, payments.amount, payments.fee_type, payments.payment_method,
+            payments.payment_date, payments.transaction_reference, payments.created_at,
+            Student.full_name, Student.student_number, Student.grade, Student.guardian_contact, Student.balance
+        )
+        .join(Student, payments.student_id == Student.id)
+        .order_by(payments.payment_date, payments.id)
+    )
+    if payment_ids:
+        statement = statement.where(payments.id.in_(payment_ids))
+    if date_from:
+        statement = statement.where(payments.payment_date >= date_from)
+    if date_to:
+        statement = statement.where(payments.payment_date <= date_to)
+    return statement
+
+def iter_payment_chunks(date_from=None, date_to=None, payment_ids=None, chunk_size=100):
+    """Yield lists of plain receipt dicts, fetching payments and students together in one streamed query"""
+    statement = _receipt_query(date_from, date_to, payment_ids).execution_options(yield_per=chunk_size)
+    
+    for partition in db.session.execute(statement).partitions():
+        yield [
+            {
+                'id': row.id,
+                'receipt_number': row.receipt_number,
+                'amount': float(row.amount),
+                'fee_type': row.fee_type,
+                'payment_method': row.payment_method,
+                'payment_date': row.payment_date,
+                'transaction_reference': row.transaction_reference,
+                'created_at': row.created_at,
+                'student': {
+                    'full_name': row.full_name,
+                    'student_number': row.student_number,
+                    'grade': row.grade,
+                    'guardian_contact': row.guardian_contact,
+                    'balance': float(row.balance or 0),
+                },
+            }
+            for row in partition
+        ]
+
+def _rendered_chunks(chunks, workers, stats, progress):
+    """Render chunks in order, keeping at most two chunks per worker in flight"""
+    def record(html, count):
+        stats['pages'] += count
+        if progress:
+            progress(stats['pages'])
+        return html
+    
+    if workers <= 1:
+        app = current_app._get_current_object()
+        for payments in chunks:
+            yield record(_render_pages(app, payments), len(payments))
+        return
+    
+    # spawn, not fork: workers build their own app rather than inheriting open connections
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        pending = deque()
+        for payments in chunks:
+            pending.append(pool.submit(_render_chunk, payments))
+            if len(pending) >= workers * 2:
+                yield record(*pending.popleft().result())
+        while pending:
+            yield record(*pending.popleft().result())
+
+def render_receipt_bundle(output_path, date_from=None, date_to=None, payment_ids=None,
+                          workers=None, chunk_size=100, fmt='html', progress=None):
+    """Render every matching receipt, one per printed page, into a single file on disk.
+    
+    Payments are streamed from the database in chunks and rendered across a
+    process pool; finished chunks are written to the file in order, so memory
+    use stays bounded by the number of chunks in flight.
+    """
+    if fmt not in ('html', 'pdf'):
+        raise ReceiptError(f'Unsupported format: {fmt}')
+    if fmt == 'pdf':
+        try:
+            from weasyprint import HTML
+        except ImportError:
+            raise ReceiptError('PDF output requires the weasyprint package')
+    
+    if workers is None:
+        # Starting a worker costs about a second; small batches render faster in-process
+        total = db.session.execute(
+            select(func.count()).select_from(_receipt_query(date_from, date_to, payment_ids).subquery())
+        ).scalar()
+        workers = (os.cpu_count() or 1) if total >= POOL_THRESHOLD else 1
+    
+    html_path = output_path if fmt == 'html' else f'{output_path}.html'
+    stats = {'pages': 0}
+    title = ' - '.join(str(d) for d in (date_from, date_to) if d) or f'{len(payment_ids or [])} payments'
+    
+    started = time.perf_counter()
+    chunks = iter_payment_chunks(date_from, date_to, payment_ids, chunk_size)
+    bundle = current_app.jinja_env.get_template(BUNDLE_TEMPLATE)
+    with open(os.path.join(current_app.static_folder, 'css', 'style.css'), encoding='utf-8') as f:
+        stylesheet = f.read()
+    
+    with open(html_path, 'w', encoding='utf-8') as out:
+        for piece in bundle.generate(
+            chunks=_rendered_chunks(chunks, workers, stats, progress),
+            stylesheet=stylesheet,
+            title=title,
+            **_template_context(current_app)
+        ):
+            out.write(piece)
+    render_seconds = time.perf_counter() - started
+    
+    if fmt == 'pdf':
+        HTML(filename=html_path).write_pdf(output_path)
+        os.remove(html_path)
+    
+    elapsed = time.perf_counter() - started
+    return {
+        'output': output_path,
+        'format': fmt,
+        'pages': stats['pages'],
+        'workers': workers,
+        'seconds': round(elapsed, 2),
+        'pages_per_second': round(stats['pages'] / render_seconds, 1) if render_seconds else None,
+    }
@@ -0,0 +1,281 @@
+import csv
+import time
+from datetime import datetime
+import numpy as np
+from sqlalchemy import select, func, case, type_coerce, BigInteger
+from extensions import db, ledger_stamp, audit_log
+from models.money import Cents
+from models.student import Student, BalanceHistory
+from models.payment import Payment
+from models.archive import BalanceHistoryArchive
+from services import archive
+
+DEFAULT_CHUNK_SIZE = 500_000
+
+REPORT_FIELDS = [
+    'student_id', 'student_number', 'balance', 'expected_balance', 'drift',
+    'history_rows', 'broken_links', 'payments_without_history', 'payment_amount_mismatches',
+]
+
+def _stream(statement, chunk_size, columns):
+    """Yield the statement's rows as int64 column arrays, chunk_size rows at a time.
+    
+    Rows are read through a raw DBAPI cursor (a named, server-side cursor on
+    PostgreSQL) so that neither the ORM nor the Money type touches each value.
+    """
+    connection = db.engine.raw_connection()
+    try:
+        dialect = db.engine.dialect
+        sql = str(statement.compile(dialect=dialect, compile_kwargs={'literal_binds': True}))
+        if dialect.name == 'postgresql':
+            cursor = connection.dbapi_connection.cursor(name='reconcile_stream')
+            cursor.itersize = chunk_size
+        else:
+            cursor = connection.cursor()
+        cursor.execute(sql)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            block = np.array(rows, dtype=np.int64).reshape(len(rows), columns)
+            yield block.T
+        cursor.close()
+    finally:
+        connection.close()
+
+def _cents(column):
+    # Read the stored integer directly, skipping Money's per-value conversion
+    return type_coerce(column, BigInteger)
+
+def _carried(student_ids=None):
+    """Each student's balance at the end of their archived history: first archived previous_balance plus archived changes"""
+    archived = select(
+        BalanceHistoryArchive.student_id,
+        func.min(BalanceHistoryArchive.id).label('first_id'),
+        func.sum(_cents(BalanceHistoryArchive.change_amount)).label('change')
+    )
+    if student_ids is not None:
+        archived = archived.where(BalanceHistoryArchive.student_id.in_(student_ids))
+    archived = archived.group_by(BalanceHistoryArchive.student_id).subquery()
+    return select(archived.c.student_id, _cents(BalanceHistoryArchive.previous_balance) + archived.c.change).join(
+        archived, BalanceHistoryArchive.id == archived.c.first_id
+    )
+
+def reconcile(chunk_size=DEFAULT_CHUNK_SIZE):
+    """Recompute every balance from balance_history and payments; returns the totals and discrepancies.
+    
+    balance_history is streamed in (student_id, id) order and reduced chunk by
+    chunk: each student's expected balance is the first row's previous_balance
+    plus the sum of change_amount, and a link is broken where a row's
+    previous_balance differs from the student's prior new_balance. Every
+    payment must also have a 'payment' history row (reference_id = payment id)
+    for exactly -amount. Once academic years are archived, each student's
+    ledger carries on from the balance its archived rows add up to: that is
+    the expected balance of students without live history, and their first
+    live row must link to it. Payments written before the last closed year
+    ended are skipped, as their history may be archived. Memory grows with
+    the number of students and payments, not with the size of balance_history.
+    """
+    started = time.perf_counter()
+    # Arrays are indexed by student id; orphaned rows may point past the last student
+    size = max(
+        db.session.execute(select(func.max(column))).scalar() or 0
+        for column in (Student.id, BalanceHistory.student_id, Payment.student_id)
+    ) + 1
+    
+    opening = np.zeros(size, dtype=np.int64)
+    changes = np.zeros(size, dtype=np.int64)
+    rows = np.zeros(size, dtype=np.int64)
+    broken = np.zeros(size, dtype=np.int64)
+    reference_ids, reference_amounts = [], []
+    last_student, last_balance = -1, 0
+    history_rows = 0
+    
+    history = (
+        select(
+            BalanceHistory.student_id,
+            _cents(BalanceHistory.previous_balance),
+            _cents(BalanceHistory.new_balance),
+            _cents(BalanceHistory.change_amount),
+            case((BalanceHistory.change_type == 'payment', func.coalesce(BalanceHistory.reference_id, -1)), else_=-1)
+        )
+        .order_by(BalanceHistory.student_id, BalanceHistory.id)
+    )
+    for student, previous, new, change, reference in _stream(history, chunk_size, 5):
+        history_rows += len(student)
+        
+        # Row i starts a student's run when its student differs from row i-1 (or the last chunk's)
+        prior_student = np.concatenate(([last_student], student[:-1]))
+        prior_balance = np.concatenate(([last_balance], new[:-1]))
+        starts = student != prior_student
+        broken_at = ~starts & (previous != prior_balance)
+        
+        groups = np.flatnonzero(np.concatenate(([True], starts[1:])))
+        ids = student[groups]
+        changes[ids] += np.add.reduceat(change, groups)
+        rows[ids] += np.diff(np.append(groups, len(student)))
+        broken[ids] += np.add.reduceat(broken_at.astype(np.int64), groups)
+        opening[student[starts]] = previous[starts]
+        
+        payments = reference >= 0
+        reference_ids.append(reference[payments])
+        reference_amounts.append(-change[payments])
+        last_student, last_balance = student[-1], new[-1]
+    
+    hot_start = archive.hot_start()
+    archived = np.zeros(size, dtype=bool)
+    if hot_start:
+        carried = np.zeros(size, dtype=np.int64)
+        for student, new in _stream(_carried(), chunk_size, 2):
+            carried[student] = new
+            archived[student] = True
+        broken += archived & (rows > 0) & (opening != carried)
+        opening = np.where(archived & (rows == 0), carried, opening)
+    ledger = (rows > 0) | archived
+    
+    reference_ids = np.concatenate(reference_ids) if reference_ids else np.empty(0, dtype=np.int64)
+    reference_amounts = np.concatenate(reference_amounts) if reference_amounts else np.empty(0, dtype=np.int64)
+    order = np.argsort(reference_ids, kind='stable')
+    reference_ids, reference_amounts = reference_ids[order], reference_amounts[order]
+    
+    unrecorded = np.zeros(size, dtype=np.int64)
+    mismatched = np.zeros(size, dtype=np.int64)
+    payment_rows = 0
+    payments = select(Payment.id, Payment.student_id, _cents(Payment.amount))
+    if hot_start:
+        payments = payments.where(Payment.created_at >= datetime.combine(hot_start, datetime.min.time()))
+    for payment_id, student, amount in _stream(payments, chunk_size, 3):
+        payment_rows += len(payment_id)
+        position = np.searchsorted(reference_ids, payment_id)
+        found = position < len(reference_ids)
+        found[found] = reference_ids[position[found]] == payment_id[found]
+        np.add.at(unrecorded, student[~found], 1)
+        wrong = found.copy()
+        wrong[found] = reference_amounts[position[found]] != amount[found]
+        np.add.at(mismatched, student[wrong], 1)
+    
+    expected = opening + changes
+    balances = np.zeros(size, dtype=np.int64)
+    known = np.zeros(size, dtype=bool)
+    for student, balance in _stream(select(Student.id, _cents(func.coalesce(Student.balance, 0))), chunk_size, 2):
+        balances[student] = balance
+        known[student] = True
+    
+    # Students without history have nothing to drift from
+    drift = np.where(ledger, balances - expected, 0)
+    flagged = np.flatnonzero(known & ((drift != 0) | (broken > 0) | (unrecorded > 0) | (mismatched > 0)))
+    
+    numbers = {}
+    for offset in range(0, len(flagged), 1000):
+        batch = flagged[offset:offset + 1000].tolist()
+        numbers.update(db.session.execute(
+            select(Student.id, Student.student_number).where(Student.id.in_(batch))
+        ).all())
+    
+    discrepancies = [{
+        'student_id': int(i),
+        'student_number': numbers.get(int(i)),
+        'balance': Cents(int(balances[i])),
+        'expected_balance': Cents(int(expected[i])) if ledger[i] else None,
+        'drift': Cents(int(drift[i])),
+        'history_rows': int(rows[i]),
+        'broken_links': int(broken[i]),
+        'payments_without_history': int(unrecorded[i]),
+        'payment_amount_mismatches': int(mismatched[i]),
+    } for i in flagged]
+    
+    return {
+        'students': int(known.sum()),
+        'history_rows': history_rows,
+        'payments': payment_rows,
+        'students_with_drift': int(np.count_nonzero(drift[known])),
+        'total_drift': Cents(int(drift[known].sum())),
+        'broken_links': int(broken.sum()),
+        'payments_without_history': int(unrecorded.sum()),
+        'payment_amount_mismatches': int(mismatched.sum()),
+        'seconds': round(time.perf_counter() - started, 2),
+        'discrepancies': discrepancies,
+    }
+
+def write_report(discrepancies, path):
+    """Write discrepancies as CSV with amounts in major units"""
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=REPORT_FIELDS)
+        writer.writeheader()
+        for row in discrepancies:
+            writer.writerow({
+                key: str(value) if isinstance(value, Cents) else value
+                for key, value in row.items()
+            })
+
+def repair(discrepancies, created_by=None, batch_size=500):
+    """Record an 'adjustment' history row for each drifting student so the ledger sums to the balance.
+    
+    The balance is what families have been shown and receipts were issued
+    against, so it is kept; the adjustment explains the difference. Each
+    batch locks its students and recomputes their expected balance in SQL,
+    so a payment posted since reconcile() ran is not mistaken for drift.
+    Broken links and payments without history are reported, not repaired.
+    Returns (students adjusted, net adjustment).
+    """
+    student_ids = [row['student_id'] for row in discrepancies if row['drift']]
+    adjusted = 0
+    net = Cents(0)
+    
+    for offset in range(0, len(student_ids), batch_size):
+        batch = student_ids[offset:offset + batch_size]
+        balances = dict(db.session.execute(
+            select(Student.id, func.coalesce(Student.balance, 0))
+            .where(Student.id.in_(batch))
+            .with_for_update()
+        ).all())
+        
+        first = (
+            select(BalanceHistory.student_id, func.min(BalanceHistory.id).label('first_id'))
+            .where(BalanceHistory.student_id.in_(batch))
+            .group_by(BalanceHistory.student_id)
+            .subquery()
+        )
+        openings = dict(db.session.execute(
+            select(BalanceHistory.student_id, BalanceHistory.previous_balance)
+            .join(first, BalanceHistory.id == first.c.first_id)
+        ).all())
+        if archive.hot_start():
+            # Students whose whole history is archived carry on from what it adds up to
+            for student_id, carried in db.session.execute(_carried(batch)).all():
+                openings.setdefault(student_id, Cents(carried))
+        totals = dict(db.session.execute(
+            select(BalanceHistory.student_id, func.sum(BalanceHistory.change_amount))
+            .where(BalanceHistory.student_id.in_(batch))
+            .group_by(BalanceHistory.student_id)
+        ).all())
+        
+        for student_id, balance in balances.items():
+            if student_id not in openings:
+                continue
+            expected = openings[student_id] + totals.get(student_id, 0)
+            difference = balance - expected
+            if not difference:
+                continue
+            db.session.add(BalanceHistory(
+                student_id=student_id,
+                previous_balance=expected,
+                new_balance=balance,
+                change_amount=difference,
+                change_type='adjustment',
+                description='Reconciliation: ledger brought into line with balance',
+                created_by=created_by
+            ))
+            adjusted += 1
+            net += difference
+        db.session.commit()
+    
+    if adjusted:
+        audit_log.record_now(
+            user_id=created_by,
+            action='reconcile_balances',
+            entity_type='student',
+            details=f'Reconciliation adjusted the ledger of {adjusted} students, net {net:,.2f}'
+        )
+        ledger_stamp.bump()
+    return adjusted, net
@@ -0,0 +1,122 @@
+from datetime import date
+from sqlalchemy import select, insert, update, delete, func, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
+from extensions import db
+from models.rollup import PaymentDailyRollup
+from services import archive
+
+KEY_COLUMNS = ('payment_date', 'grade', 'payment_method', 'fee_type')
+
+def ensure_schema():
+    """Add payments.grade to databases that predate it, filled in from each student's current grade.
+    
+    Payments taken before the column existed are attributed to the grade the
+    student is in now, which is the best that can be recovered.
+    """
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in ('payments', 'payments_archive'):
+            if not inspector.has_table(table):
+                continue
+            if 'grade' in {c['name'] for c in inspector.get_columns(table)}:
+                continue
+            conn.execute(text(f'ALTER TABLE {table} ADD COLUMN grade VARCHAR(10)'))
+            conn.execute(text(
+                f'UPDATE {table} SET grade = (SELECT grade FROM students WHERE students.id = {table}.student_id)'
+            ))
+
+def record_payments(entries):
+    """Add payments to the daily rollup inside the caller's transaction.
+    
+    entries are (payment_date, grade, payment_method, fee_type, count, amount)
+    tuples; deletions pass a negative count and amount.
+    """
+    deltas = {}
+    for payment_date, grade, payment_method, fee_type, count, amount in entries:
+        key = (payment_date, grade, payment_method, fee_type)
+        previous_count, previous_amount = deltas.get(key, (0, 0))
+        deltas[key] = (previous_count + count, previous_amount + amount)
+    
+    if not deltas:
+        return
+    
+    rows = [
+        dict(zip(KEY_COLUMNS, key), payment_count=count, total_amount=amount)
+        for key, (count, amount) in deltas.items()
+    ]
+    
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('postgresql', 'sqlite'):
+        upsert = (postgresql.insert if dialect == 'postgresql' else sqlite.insert)(PaymentDailyRollup)
+        upsert = upsert.on_conflict_do_update(
+            index_elements=list(KEY_COLUMNS),
+            set_={
+                'payment_count': PaymentDailyRollup.payment_count + upsert.excluded.payment_count,
+                'total_amount': PaymentDailyRollup.total_amount + upsert.excluded.total_amount
+            }
+        )
+        db.session.execute(upsert, rows)
+    else:
+        for row in rows:
+            result = db.session.execute(
+                update(PaymentDailyRollup).where(
+                    *[getattr(PaymentDailyRollup, c) == row[c] for c in KEY_COLUMNS]
+                ).values(
+                    payment_count=PaymentDailyRollup.payment_count + row['payment_count'],
+                    total_amount=PaymentDailyRollup.total_amount + row['total_amount']
+                )
+            )
+            if result.rowcount == 0:
+                db.session.execute(insert(PaymentDailyRollup), [row])
+    
+    if any(row['payment_count'] < 0 for row in rows):
+        db.session.execute(
+            delete(PaymentDailyRollup).where(
+                PaymentDailyRollup.payment_date.in_({row['payment_date'] for row in rows}),
+                PaymentDailyRollup.payment_count <= 0
+            )
+        )
+
+def record_payment(payment, sign=1):
+    """Add (sign=1) or remove (sign=-1) a single payment from the rollup, under the grade it was taken in"""
+    record_payments([(payment.payment_date, payment.grade, payment.payment_method, payment.fee_type,
+                      sign, sign * payment.amount)])
+
+def rebuild(date_from=None, date_to=None):
+    """Recompute rollup rows for a date range (or everything) from payments, including archived years"""
+    # The rollup keeps closed years, so rebuild them from the archive rather than clearing them
+    payments = archive.payments(date_from or date.min, date_to)
+    clear = delete(PaymentDailyRollup)
+    source = select(
+        payments.payment_date,
+        payments.grade,
+        payments.payment_method,
+        payments.fee_type,
+        func.count(payments.id),
+        func.sum(payments.amount)
+    )
+    
+    if date_from:
+        clear = clear.where(PaymentDailyRollup.payment_date >= date_from)
+        source = source.where(payments.payment_date >= date_from)
+    if date_to:
+        clear = clear.where(PaymentDailyRollup.payment_date <= date_to)
+        source = source.where(payments.payment_date <= date_to)
+    
+    source = source.group_by(payments.payment_date, payments.grade, payments.payment_method, payments.fee_type)
+    
+    db.session.execute(clear)
+    result = db.session.execute(
+        insert(PaymentDailyRollup).from_select(list(KEY_COLUMNS) + ['payment_count', 'total_amount'], source)
+    )
+    db.session.commit()
+    return result.rowcount
+
+def rollup_query(*columns, date_from=None, date_to=None):
+    """Select aggregates from the rollup, optionally limited to a date range"""
+    query = db.session.query(*columns)
+    if date_from:
+        query = query.filter(PaymentDailyRollup.payment_date >= date_from)
+    if date_to:
+        query = query.filter(PaymentDailyRollup.payment_date <= date_to)
+    return query
@@ -0,0 +1,265 @@
+from sqlalchemy import event, text, select, or_, func, table, column
+from sqlalchemy.orm import joinedload
+from extensions import db
+from models.student import Student
+from models.payment import Payment
+
+# pg_trgm's default similarity threshold; fuzzy matches below it are dropped
+SIMILARITY_THRESHOLD = 0.3
+
+# SQLite: external-content FTS5 tables with the trigram tokenizer (substring
+# matching, case-insensitive), kept in sync with the base tables by triggers so
+# ORM writes and bulk Core inserts are both indexed.
+SQLITE_DDL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS student_search USING fts5(
+        full_name, student_number, guardian_contact,
+        content='students', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS student_search_ai AFTER INSERT ON students BEGIN
+        INSERT INTO student_search(rowid, full_name, student_number, guardian_contact)
+        VALUES (new.id, new.full_name, new.student_number, new.guardian_contact);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS student_search_ad AFTER DELETE ON students BEGIN
+        INSERT INTO student_search(student_search, rowid, full_name, student_number, guardian_contact)
+        VALUES ('delete', old.id, old.full_name, old.student_number, old.guardian_contact);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS student_search_au
+        AFTER UPDATE OF full_name, student_number, guardian_contact ON students BEGIN
+        INSERT INTO student_search(student_search, rowid, full_name, student_number, guardian_contact)
+        VALUES ('delete', old.id, old.full_name, old.student_number, old.guardian_contact);
+        INSERT INTO student_search(rowid, full_name, student_number, guardian_contact)
+        VALUES (new.id, new.full_name, new.student_number, new.guardian_contact);
+    END""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS payment_search USING fts5(
+        receipt_number, transaction_reference,
+        content='payments', content_rowid='id', tokenize='trigram')""",
+    """CREATE TRIGGER IF NOT EXISTS payment_search_ai AFTER INSERT ON payments BEGIN
+        INSERT INTO payment_search(rowid, receipt_number, transaction_reference)
+        VALUES (new.id, new.receipt_number, new.transaction_reference);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS payment_search_ad AFTER DELETE ON payments BEGIN
+        INSERT INTO payment_search(payment_search, rowid, receipt_number, transaction_reference)
+        VALUES ('delete', old.id, old.receipt_number, old.transaction_reference);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS payment_search_au
+        AFTER UPDATE OF receipt_number, transaction_reference ON payments BEGIN
+        INSERT INTO payment_search(payment_search, rowid, receipt_number, transaction_reference)
+        VALUES ('delete', old.id, old.receipt_number, old.transaction_reference);
+        INSERT INTO payment_search(rowid, receipt_number, transaction_reference)
+        VALUES (new.id, new.receipt_number, new.transaction_reference);
+    END""",
+]
+
+# The FTS tables as selectable tables, so the index can be joined to the filtered base table
+STUDENT_SEARCH = table('student_search', column('rowid'), column('rank'), column('student_search'))
+PAYMENT_SEARCH = table('payment_search', column('rowid'), column('rank'), column('payment_search'))
+
+SQLITE_REBUILD = [
+    "INSERT INTO student_search(student_search) VALUES ('rebuild')",
+    "INSERT INTO payment_search(payment_search) VALUES ('rebuild')",
+]
+
+# PostgreSQL: trigram GIN indexes serve both ILIKE '%term%' and the % similarity
+# operator, and are maintained by PostgreSQL itself.
+POSTGRES_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS ix_students_full_name_trgm ON students USING gin (full_name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_students_student_number_trgm ON students USING gin (student_number gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_students_guardian_contact_trgm ON students USING gin (guardian_contact gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_payments_receipt_number_trgm ON payments USING gin (receipt_number gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS ix_payments_transaction_reference_trgm ON payments USING gin (transaction_reference gin_trgm_ops)",
+]
+
+def create_search_index(connection, rebuild=False):
+    """Create the search structures for the connection's dialect (idempotent)"""
+    dialect = connection.dialect.name
+    if dialect == 'sqlite':
+        statements = SQLITE_DDL + (SQLITE_REBUILD if rebuild else [])
+    elif dialect == 'postgresql':
+        statements = POSTGRES_DDL
+    else:
+        return False
+    for statement in statements:
+        connection.execute(text(statement))
+    return True
+
+@event.listens_for(db.metadata, 'after_create')
+def _create_after_tables(target, connection, **kw):
+    create_search_index(connection)
+
+def _trigrams(value):
+    value = f'  {value.lower()} '
+    return {value[i:i + 3] for i in range(len(value) - 2)}
+
+def similarity(term, *values):
+    """Best trigram similarity between term and any value, or any word of a value"""
+    wanted = _trigrams(term)
+    best = 0.0
+    for value in values:
+        if not value:
+            continue
+        for candidate in [value, *value.split()]:
+            found = _trigrams(candidate)
+            best = max(best, len(wanted & found) / len(wanted | found))
+    return best
+
+def _fts_phrase(term):
+    return '"' + term.replace('"', '""') + '"'
+
+def _fts_any_trigram(term):
+    term = term.lower()
+    grams = {term[i:i + 3] for i in range(len(term) - 2)}
+    return ' OR '.join(_fts_phrase(g) for g in sorted(grams))
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+def _rank(term, items, fields, exact_ids):
+    """Order candidates: substring hits first (prefix hits before others), then by similarity"""
+    lowered = term.lower()
+    ranked = []
+    for item in items:
+        values = [getattr(item, f) for f in fields]
+        score = similarity(term, *values)
+        if item.id in exact_ids:
+            prefix = any(v and v.lower().startswith(lowered) for v in values)
+            score += 2.0 if prefix else 1.0
+        elif score < SIMILARITY_THRESHOLD:
+            continue
+        ranked.append((item, round(score, 4)))
+    ranked.sort(key=lambda pair: -pair[1])
+    return ranked
+
+STUDENT_FIELDS = ('full_name', 'student_number', 'guardian_contact')
+PAYMENT_FIELDS = ('receipt_number', 'transaction_reference')
+
+# Matches ranked for the paged list views; their pages walk through these by (score, id)
+MAX_RESULTS = 200
+
+# Most students a payment search matches by name before it stops looking for more of their payments
+MAX_STUDENT_BATCH = 3200
+
+def best_first(result):
+    """Sort key and cursor for a (student, score) match: highest score first, then by id"""
+    student, score = result
+    return (-score, student.id)
+
+def best_then_newest(result):
+    """Sort key and cursor for a (payment, score) match: highest score first, then newest"""
+    payment, score = result
+    return (-score, -payment.id)
+
+def _contains(term, values):
+    """Whether term is a substring (a prefix, for short terms) of any value, as the index matches it"""
+    lowered = term.lower()
+    if len(term) >= 3:
+        return any(v and lowered in v.lower() for v in values)
+    return any(v and v.lower().startswith(lowered) for v in values)
+
+def _student_candidates(term, limit, where=()):
+    """(exact ids, candidate ids) of students matching term and the where clauses, via the search index.
+    
+    The filters run inside the index query, so the limit counts only students that pass them.
+    """
+    dialect = _dialect()
+    
+    if dialect == 'sqlite' and len(term) >= 3:
+        def matching(query, limit):
+            return db.session.execute(
+                select(STUDENT_SEARCH.c.rowid)
+                .join(Student, Student.id == STUDENT_SEARCH.c.rowid)
+                .where(STUDENT_SEARCH.c.student_search.op('MATCH')(query), *where)
+                .order_by(STUDENT_SEARCH.c.rank)
+                .limit(limit)
+            ).scalars().all()
+        
+        exact = matching(_fts_phrase(term), limit)
+        fuzzy = []
+        if len(exact) < limit and len(term) >= 4:
+            fuzzy = matching(_fts_any_trigram(term), limit * 4)
+        return set(exact), list(dict.fromkeys(exact + fuzzy))
+    
+    pattern = f'%{term}%' if len(term) >= 3 else f'{term}%'
+    substring = or_(*[getattr(Student, f).ilike(pattern) for f in STUDENT_FIELDS])
+    
+    if dialect == 'postgresql' and len(term) >= 3:
+        query = select(Student.id, substring.label('exact')).where(
+            or_(substring, Student.full_name.op('%')(term)), *where
+        ).order_by(
+            substring.desc(), func.similarity(Student.full_name, term).desc()
+        ).limit(limit * 2)
+        rows = db.session.execute(query).all()
+        return {r.id for r in rows if r.exact}, [r.id for r in rows]
+    
+    # Short terms (and other databases): prefix match on the indexed columns
+    ids = db.session.execute(select(Student.id).where(substring, *where).limit(limit)).scalars().all()
+    return set(ids), ids
+
+def search_students(term, limit=50, grade=None, active_only=True):
+    """Ranked (student, score) matches for a name, student number or contact"""
+    term = (term or '').strip()
+    if not term:
+        return []
+    
+    where = []
+    if active_only:
+        where.append(Student.is_active == True)
+    if grade:
+        where.append(Student.grade == grade)
+    
+    exact_ids, candidate_ids = _student_candidates(term, limit, where)
+    if not candidate_ids:
+        return []
+    
+    students = Student.query.filter(Student.id.in_(candidate_ids)).all()
+    return _rank(term, students, STUDENT_FIELDS, exact_ids)[:limit]
+
+def _payment_match(term):
+    """Condition for payments whose receipt number or transaction reference contains term"""
+    if _dialect() == 'sqlite' and len(term) >= 3:
+        return Payment.id.in_(
+            select(PAYMENT_SEARCH.c.rowid).where(PAYMENT_SEARCH.c.payment_search.op('MATCH')(_fts_phrase(term)))
+        )
+    
+    pattern = f'%{term}%' if len(term) >= 3 else f'{term}%'
+    return or_(*[getattr(Payment, f).ilike(pattern) for f in PAYMENT_FIELDS])
+
+def search_payments(term, limit=50, query=None):
+    """Ranked (payment, score) matches by receipt number, reference or student name.
+    
+    query is an optional pre-filtered Payment query (method, dates, ...) that
+    loads Payment.student. Receipt and reference matches are found inside it.
+    Name matches are looked up a batch of students at a time, growing the
+    batch until enough of their payments pass the filters.
+    """
+    term = (term or '').strip()
+    if not term:
+        return []
+    
+    query = query if query is not None else Payment.query.options(joinedload(Payment.student))
+    direct = _payment_match(term)
+    
+    batch = limit
+    while True:
+        exact_ids, student_ids = _student_candidates(term, batch)
+        matches = query.filter(or_(direct, Payment.student_id.in_(student_ids))).order_by(
+            Payment.payment_date.desc(), Payment.id.desc()
+        ).limit(limit * 2).all()
+        if len(matches) >= limit or len(student_ids) < batch or batch >= MAX_STUDENT_BATCH:
+            break
+        batch *= 4
+    
+    student_scores = dict(_rank(term, {p.student for p in matches}, STUDENT_FIELDS, exact_ids))
+    ranked = []
+    for payment in matches:
+        values = [getattr(payment, f) for f in PAYMENT_FIELDS]
+        if _contains(term, values):
+            score = 2.0 + similarity(term, *values)
+        else:
+            score = student_scores.get(payment.student)
+            if score is None:
+                continue
+        ranked.append((payment, round(score, 4)))
+    
+    # Stable sort keeps newest-first within equal scores
+    ranked.sort(key=lambda pair: -pair[1])
+    return ranked[:limit]
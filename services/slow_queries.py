@@ -0,0 +1,250 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import time
+from datetime import datetime
+from flask import request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+logger = logging.getLogger(__name__)
+
+MAX_STATEMENT_LENGTH = 4000
+MAX_PARAMETER_LENGTH = 200
+
+_COMMENTS = re.compile(r'--[^\n]*|/\*.*?\*/', re.S)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r'\b\d+(?:\.\d+)?\b')
+_PLACEHOLDERS = re.compile(r'%\(\w+\)s|%s|:\w+|\?|\$\d+|__\[POSTCOMPILE_\w+\]')
+_LISTS = re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)')
+_WHITESPACE = re.compile(r'\s+')
+# Parameters bound for these tables (password hashes, usernames) are logged by type only
+_REDACTED_TABLES = re.compile(r'\b(?:from|into|update|join)\s+"?users"?\b', re.I)
+
+def fingerprint(statement):
+    """(hash, normalized text) of a statement with literals, placeholders and IN-list lengths removed"""
+    normalized = _COMMENTS.sub(' ', statement)
+    normalized = _STRINGS.sub('?', normalized)
+    normalized = _PLACEHOLDERS.sub('?', normalized)
+    normalized = _NUMBERS.sub('?', normalized)
+    normalized = _LISTS.sub('(?+)', normalized)
+    normalized = _WHITESPACE.sub(' ', normalized).strip().lower()
+    return hashlib.sha1(normalized.encode()).hexdigest()[:12], normalized
+
+def _parameters(parameters, convert):
+    if isinstance(parameters, dict):
+        return {key: convert(value) for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [convert(value) for value in parameters]
+    return convert(parameters)
+
+def _parameter(value):
+    if value is None or isinstance(value, (bool, int, float)):
+        return value
+    text = str(value)
+    return text if len(text) <= MAX_PARAMETER_LENGTH else text[:MAX_PARAMETER_LENGTH] + '...'
+
+def _redacted(value):
+    return None if value is None else f'<{type(value).__name__}>'
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._slow_query_started = time.perf_counter()
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_slow_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    from extensions import slow_query_log
+    if elapsed >= slow_query_log.threshold:
+        slow_query_log.capture(conn, cursor, statement, parameters, executemany, elapsed)
+
+class SlowQueryLog:
+    """Writes every SQL statement slower than SLOW_QUERY_MS, with its plan, to a rotating log.
+    
+    The plan is captured on the statement's own connection: EXPLAIN QUERY PLAN
+    on SQLite, EXPLAIN on PostgreSQL, and EXPLAIN (ANALYZE, BUFFERS) for a
+    SLOW_QUERY_ANALYZE_RATE sample of SELECTs there, since ANALYZE runs the
+    query again. Each worker explains a fingerprint at most once per
+    SLOW_QUERY_EXPLAIN_INTERVAL seconds. All workers append to the same file,
+    which is rotated under a file lock once it exceeds SLOW_QUERY_LOG_MAX_BYTES.
+    """
+    
+    def __init__(self):
+        self.threshold = float('inf')
+        self.path = None
+        self.max_bytes = 5 * 1024 * 1024
+        self.backups = 5
+        self.explain_interval = 300
+        self.analyze_rate = 0.1
+        self._explained = {}
+    
+    def init_app(self, app):
+        threshold_ms = app.config.get('SLOW_QUERY_MS')
+        directory = app.config.get('SLOW_QUERY_LOG_DIR') or os.path.join(app.instance_path, 'logs')
+        self.path = os.path.join(directory, 'slow_queries.log')
+        self.max_bytes = app.config.get('SLOW_QUERY_LOG_MAX_BYTES', 5 * 1024 * 1024)
+        self.backups = app.config.get('SLOW_QUERY_LOG_BACKUPS', 5)
+        self.explain_interval = app.config.get('SLOW_QUERY_EXPLAIN_INTERVAL', 300)
+        self.analyze_rate = app.config.get('SLOW_QUERY_ANALYZE_RATE', 0.1)
+        if not threshold_ms:
+            self.threshold = float('inf')
+            return
+        self.threshold = threshold_ms / 1000
+        os.makedirs(directory, exist_ok=True)
+        
+        if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+    
+    def capture(self, conn, cursor, statement, parameters, executemany, elapsed):
+        digest, normalized = fingerprint(statement)
+        entry = {
+            'at': datetime.utcnow().isoformat(timespec='seconds'),
+            'pid': os.getpid(),
+            'ms': round(elapsed * 1000, 1),
+            'fingerprint': digest,
+            'normalized': normalized[:MAX_STATEMENT_LENGTH],
+            'statement': statement[:MAX_STATEMENT_LENGTH],
+            'parameters': None if executemany else _parameters(
+                parameters, _redacted if _REDACTED_TABLES.search(statement) else _parameter
+            ),
+            'executemany': executemany,
+            'rows': cursor.rowcount if cursor.rowcount >= 0 else None,
+            'route': None,
+            'plan': None,
+        }
+        if has_request_context():
+            entry['route'] = f'{request.method} {request.endpoint or request.path}'
+        
+        now = time.monotonic()
+        if not executemany and now - self._explained.get(digest, -self.explain_interval) >= self.explain_interval:
+            self._explained[digest] = now
+            entry['plan'], entry['analyzed'] = self._explain(conn, statement, parameters)
+        self._write(entry)
+    
+    def _explain(self, conn, statement, parameters):
+        verb = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else ''
+        if verb not in ('SELECT', 'WITH', 'UPDATE', 'DELETE', 'INSERT'):
+            return None, False
+        
+        dialect = conn.dialect.name
+        analyze = dialect == 'postgresql' and verb == 'SELECT' and random.random() < self.analyze_rate
+        if dialect == 'sqlite':
+            prefix = 'EXPLAIN QUERY PLAN '
+        elif dialect == 'postgresql':
+            prefix = 'EXPLAIN (ANALYZE, BUFFERS) ' if analyze else 'EXPLAIN '
+        else:
+            prefix = 'EXPLAIN '
+        
+        # A raw DBAPI cursor on the same connection: same transaction, no SQLAlchemy events
+        raw = conn.connection.dbapi_connection.cursor()
+        savepoint = dialect == 'postgresql'
+        try:
+            if savepoint:
+                # A failed EXPLAIN must not abort the caller's transaction
+                raw.execute('SAVEPOINT slow_query_explain')
+            try:
+                raw.execute(prefix + statement, parameters)
+                rows = raw.fetchall()
+            except Exception as e:
+                if savepoint:
+                    raw.execute('ROLLBACK TO SAVEPOINT slow_query_explain')
+                return f'EXPLAIN failed: {e}', False
+            if savepoint:
+                raw.execute('RELEASE SAVEPOINT slow_query_explain')
+        except Exception:
+            logger.exception('Could not explain slow query')
+            return None, False
+        finally:
+            raw.close()
+        
+        if dialect == 'sqlite':
+            # (id, parent, notused, detail): indent each step under its parent
+            depth = {0: -1}
+            lines = []
+            for row in rows:
+                depth[row[0]] = depth.get(row[1], -1) + 1
+                lines.append('  ' * depth[row[0]] + str(row[3]))
+            return '\n'.join(lines), False
+        return '\n'.join(str(row[0]) for row in rows), analyze
+    
+    def _write(self, entry):
+        line = json.dumps(entry, default=str) + '\n'
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                self._rotate()
+            # O_APPEND keeps concurrent workers' lines whole
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        except OSError:
+            logger.exception('Could not write to %s', self.path)
+    
+    def _rotate(self):
+        with open(f'{self.path}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # Another worker may have rotated while this one waited for the lock
+            if not os.path.exists(self.path) or os.path.getsize(self.path) < self.max_bytes:
+                return
+            for n in range(self.backups - 1, 0, -1):
+                if os.path.exists(f'{self.path}.{n}'):
+                    os.replace(f'{self.path}.{n}', f'{self.path}.{n + 1}')
+            if self.backups:
+                os.replace(self.path, f'{self.path}.1')
+            else:
+                os.remove(self.path)
+    
+    def entries(self):
+        """Every logged entry, oldest file first"""
+        paths = [f'{self.path}.{n}' for n in range(self.backups, 0, -1)] + [self.path]
+        for path in paths:
+            try:
+                with open(path, encoding='utf-8') as f:
+                    for line in f:
+                        try:
+                            yield json.loads(line)
+                        except ValueError:
+                            continue
+            except (OSError, TypeError):
+                continue
+    
+    def summary(self, limit=100):
+        """Entries grouped by fingerprint, worst total time first, with the latest plan of each"""
+        groups = {}
+        for entry in self.entries():
+            group = groups.get(entry['fingerprint'])
+            if group is None:
+                group = groups[entry['fingerprint']] = {
+                    'fingerprint': entry['fingerprint'],
+                    'normalized': entry['normalized'],
+                    'count': 0,
+                    'total_ms': 0.0,
+                    'max_ms': 0.0,
+                    'routes': {},
+                    'plan': None,
+                    'analyzed': False,
+                }
+            group['count'] += 1
+            group['total_ms'] += entry['ms']
+            group['last_seen'] = entry['at']
+            if entry['ms'] >= group['max_ms']:
+                group['max_ms'] = entry['ms']
+                group['example'] = entry['statement']
+                group['parameters'] = entry['parameters']
+            if entry['route']:
+                group['routes'][entry['route']] = group['routes'].get(entry['route'], 0) + 1
+            if entry.get('plan'):
+                group['plan'] = entry['plan']
+                group['analyzed'] = entry.get('analyzed', False)
+        
+        result = sorted(groups.values(), key=lambda g: g['total_ms'], reverse=True)[:limit]
+        for group in result:
+            group['avg_ms'] = round(group['total_ms'] / group['count'], 1)
+            group['total_ms'] = round(group['total_ms'], 1)
+            group['routes'] = sorted(group['routes'].items(), key=lambda item: item[1], reverse=True)
+        return result
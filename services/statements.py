@@ -0,0 +1,175 @@
+import csv
+import io
+from datetime import datetime, time, timedelta
+from flask import Response, stream_with_context
+from sqlalchemy import select, func, and_, tuple_, literal, type_coerce
+from extensions import db
+from models.money import Money
+from models.payment import Payment
+from models.archive import PaymentArchive
+from services import archive
+from services.checkpoints import balance_as_of
+from services.pagination import encode_cursor, decode_cursor
+
+CSV_HEADER = ['Date', 'Type', 'Description', 'Reference', 'Amount', 'Balance']
+
+def _key(history):
+    return (history.created_at, history.id)
+
+def _range(statement, history, date_from=None, date_to=None):
+    if date_from:
+        statement = statement.where(history.created_at >= datetime.combine(date_from, time()))
+    if date_to:
+        statement = statement.where(history.created_at < datetime.combine(date_to + timedelta(days=1), time()))
+    return statement
+
+def balance_before(student_id, created_at, history_id):
+    """Ledger balance just before one history row: a checkpoint, its tail and same-instant rows"""
+    balance, _, _ = balance_as_of(student_id, created_at)
+    history = archive.history(created_at)
+    same_instant = db.session.execute(
+        select(func.sum(history.change_amount)).where(
+            history.student_id == student_id,
+            history.created_at == created_at,
+            history.id < history_id
+        )
+    ).scalar()
+    return balance + (same_instant or 0)
+
+def _statement(student_id, opening, history, where=(), date_from=None, date_to=None, limit=None):
+    """Statement lines in date order with the running balance from a SQL window over change_amount"""
+    # A payment may be archived (by payment_date) while its history row is still live
+    archived = archive.hot_start() is not None
+    receipt_number = Payment.receipt_number
+    if archived:
+        receipt_number = func.coalesce(Payment.receipt_number, PaymentArchive.receipt_number)
+    lines = (
+        select(
+            history.id,
+            history.created_at,
+            history.change_type,
+            history.description,
+            history.change_amount,
+            receipt_number.label('receipt_number')
+        )
+        .outerjoin(Payment, and_(history.change_type == 'payment', Payment.id == history.reference_id))
+        .where(history.student_id == student_id, *where)
+        .order_by(*_key(history))
+    )
+    if archived:
+        # Look receipts up in both tables by id; joining their UNION would scan it
+        lines = lines.outerjoin(PaymentArchive, and_(history.change_type == 'payment', PaymentArchive.id == history.reference_id))
+    lines = _range(lines, history, date_from, date_to)
+    if limit:
+        # Limit first so the window only runs over the page
+        lines = lines.limit(limit)
+    lines = lines.subquery()
+    
+    running = literal(int(opening)) + func.sum(lines.c.change_amount).over(
+        order_by=(lines.c.created_at, lines.c.id), rows=(None, 0)
+    )
+    return select(
+        lines.c.id,
+        lines.c.created_at,
+        lines.c.change_type,
+        lines.c.description,
+        lines.c.receipt_number,
+        lines.c.change_amount,
+        type_coerce(running, Money).label('balance')
+    ).order_by(lines.c.created_at, lines.c.id)
+
+def opening_balance(student_id, date_from=None):
+    """Balance at the start of date_from, or before the student's first history row"""
+    balance, _, _ = balance_as_of(student_id, datetime.combine(date_from, time()) if date_from else datetime.min)
+    return balance
+
+def statement_page(student_id, date_from=None, date_to=None, after=None, before=None, per_page=50):
+    """One cursor page of a student's statement.
+    
+    Every page costs a checkpoint lookup for its opening balance plus one
+    range scan of per_page + 1 rows on (student_id, created_at); the running
+    balance is a window sum over just those rows. A page before a cursor is
+    found by walking back per_page keys and then read forwards. Without
+    date_from the statement starts after the last closed academic year.
+    """
+    date_from = date_from or archive.hot_start()
+    history = archive.history(date_from, date_to)
+    key = _key(history)
+    where = []
+    opening = None
+    has_prev = False
+    
+    if before:
+        cursor = decode_cursor(before, key)
+        keys = db.session.execute(
+            _range(select(*key).where(history.student_id == student_id), history, date_from, date_to)
+            .where(tuple_(*key) < tuple_(*cursor))
+            .order_by(*(c.desc() for c in key))
+            .limit(per_page + 1)
+        ).all()
+        if keys:
+            has_prev = len(keys) > per_page
+            start = tuple(keys[min(per_page, len(keys)) - 1])
+            where.append(tuple_(*key) >= tuple_(*start))
+            opening = balance_before(student_id, *start)
+    elif after:
+        cursor = decode_cursor(after, key)
+        has_prev = True
+        where.append(tuple_(*key) > tuple_(*cursor))
+        # Rows with the same timestamp and an id up to the cursor's are already on earlier pages
+        opening = balance_before(student_id, cursor[0], cursor[1] + 1)
+    if opening is None:
+        opening = opening_balance(student_id, date_from)
+    
+    lines = db.session.execute(
+        _statement(student_id, opening, history, where, date_from, date_to, limit=per_page + 1)
+    ).all()
+    has_next = len(lines) > per_page or bool(before and where)
+    lines = lines[:per_page]
+    
+    return {
+        'opening_balance': opening,
+        'lines': lines,
+        'next_cursor': encode_cursor([lines[-1].created_at, lines[-1].id]) if lines and has_next else None,
+        'prev_cursor': encode_cursor([lines[0].created_at, lines[0].id]) if lines and has_prev else None,
+    }
+
+def line_to_dict(line):
+    return {
+        'id': line.id,
+        'date': line.created_at.isoformat(),
+        'type': line.change_type,
+        'description': line.description,
+        'reference': line.receipt_number,
+        'amount': float(line.change_amount),
+        'balance': float(line.balance),
+    }
+
+def stream_statement_csv(student_id, filename, date_from=None, date_to=None, chunk_size=1000):
+    """Stream a whole statement as CSV; the database computes the running balance as rows are read"""
+    date_from = date_from or archive.hot_start()
+    opening = opening_balance(student_id, date_from)
+    statement = _statement(student_id, opening, archive.history(date_from, date_to), date_from=date_from, date_to=date_to)
+    
+    def generate():
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(CSV_HEADER)
+        writer.writerow([date_from.isoformat() if date_from else '', 'opening', 'Opening balance', '', '', str(opening)])
+        result = db.session.execute(statement.execution_options(yield_per=chunk_size))
+        for rows in result.partitions():
+            for line in rows:
+                writer.writerow([
+                    line.created_at.strftime('%Y-%m-%d %H:%M'), line.change_type, line.description,
+                    line.receipt_number or '', str(line.change_amount), str(line.balance)
+                ])
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/csv',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
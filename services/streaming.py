@@ -0,0 +1,72 @@
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from flask import Response, stream_with_context
+from extensions import db
+from models.money import Money
+
+DEFAULT_CHUNK_SIZE = 1000
+
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'json': 'application/json',
+}
+
+def _default(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+def _major_units(row, indexes):
+    row = list(row)
+    for i in indexes:
+        if row[i] is not None:
+            row[i] = float(row[i])
+    return row
+
+_encode = json.JSONEncoder(default=_default, separators=(',', ':')).encode
+
+def parse_fields(raw, columns, default=None):
+    """Validate a comma-separated ?fields= projection against the streamable columns"""
+    if not raw:
+        return list(default or columns)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in columns]
+    if unknown:
+        raise ValueError(f'Unknown field(s): {", ".join(unknown)}')
+    return fields
+
+def stream_query(statement, fields, fmt='ndjson', chunk_size=DEFAULT_CHUNK_SIZE):
+    """Stream a labelled select as NDJSON or a chunked JSON array.
+    
+    Rows are fetched chunk_size at a time and each chunk is encoded and sent
+    before the next is read, so memory stays flat however many rows match.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unsupported format {fmt}')
+    
+    def generate():
+        result = db.session.execute(statement.execution_options(yield_per=chunk_size))
+        # Money columns arrive as Cents, which json would write as a plain integer of cents
+        money = [i for i, column in enumerate(statement.selected_columns) if isinstance(column.type, Money)]
+        first = True
+        
+        if fmt == 'json':
+            yield '['
+        
+        for rows in result.partitions():
+            if money:
+                rows = [_major_units(row, money) for row in rows]
+            encoded = [_encode(dict(zip(fields, row))) for row in rows]
+            if fmt == 'ndjson':
+                yield '\n'.join(encoded) + '\n'
+            else:
+                yield ('' if first else ',') + ','.join(encoded)
+            first = False
+        
+        if fmt == 'json':
+            yield ']'
+    
+    return Response(stream_with_context(generate()), mimetype=FORMATS[fmt])
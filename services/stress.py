@@ -0,0 +1,161 @@
+import multiprocessing
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+from sqlalchemy import select, delete, func
+from sqlalchemy.exc import OperationalError, IntegrityError
+from extensions import db, ledger_stamp
+from models.student import Student, BalanceHistory
+from models.payment import Payment
+from models.aging import DebtAging
+from models.money import Cents
+from services import rollup
+
+STRESS_GRADE = 'STRESS'
+STRESS_NOTE = 'balance stress test'
+
+def _post_payments(student_ids, count, seed):
+    """Worker process: post count payments against random students; returns (posted, retries, seconds)"""
+    from app import create_app
+    
+    app = create_app()
+    rng = random.Random(seed)
+    posted = retries = 0
+    
+    with app.app_context():
+        started = time.perf_counter()
+        while posted < count:
+            student = db.session.get(Student, rng.choice(student_ids))
+            amount = Cents(rng.randint(100, 500099))
+            try:
+                payment = Payment(
+                    student_id=student.id,
+                    amount=amount,
+                    fee_type='Tuition',
+                    payment_method='Cash',
+                    payment_date=date.today(),
+                    grade=student.grade,
+                    receipt_number=Payment.generate_receipt_number(nbytes=6),
+                    notes=STRESS_NOTE
+                )
+                db.session.add(payment)
+                db.session.flush()
+                student.update_balance(
+                    amount=-amount,
+                    change_type='payment',
+                    description='Payment received: Tuition',
+                    reference_id=payment.id
+                )
+                rollup.record_payment(payment)
+                db.session.commit()
+            except (OperationalError, IntegrityError):
+                # Lock timeouts (SQLite "database is locked", PostgreSQL deadlocks) are retried
+                db.session.rollback()
+                retries += 1
+                continue
+            posted += 1
+        elapsed = time.perf_counter() - started
+        db.session.remove()
+    
+    return posted, retries, elapsed
+
+def _create_students(count):
+    students = [
+        Student(
+            student_number=f'STRESS-{i:05d}',
+            full_name=f'Stress Student {i}',
+            grade=STRESS_GRADE,
+            guardian_contact='0000000000',
+            balance=0,
+            is_active=False
+        )
+        for i in range(1, count + 1)
+    ]
+    db.session.add_all(students)
+    db.session.commit()
+    return [student.id for student in students]
+
+def verify(student_ids):
+    """Compare each balance with its payments and check the history chain is unbroken"""
+    paid = dict(db.session.execute(
+        select(Payment.student_id, func.sum(Payment.amount))
+        .where(Payment.student_id.in_(student_ids))
+        .group_by(Payment.student_id)
+    ).all())
+    balances = dict(db.session.execute(
+        select(Student.id, Student.balance).where(Student.id.in_(student_ids))
+    ).all())
+    
+    lost = 0
+    broken_chains = 0
+    previous = {}
+    history = db.session.execute(
+        select(BalanceHistory.student_id, BalanceHistory.previous_balance, BalanceHistory.new_balance)
+        .where(BalanceHistory.student_id.in_(student_ids))
+        .order_by(BalanceHistory.id)
+    )
+    for student_id, previous_balance, new_balance in history:
+        if previous_balance != previous.get(student_id, 0):
+            broken_chains += 1
+        previous[student_id] = new_balance
+    
+    for student_id in student_ids:
+        if balances[student_id] != -(paid.get(student_id) or 0):
+            lost += 1
+    
+    return {'students_with_lost_updates': lost, 'broken_history_links': broken_chains}
+
+def cleanup(student_ids):
+    """Remove the stress students, their payments, history and rollup contributions"""
+    rollup.record_payments([
+        (payment_date, STRESS_GRADE, method, fee_type, -count, -amount)
+        for payment_date, method, fee_type, count, amount in db.session.execute(
+            select(Payment.payment_date, Payment.payment_method, Payment.fee_type,
+                   func.count(Payment.id), func.sum(Payment.amount))
+            .where(Payment.student_id.in_(student_ids))
+            .group_by(Payment.payment_date, Payment.payment_method, Payment.fee_type)
+        )
+    ])
+    db.session.execute(delete(DebtAging).where(DebtAging.student_id.in_(student_ids)))
+    db.session.execute(delete(BalanceHistory).where(BalanceHistory.student_id.in_(student_ids)))
+    db.session.execute(delete(Payment).where(Payment.student_id.in_(student_ids)))
+    db.session.execute(delete(Student).where(Student.id.in_(student_ids)))
+    db.session.commit()
+    ledger_stamp.bump()
+
+def run_balance_stress(workers=4, payments_per_worker=250, students=5, keep=False):
+    """Post payments from several processes against a few students and check nothing was lost"""
+    if db.engine.url.database in (None, '', ':memory:'):
+        raise ValueError('The stress test needs a file or server database shared by all workers')
+    
+    student_ids = _create_students(students)
+    try:
+        started = time.perf_counter()
+        # spawn, not fork: each worker builds its own app and connection pool
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as pool:
+            results = list(pool.map(
+                _post_payments,
+                [student_ids] * workers,
+                [payments_per_worker] * workers,
+                range(workers)
+            ))
+        elapsed = time.perf_counter() - started
+        
+        posted = sum(r[0] for r in results)
+        summary = {
+            'workers': workers,
+            'students': students,
+            'payments': posted,
+            'retries': sum(r[1] for r in results),
+            'seconds': round(elapsed, 2),
+            'payments_per_second': round(posted / elapsed, 1) if elapsed else None,
+            'worker_payments_per_second': [round(r[0] / r[2], 1) for r in results if r[2]],
+        }
+        summary.update(verify(student_ids))
+        summary['passed'] = not summary['students_with_lost_updates'] and not summary['broken_history_links']
+        return summary
+    finally:
+        if not keep:
+            cleanup(student_ids)
@@ -0,0 +1,57 @@
+import os
+import tempfile
+
+# Keep caches, spools and logs out of instance/ and write the audit log in the request's transaction
+_scratch = tempfile.mkdtemp(prefix='fees-tests-')
+for name in ('CACHE_DIR', 'AUDIT_SPOOL_DIR', 'METRICS_DIR', 'SLOW_QUERY_LOG_DIR'):
+    os.environ.setdefault(name, os.path.join(_scratch, name.lower()))
+os.environ.setdefault('AUDIT_LOG_MODE', 'sync')
+
+import pytest
+from app import create_app
+from extensions import db, fee_cache, user_cache, archive_cache
+from models.user import User
+from models.student import Student
+from models.money import Cents
+
+@pytest.fixture
+def app():
+    """The testing app on a fresh in-memory database with an admin and five students.
+    
+    No app context is left pushed: requests then get their own, as in
+    production (the query guard counts per context). Push one around
+    direct service calls.
+    """
+    app = create_app('testing')
+    with app.app_context():
+        db.create_all()
+        admin = User(username='admin', role='admin')
+        admin.set_password('admin123')
+        db.session.add(admin)
+        for i in range(1, 6):
+            db.session.add(Student(
+                student_number=f'STU{i:03d}',
+                full_name=f'Student {i}',
+                grade='10' if i % 2 else '9',
+                guardian_contact='0712000000',
+                balance=Cents(1000)
+            ))
+        db.session.commit()
+    yield app
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+    # Per-worker caches outlive the app; the next test has a new database
+    for cache in (fee_cache, user_cache, archive_cache):
+        cache.entries.clear()
+
+@pytest.fixture
+def client(app):
+    """A test client logged in as the admin"""
+    client = app.test_client()
+    with app.app_context():
+        admin_id = User.query.filter_by(username='admin').one().id
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+    return client
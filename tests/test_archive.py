@@ -0,0 +1,85 @@
+from datetime import date, datetime
+from extensions import db
+from models.money import Cents
+from models.payment import Payment
+from models.student import Student, BalanceHistory
+from services import archive
+
+def _payment_in_2024(student_id):
+    """A 2024 payment and its history row, as if posted then"""
+    posted = datetime(2024, 5, 1, 10, 0)
+    student = db.session.get(Student, student_id)
+    payment = Payment(
+        student_id=student_id, amount=Cents(5000), fee_type='Tuition', payment_method='Cash',
+        payment_date=posted.date(), grade=student.grade, receipt_number='RCP-2024-OLD', created_at=posted
+    )
+    db.session.add(payment)
+    db.session.flush()
+    db.session.add(BalanceHistory(
+        student_id=student_id, previous_balance=student.balance, new_balance=student.balance - payment.amount,
+        change_amount=-payment.amount, change_type='payment', reference_id=payment.id,
+        description='Payment received: Tuition', created_at=posted
+    ))
+    student.balance -= payment.amount
+    db.session.commit()
+    return payment.id
+
+def test_archived_ids_are_not_reused(app, client):
+    with app.app_context():
+        old_id = _payment_in_2024(1)
+        old_history_id = db.session.execute(db.select(db.func.max(BalanceHistory.id))).scalar()
+        result = archive.close_year(2024)
+        assert result['payments'] == 1 and result['history_rows'] == 1
+        assert Payment.query.count() == 0
+    
+    response = client.post('/payments/create', data={
+        'student_id': 2, 'amount': '20.00', 'fee_type': 'Tuition',
+        'payment_method': 'Cash', 'payment_date': date.today().isoformat()
+    })
+    assert response.get_json()['success']
+    with app.app_context():
+        assert Payment.query.one().id > old_id
+        assert db.session.execute(db.select(db.func.max(BalanceHistory.id))).scalar() > old_history_id
+    
+    # The archived receipt is still reachable by its id
+    receipt = client.get(f'/payments/api/receipt/{old_id}').get_json()
+    assert receipt['receipt_number'] == 'RCP-2024-OLD'
+    
+    # Student 1's 2024 statement references their own receipt, not the new payment's
+    statement = client.get('/students/1/statement?format=json&date_from=2024-01-01&date_to=2024-12-31').get_json()
+    assert [line['reference'] for line in statement['items']] == ['RCP-2024-OLD']
+    
+    with app.app_context():
+        assert archive.verify()[0]['ok']
+
+def test_close_year_refuses_tables_that_reuse_ids(app, monkeypatch):
+    monkeypatch.setattr(archive, '_reuses_ids', lambda model: model is Payment)
+    with app.app_context():
+        _payment_in_2024(1)
+        try:
+            archive.close_year(2024)
+        except archive.ArchiveError as e:
+            assert 'AUTOINCREMENT' in str(e)
+        else:
+            raise AssertionError('close_year archived a table that reuses ids')
+        assert Payment.query.count() == 1
+
+def test_rollup_rebuild_keeps_closed_years(app):
+    from models.rollup import PaymentDailyRollup
+    from services import rollup
+    with app.app_context():
+        _payment_in_2024(1)
+        rollup.rebuild()
+        archive.close_year(2024)
+        rollup.rebuild()
+        assert db.session.execute(db.select(db.func.sum(PaymentDailyRollup.total_amount))).scalar() == 5000
+
+def test_generated_rows_skip_archived_ids(app):
+    from services.dataset import generate_dataset
+    with app.app_context():
+        old_id = _payment_in_2024(1)
+        old_history_id = db.session.execute(db.select(db.func.max(BalanceHistory.id))).scalar()
+        archive.close_year(2024)
+        generate_dataset(students=2, payments=4, academic_year=2025)
+        assert db.session.execute(db.select(db.func.min(Payment.id))).scalar() > old_id
+        assert db.session.execute(db.select(db.func.min(BalanceHistory.id))).scalar() > old_history_id
@@ -0,0 +1,12 @@
+from extensions import fee_cache
+
+def test_loads_overtaken_by_an_invalidate_are_not_stored(app):
+    with app.app_context():
+        def stale_load():
+            # Another request commits a fee change while these rows are in hand
+            fee_cache.invalidate()
+            return 'stale'
+        
+        assert fee_cache.get_or_set('fees', stale_load) == 'stale'
+        assert fee_cache.get_or_set('fees', lambda: 'fresh') == 'fresh'
+        assert fee_cache.get_or_set('fees', lambda: 'later') == 'fresh'
@@ -0,0 +1,35 @@
+import pytest
+from extensions import db
+from models.fee import FeeStructure, FeeApplication
+from models.money import Cents
+from models.student import Student
+
+@pytest.fixture
+def term_fees(app):
+    """Term 1 2026 tuition for grade 9"""
+    with app.app_context():
+        db.session.add(FeeStructure(grade='9', term='Term 1', fee_type='Tuition',
+                                    amount=Cents(50000), academic_year='2026'))
+        db.session.commit()
+        return Student.query.filter_by(grade='9').order_by(Student.id).first().id
+
+def _apply(client, student_id):
+    return client.post(f'/students/apply-fees/{student_id}', json={'term': 'Term 1', 'academic_year': '2026'})
+
+def test_single_student_fees_are_claimed_for_the_term(app, client, term_fees):
+    response = _apply(client, term_fees)
+    assert response.status_code == 200
+    assert response.get_json()['amount_applied'] == 500
+    
+    # Neither the single-student route nor a bulk run bills the student again
+    assert _apply(client, term_fees).status_code == 400
+    response = client.post('/students/apply-fees/bulk', json={'term': 'Term 1', 'academic_year': '2026'})
+    assert response.get_json()['students_billed'] == 1
+    
+    with app.app_context():
+        assert FeeApplication.query.filter_by(student_id=term_fees).count() == 1
+        assert db.session.get(Student, term_fees).balance == Cents(51000)
+
+def test_single_student_fees_need_a_term(client, term_fees):
+    response = client.post(f'/students/apply-fees/{term_fees}', json={})
+    assert response.status_code == 400
@@ -0,0 +1,68 @@
+import operator
+from decimal import Decimal
+import pytest
+from flask import jsonify
+from sqlalchemy import text
+from sqlalchemy.exc import StatementError
+from extensions import db
+from models.money import Cents
+from models.student import Student
+from services import money_migration
+
+def test_cents_refuse_to_mix_units():
+    assert Cents(150) + 50 == Cents(200) and isinstance(Cents(150) + 50, Cents)
+    assert isinstance(3 * Cents(150), Cents)
+    for other in (Decimal('1.50'), 1.5):
+        with pytest.raises(TypeError):
+            Cents(150) + other
+        with pytest.raises(TypeError):
+            Cents(150) - other
+        with pytest.raises(TypeError):
+            Cents(150) * other
+
+def test_cents_refuse_to_compare_across_units():
+    assert Cents(150) > 100 and Cents(100) == 100 and Cents(100) != Cents(101)
+    assert Cents(100) != None and {Cents(100): 'a'}[100] == 'a'
+    for compare in (operator.eq, operator.ne, operator.lt, operator.le, operator.gt, operator.ge):
+        for other in (Decimal('1.00'), 1.0):
+            with pytest.raises(TypeError):
+                compare(Cents(100), other)
+
+def test_jsonify_writes_major_units(app):
+    with app.app_context():
+        response = jsonify({'balance': Cents(150050), 'lines': [{'amount': Cents(-5)}], 'count': 3})
+    assert response.get_json() == {'balance': 1500.5, 'lines': [{'amount': -0.05}], 'count': 3}
+
+def test_money_columns_refuse_plain_ints(app):
+    with app.app_context():
+        student = db.session.get(Student, 1)
+        student.balance = 250
+        with pytest.raises(StatementError, match='Ambiguous money value'):
+            db.session.flush()
+        db.session.rollback()
+        
+        student = db.session.get(Student, 1)
+        student.balance = Cents.parse('2.50')
+        db.session.commit()
+        assert db.session.execute(db.select(Student.id).where(Student.balance == Cents(250))).scalar() == 1
+        assert db.session.execute(db.select(Student.id).where(Student.balance == Decimal('2.50'))).scalar() == 1
+
+def test_unmigrated_databases_are_not_served(app, client, monkeypatch):
+    with app.app_context():
+        # payment_daily_rollup as it was before money moved to cents
+        db.session.execute(text('DROP TABLE payment_daily_rollup'))
+        db.session.execute(text(
+            'CREATE TABLE payment_daily_rollup (payment_date DATE, grade VARCHAR(10), payment_method VARCHAR(13), '
+            'fee_type VARCHAR(50), payment_count INTEGER NOT NULL, total_amount DECIMAL(15, 2) NOT NULL, '
+            'PRIMARY KEY (payment_date, grade, payment_method, fee_type))'
+        ))
+        db.session.commit()
+    monkeypatch.setattr(money_migration, '_migrated', set())
+    
+    response = client.get('/students/')
+    assert response.status_code == 503
+    assert b'payment_daily_rollup.total_amount' in response.data
+    
+    with app.app_context():
+        money_migration.migrate_money_columns()
+    assert client.get('/students/').status_code == 200
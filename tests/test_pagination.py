@@ -0,0 +1,41 @@
+from datetime import date
+import pytest
+from extensions import db
+from models.money import Cents
+from models.payment import Payment
+from services import aging
+
+@pytest.mark.parametrize('url', ['/students/api/list', '/payments/api/list'])
+@pytest.mark.parametrize('limit', [0, -5])
+def test_list_limit_is_at_least_one(app, client, url, limit):
+    with app.app_context():
+        for i in range(1, 4):
+            db.session.add(Payment(student_id=i, amount=Cents(1000), fee_type='Tuition', payment_method='Cash',
+                                   payment_date=date(2025, 3, i), grade='10', receipt_number=f'RCP-LIM-{i}'))
+        db.session.commit()
+    
+    page = client.get(f'{url}?limit={limit}').get_json()
+    assert len(page['items']) == 1
+    assert page['next_cursor']
+
+@pytest.mark.parametrize('limit', [0, -5])
+def test_statement_limit_is_at_least_one(client, limit):
+    for day in (1, 2, 3):
+        client.post('/payments/create', data={
+            'student_id': 1, 'amount': '5.00', 'fee_type': 'Tuition', 'payment_method': 'Cash',
+            'payment_date': f'2025-03-0{day}'
+        })
+    
+    page = client.get(f'/students/1/statement?format=json&limit={limit}').get_json()
+    assert len(page['items']) == 1
+    assert page['next_cursor']
+
+@pytest.mark.parametrize('limit', [0, -5])
+def test_defaulters_limit_is_at_least_one(app, client, limit):
+    with app.app_context():
+        aging.refresh([1, 2, 3, 4, 5])
+        db.session.commit()
+    
+    page = client.get(f'/reports/api/defaulters?limit={limit}').get_json()
+    assert len(page['items']) == 1
+    assert page['next_cursor']
@@ -0,0 +1,46 @@
+import json
+import multiprocessing
+import threading
+import time
+import pytest
+from services.passwords import PasswordHasher, PasswordHasherBusy, LoginThrottle
+
+def test_hasher_refuses_instead_of_waiting_for_a_slot():
+    hasher = PasswordHasher()
+    hasher.workers, hasher.queue, hasher.timeout = 1, 0, 10
+    release = threading.Event()
+    busy = threading.Thread(target=hasher._run, args=(release.wait,), daemon=True)
+    busy.start()
+    time.sleep(0.05)
+    
+    started = time.perf_counter()
+    try:
+        with pytest.raises(PasswordHasherBusy):
+            hasher.hash('secret')
+        assert time.perf_counter() - started < 1
+    finally:
+        release.set()
+        busy.join()
+    assert hasher.verify(hasher.hash('secret'), 'secret')
+
+def _fail_logins(directory, count):
+    throttle = LoginThrottle()
+    throttle.directory = directory
+    throttle.max_per_user = throttle.max_per_ip = 1000
+    for _ in range(count):
+        throttle.failure('cashier', '10.0.0.1')
+
+def test_failures_from_several_workers_are_all_counted(tmp_path):
+    context = multiprocessing.get_context('fork')
+    workers = [context.Process(target=_fail_logins, args=(str(tmp_path), 50)) for _ in range(4)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    
+    throttle = LoginThrottle()
+    throttle.directory = str(tmp_path)
+    with open(throttle._path('user', 'cashier')) as f:
+        assert len(json.load(f)) == 200
+    with open(throttle._path('ip', '10.0.0.1')) as f:
+        assert len(json.load(f)) == 200
@@ -0,0 +1,26 @@
+import pytest
+from extensions import db
+from models.user import User
+
+@pytest.fixture
+def viewer(app):
+    """A test client logged in as a read-only viewer"""
+    with app.app_context():
+        user = User(username='viewer', role='viewer')
+        user.set_password('viewer123')
+        db.session.add(user)
+        db.session.commit()
+        user_id = user.id
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(user_id)
+        session['_fresh'] = True
+    return client
+
+def test_import_rejects_need_create_permission(viewer):
+    response = viewer.get('/payments/import/rejects/statement-rejects.csv')
+    assert response.status_code == 403
+
+def test_cache_stats_are_for_admins(client, viewer):
+    assert viewer.get('/fees/api/cache-stats').status_code == 403
+    assert client.get('/fees/api/cache-stats').status_code == 200
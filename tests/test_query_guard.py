@@ -0,0 +1,47 @@
+from datetime import date
+import pytest
+from extensions import db
+from models.money import Cents
+from models.payment import Payment
+from models.student import Student
+
+@pytest.fixture
+def payments(app):
+    """40 payments from 20 more students, so a per-row query would exceed QUERY_COUNT_LIMIT"""
+    with app.app_context():
+        students = [
+            Student(student_number=f'QRY{i:03d}', full_name=f'Query {i}', grade='10',
+                    guardian_contact='0722000000', balance=Cents(0))
+            for i in range(20)
+        ]
+        db.session.add_all(students)
+        db.session.flush()
+        payments = [
+            Payment(student_id=students[i % 20].id, amount=Cents(1000), fee_type='Tuition', payment_method='Cash',
+                    payment_date=date(2025, 3, 1 + i % 28), grade='10', receipt_number=f'RCP-QRY-{i:03d}')
+            for i in range(40)
+        ]
+        db.session.add_all(payments)
+        db.session.commit()
+        return [payment.id for payment in payments]
+
+@pytest.mark.parametrize('url', [
+    '/payments/',
+    '/payments/?search=query',
+    '/payments/api/list',
+    '/payments/api/list?limit=40',
+    '/students/',
+    '/students/api/list',
+    '/students/api/list?limit=40',
+])
+def test_listings_stay_within_the_query_limit(app, client, payments, url):
+    # The guard raises QueryLimitExceeded from the request when the limit is passed
+    response = client.get(url)
+    assert response.status_code == 200
+    assert int(response.headers['X-Query-Count']) <= app.config['QUERY_COUNT_LIMIT']
+
+def test_receipts_stay_within_the_query_limit(app, client, payments):
+    for payment_id in payments[:3]:
+        response = client.get(f'/payments/receipt/{payment_id}')
+        assert response.status_code == 200
+        assert int(response.headers['X-Query-Count']) <= app.config['QUERY_COUNT_LIMIT']
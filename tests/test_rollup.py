@@ -0,0 +1,32 @@
+from datetime import date
+from extensions import db
+from models.payment import Payment
+from models.rollup import PaymentDailyRollup
+from models.student import Student
+from services import rollup
+
+def _rollup(app):
+    with app.app_context():
+        return {
+            row.grade: (row.payment_count, row.total_amount)
+            for row in db.session.execute(db.select(PaymentDailyRollup)).scalars()
+        }
+
+def test_payments_stay_under_the_grade_they_were_taken_in(app, client):
+    response = client.post('/payments/create', data={
+        'student_id': 1, 'amount': '20.00', 'fee_type': 'Tuition', 'payment_method': 'Cash',
+        'payment_date': date.today().isoformat()
+    })
+    assert response.get_json()['success']
+    assert _rollup(app) == {'10': (1, 2000)}
+    
+    with app.app_context():
+        db.session.get(Student, 1).grade = '11'
+        db.session.commit()
+        payment_id = db.session.execute(db.select(Payment.id)).scalar_one()
+        rollup.rebuild()
+    assert _rollup(app) == {'10': (1, 2000)}
+    
+    response = client.post(f'/payments/delete/{payment_id}')
+    assert response.get_json()['success']
+    assert _rollup(app) == {}
@@ -0,0 +1,83 @@
+import re
+import pytest
+from datetime import date
+from sqlalchemy.orm import joinedload
+from extensions import db
+from models.money import Cents
+from models.payment import Payment
+from models.student import Student
+from services.pagination import paginate_ranked
+from services.search import search_students, search_payments, best_first, MAX_RESULTS
+
+def _mwangis():
+    """Six active grade 9 Mwangis, then one in grade 12, each with one payment"""
+    for i, grade in enumerate(['9'] * 6 + ['12']):
+        student = Student(student_number=f'MWA{i:03d}', full_name=f'Pupil{i} Mwangi', grade=grade,
+                          guardian_contact='0722000000', balance=Cents(0))
+        db.session.add(student)
+        db.session.flush()
+        db.session.add(Payment(
+            student_id=student.id, amount=Cents(1000), fee_type='Tuition',
+            payment_method='Cheque' if grade == '12' else 'Cash',
+            payment_date=date(2025, 1, 10 + i), grade=grade, receipt_number=f'RCP-MWA-{i:03d}'
+        ))
+    db.session.commit()
+
+def test_student_filters_apply_before_the_limit(app):
+    with app.app_context():
+        _mwangis()
+        results = search_students('mwangi', limit=3, grade='12')
+        assert [student.student_number for student, _ in results] == ['MWA006']
+
+def test_payment_filters_apply_before_the_limit(app):
+    with app.app_context():
+        _mwangis()
+        query = Payment.query.options(joinedload(Payment.student)).filter(Payment.payment_method == 'Cheque')
+        results = search_payments('mwangi', limit=3, query=query)
+        assert [payment.receipt_number for payment, _ in results] == ['RCP-MWA-006']
+        
+        results = search_payments('RCP-MWA', limit=3, query=query)
+        assert [payment.receipt_number for payment, _ in results] == ['RCP-MWA-006']
+
+def test_search_results_page_by_score_and_id(app):
+    with app.app_context():
+        _mwangis()
+        results = search_students('mwangi', limit=MAX_RESULTS, active_only=False)
+        
+        seen, cursor, pages = [], None, 0
+        while True:
+            page = paginate_ranked(results, best_first, after=cursor, per_page=3)
+            seen += [student.id for student, _ in page.items]
+            pages += 1
+            if not page.has_next:
+                break
+            cursor = page.next_cursor
+        assert pages == 3 and len(seen) == len(set(seen)) == 7
+        
+        back = paginate_ranked(results, best_first, before=page.prev_cursor, per_page=3)
+        assert [student.id for student, _ in back.items] == seen[3:6]
+
+def test_search_list_links_to_the_next_page(app, client):
+    with app.app_context():
+        for i in range(55):
+            db.session.add(Student(student_number=f'KAM{i:03d}', full_name=f'Pupil{i} Kamau', grade='9',
+                                   guardian_contact='0722000000', balance=Cents(0)))
+        db.session.commit()
+    
+    first = client.get('/students/?search=kamau')
+    assert first.status_code == 200
+    assert b'Next' in first.data
+    
+    after = re.search(rb'after=([\w-]+)', first.data).group(1).decode()
+    second = client.get(f'/students/?search=kamau&after={after}')
+    assert second.status_code == 200
+    assert second.data.count(b'<td>KAM') == 5
+
+@pytest.mark.parametrize('search_type', ['students', 'payments'])
+@pytest.mark.parametrize('limit', [0, -1])
+def test_search_api_limit_is_at_least_one(app, client, search_type, limit):
+    with app.app_context():
+        _mwangis()
+    
+    results = client.get(f'/search/api?q=mwangi&type={search_type}&limit={limit}').get_json()
+    assert len(results) == 1
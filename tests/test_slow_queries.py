@@ -0,0 +1,23 @@
+from extensions import db, slow_query_log
+from models.user import User
+from models.student import Student
+
+def test_user_parameters_are_logged_by_type_only(app, client, monkeypatch, tmp_path):
+    monkeypatch.setattr(slow_query_log, 'path', str(tmp_path / 'slow_queries.log'))
+    monkeypatch.setattr(slow_query_log, 'threshold', 0)
+    with app.app_context():
+        user = User.query.filter_by(username='admin').one()
+        user.set_password('s3cret-passw0rd')
+        db.session.commit()
+        password_hash = user.password_hash
+        Student.query.filter_by(student_number='STU001').all()
+    monkeypatch.setattr(slow_query_log, 'threshold', float('inf'))
+    
+    logged = list(slow_query_log.entries())
+    assert any(e['parameters'] and '<str>' in e['parameters'] for e in logged if 'UPDATE users' in e['statement'])
+    assert password_hash not in (tmp_path / 'slow_queries.log').read_text()
+    assert any('STU001' in e['parameters'] for e in logged if 'FROM students' in e['statement'])
+    
+    # A zero or negative limit still shows the worst statement
+    response = client.get('/admin/slow-queries?format=json&limit=0')
+    assert len(response.get_json()) == 1
@@ -0,0 +1,32 @@
+from sqlalchemy import select, func
+from app import create_app
+from config import DevelopmentConfig
+from extensions import db
+from models.payment import Payment
+from models.student import Student, BalanceHistory
+from services.stress import run_balance_stress
+
+def test_concurrent_payments_lose_no_balance_updates(tmp_path, monkeypatch):
+    # The workers are spawned processes that build the default app from DATABASE_URL
+    url = f"sqlite:///{tmp_path / 'stress.db'}"
+    monkeypatch.setenv('DATABASE_URL', url)
+    monkeypatch.setenv('FLASK_ENV', 'development')
+    monkeypatch.setattr(DevelopmentConfig, 'SQLALCHEMY_DATABASE_URI', url)
+    
+    app = create_app('development')
+    with app.app_context():
+        db.create_all()
+        result = run_balance_stress(workers=3, payments_per_worker=40, students=3, keep=True)
+        assert result['payments'] == 120
+        assert result['passed'], result
+        
+        student_ids = select(Student.id).where(Student.student_number.like('STRESS-%'))
+        balance = db.session.execute(select(func.sum(Student.balance)).where(Student.id.in_(student_ids))).scalar()
+        paid = db.session.execute(select(func.sum(Payment.amount)).where(Payment.student_id.in_(student_ids))).scalar()
+        deltas, posts = db.session.execute(
+            select(func.sum(BalanceHistory.change_amount), func.count())
+            .where(BalanceHistory.student_id.in_(student_ids))
+        ).one()
+        assert balance == deltas == -paid
+        assert posts == 120
+        db.session.remove()
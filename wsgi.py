@@ -1,8 +1,12 @@
 from app import app, db  # or however you import your app
+from services import rollup
+from services.money_migration import require_migrated
 
 # Only create tables if they don't exist (safe):
 with app.app_context():
+    require_migrated()  # Money must be in cents before anything reads it
     db.create_all()  # This is safe - only creates missing tables
+    rollup.ensure_schema()  # Adds payments.grade to older databases
 
 if __name__ == "__main__":
     app.run()